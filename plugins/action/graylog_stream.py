@@ -0,0 +1,123 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import add_timings, create_applied_digests, create_client, create_streams_cache, get_stream_index, reconcile_stream, warn_duplicate_titles
+from ansible_collections.fio.graylog.plugins.module_utils.streams import StreamIndex, StreamParams
+from ansible_collections.fio.graylog.plugins.modules.graylog_stream import get_module_args
+import hashlib
+
+
+# sessions of this worker process by endpoint and client options. Ansible forks a worker per
+# task and host, so the items of a loop share a session.
+_SESSIONS = {}
+
+
+# With controller=true the stream is reconciled in the controller process, otherwise the module
+# is executed on the target host as usual.
+class ActionModule(ActionBase):
+
+  TRANSFERS_FILES = False
+
+  def run(self, tmp=None, task_vars=None):
+    result = super().run(tmp, task_vars)
+    del tmp
+
+    if not boolean(self._task.args.get('controller', False), strict=False):
+      result.update(self._execute_module(task_vars=task_vars))
+      return result
+
+    _, params = self.validate_argument_spec(argument_spec=get_module_args())
+    module = ControllerModule(params, self._play_context.check_mode)
+    session = get_session(module)
+    if session.client.timings is not None:
+      session.client.timings = ApiCallTimings()
+
+    name = params["name"]
+    result['changed'] = False
+    digests = create_applied_digests(module)
+    try:
+      stream_index = session.get_stream_index(name, self._task.loop is not None or self._task.loop_with is not None)
+      warn_duplicate_titles(module, stream_index, [name])
+      stream = stream_index.get_by_title(name)
+
+      result['changed'] = reconcile_stream(session.client, params["state"], stream, StreamParams(params), module.check_mode, params["parallelism"], digests)
+      if result['changed'] and not module.check_mode:
+        session.stale_titles.add(name)
+    except GraylogApiError as e:
+      # the stream may have been changed partially
+      session.stale_titles.add(name)
+      result['failed'] = True
+      result['msg'] = str(e)
+    finally:
+      if digests is not None:
+        digests.store()
+
+    if len(module.warnings) > 0:
+      result['warnings'] = module.warnings
+
+    return add_timings(result, session.client)
+
+
+
+# the parts of AnsibleModule used by stream_api
+class ControllerModule():
+
+  def __init__(self, params: dict, check_mode: bool):
+    self.params = params
+    self.check_mode = check_mode
+    self.warnings = []
+
+
+  def warn(self, warning: str) -> None:
+    self.warnings.append(warning)
+
+
+
+class StreamSession():
+
+  def __init__(self, module: ControllerModule):
+    self.client = create_client(module)
+    self.cache = create_streams_cache(module, self.client)
+    self.stream_index = None
+    # titles of streams changed by this session, they are looked up again before they are used
+    self.stale_titles = set()
+
+
+  # loops list all streams once, single tasks only look up their stream
+  def get_stream_index(self, title: str, preload: bool) -> StreamIndex:
+    if self.stream_index is None:
+      if not preload:
+        return get_stream_index(self.client, self.cache, {title})
+      self.stream_index = get_stream_index(self.client, self.cache)
+
+    if title in self.stale_titles:
+      self.stream_index.remove_title(title)
+      for stream in get_stream_index(self.client, titles={title}):
+        self.stream_index.add(stream)
+      self.stale_titles.discard(title)
+
+    return self.stream_index
+
+
+
+def get_session(module: ControllerModule) -> StreamSession:
+  params = module.params
+  key = (
+    params["endpoint_url"].rstrip('/'),
+    hashlib.sha256(params["endpoint_token"].encode('utf-8')).hexdigest(),
+    params["validate_certs"],
+    params["retries"],
+    params["retry_delay"],
+    params["timings"],
+    params["cache_ttl"],
+    params["cache_path"]
+  )
+
+  session = _SESSIONS.get(key)
+  if session is None:
+    session = _SESSIONS[key] = StreamSession(module)
+
+  return session
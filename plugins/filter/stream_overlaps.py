@@ -0,0 +1,22 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.errors import AnsibleFilterError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_overlap import analyze_stream_overlaps
+from ansible_collections.fio.graylog.plugins.module_utils.streams import load_stream
+
+
+def stream_overlaps(streams: list) -> dict:
+  try:
+    return analyze_stream_overlaps([load_stream(x) for x in streams])
+  except TypeError as e:
+    raise AnsibleFilterError('stream_overlaps: %s' % (e))
+
+
+
+class FilterModule(object):
+
+  def filters(self):
+    return {
+      'stream_overlaps': stream_overlaps
+    }
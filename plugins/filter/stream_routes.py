@@ -0,0 +1,29 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.errors import AnsibleFilterError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_routing import StreamRouter
+from ansible_collections.fio.graylog.plugins.module_utils.streams import load_stream
+from collections.abc import Mapping
+
+
+# streams are stream specs of graylog_stream(s) (name) or streams of graylog_stream_info (title)
+def stream_routes(messages, streams: list):
+  try:
+    router = StreamRouter([load_stream(x) for x in streams])
+  except (TypeError, ValueError) as e:
+    raise AnsibleFilterError('stream_routes: %s' % (e))
+
+  if isinstance(messages, Mapping):
+    return router.route(messages)
+
+  return [router.route(x) for x in messages]
+
+
+
+class FilterModule(object):
+
+  def filters(self):
+    return {
+      'stream_routes': stream_routes
+    }
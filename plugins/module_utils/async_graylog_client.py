@@ -0,0 +1,231 @@
+from __future__ import annotations
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError, GraylogClientBase, GraylogConnectionError, GraylogResponse, is_connection_dropped
+import asyncio
+import json
+import socket
+import time
+
+
+# HTTP/1.1 client on asyncio streams for fanning out many requests without threads. At most
+# concurrency requests are in flight, their keep-alive connections are reused by later requests.
+class AsyncGraylogClient(GraylogClientBase):
+
+  def __init__(self, endpoint_url: str, endpoint_token: str, validate_certs: bool = True, timeout: float = 30, timings: ApiCallTimings = None, retries: int = 0, retry_delay: float = 1, concurrency: int = 8):
+    super().__init__(endpoint_url, endpoint_token, validate_certs, timeout, timings, retries, retry_delay)
+    self._concurrency = max(1, concurrency)
+    # created on first use, so it belongs to the running event loop
+    self._semaphore = None
+    self._connections = []
+
+
+  async def request(self, method: str, path: str, data=None, expected_status: int = 200, idempotent: bool = None):
+    response = await self.send(method, path, data, idempotent=idempotent)
+
+    if response.status != expected_status:
+      raise GraylogApiError(self._error_message(response), response.status)
+
+    return response.json()
+
+
+  async def send(self, method: str, path: str, data=None, headers: dict = None, idempotent: bool = None) -> GraylogResponse:
+    body = None if data is None else (data if isinstance(data, str) else json.dumps(data)).encode('utf-8')
+    request_headers = self._merge_headers(headers)
+
+    attempt = 0
+    while True:
+      try:
+        response = await self._send_once(method, path, body, request_headers, idempotent)
+      except GraylogConnectionError as e:
+        if not self._should_retry(method, idempotent, attempt, error=e):
+          raise
+        delay = self._get_backoff(attempt)
+      else:
+        if not self._should_retry(method, idempotent, attempt, status=response.status):
+          return response
+        delay = max(self._get_backoff(attempt), self._get_retry_after(response.headers))
+
+      await asyncio.sleep(delay)
+      attempt += 1
+
+
+  async def close(self) -> None:
+    connections, self._connections = self._connections, []
+    for connection in connections:
+      await self._close_connection(connection)
+
+
+  async def _send_once(self, method: str, path: str, body: bytes, request_headers: dict, idempotent: bool = None) -> GraylogResponse:
+    if self._semaphore is None:
+      self._semaphore = asyncio.Semaphore(self._concurrency)
+
+    async with self._semaphore:
+      start = time.monotonic()
+      response = None
+      try:
+        response = await self._send_on_pool(method, path, body, request_headers, idempotent)
+        return response
+      finally:
+        self._record(method, path, response, 0 if response is None else len(response.body), start)
+
+
+  async def _send_on_pool(self, method: str, path: str, body: bytes, request_headers: dict, idempotent: bool = None) -> GraylogResponse:
+    connection, reused = await self._acquire_connection(path)
+    while True:
+      try:
+        await asyncio.wait_for(self._write(connection, method, path, body, request_headers), self._timeout)
+      except (OSError, asyncio.TimeoutError) as e:
+        await self._close_connection(connection)
+        # the server closed an idle keep-alive connection, send once more on a fresh one
+        if reused and isinstance(e, (ConnectionResetError, BrokenPipeError)):
+          connection, reused = await self._new_connection(path), False
+          continue
+        raise GraylogConnectionError('Request to %s failed: %s' % (path, e), sent=False)
+
+      try:
+        response, keep_alive = await asyncio.wait_for(self._read(connection, method), self._timeout)
+      except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError) as e:
+        await self._close_connection(connection)
+        # the request may have been processed before the connection broke
+        if not reused or not self._is_idempotent(method, idempotent):
+          raise GraylogConnectionError('Request to %s failed: %s' % (path, e))
+        connection, reused = await self._new_connection(path), False
+        continue
+      except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+        await self._close_connection(connection)
+        raise GraylogConnectionError('Request to %s failed: %s' % (path, e))
+
+      break
+
+    if keep_alive:
+      self._connections.append(connection)
+    else:
+      await self._close_connection(connection)
+
+    return response
+
+
+  # a failed write means Graylog did not receive the whole request
+  async def _write(self, connection: tuple, method: str, path: str, body: bytes, headers: dict) -> None:
+    _, writer = connection
+    url = self._base_path + path
+    if self._proxy is not None and self._scheme == 'http':
+      url = self.base_url + path
+
+    lines = ['%s %s HTTP/1.1' % (method, url), 'Host: %s' % (self._netloc())]
+    lines.extend('%s: %s' % (x, y) for x, y in headers.items())
+    if body is not None or method in ('POST', 'PUT', 'PATCH'):
+      lines.append('Content-Length: %s' % (0 if body is None else len(body)))
+
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+    await writer.drain()
+
+
+  async def _read(self, connection: tuple, method: str) -> "tuple[GraylogResponse, bool]":
+    reader, _ = connection
+    status_line = await reader.readline()
+    if not status_line:
+      raise asyncio.IncompleteReadError(b'', None)
+
+    version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+    status = int(status)
+
+    response_headers = {}
+    while True:
+      line = await reader.readline()
+      if line in (b'\r\n', b'\n', b''):
+        break
+      key, _, value = line.decode('latin-1').partition(':')
+      response_headers[key.strip().lower()] = value.strip()
+
+    keep_alive = version != 'HTTP/1.0' and response_headers.get('connection', '').lower() != 'close'
+    if method == 'HEAD' or status in (204, 304) or status < 200:
+      response_body = b''
+    elif 'chunked' in response_headers.get('transfer-encoding', '').lower():
+      response_body = await self._read_chunked(reader)
+    elif 'content-length' in response_headers:
+      response_body = await reader.readexactly(int(response_headers['content-length']))
+    else:
+      response_body = await reader.read()
+      keep_alive = False
+
+    return GraylogResponse(status, reason, response_headers, response_body), keep_alive
+
+
+  @staticmethod
+  async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+      size = int((await reader.readline()).split(b';')[0].strip(), 16)
+      if size == 0:
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+          pass
+        return b''.join(chunks)
+
+      chunks.append(await reader.readexactly(size))
+      await reader.readexactly(2)
+
+
+  # pooled connections the server closed while they were idle are dropped instead of reused
+  async def _acquire_connection(self, path: str) -> "tuple[tuple, bool]":
+    while len(self._connections) > 0:
+      connection = self._connections.pop()
+      if not self._is_dropped(connection):
+        return connection, True
+      await self._close_connection(connection)
+
+    return await self._new_connection(path), False
+
+
+  @staticmethod
+  def _is_dropped(connection: tuple) -> bool:
+    reader, writer = connection
+    sock = writer.get_extra_info('socket')
+    return reader.at_eof() or writer.is_closing() or sock is None or is_connection_dropped(sock)
+
+
+  # failures before the request is written are raised with sent=False, so even a POST can be retried
+  async def _new_connection(self, path: str) -> tuple:
+    try:
+      if self._proxy is None:
+        port = self._port or (443 if self._scheme == 'https' else 80)
+        return await asyncio.wait_for(asyncio.open_connection(self._host, port, ssl=self._ssl_context), self._timeout)
+
+      if self._scheme == 'http':
+        return await asyncio.wait_for(asyncio.open_connection(self._proxy.hostname, self._proxy.port or 80), self._timeout)
+
+      sock = await asyncio.get_running_loop().run_in_executor(None, self._open_tunnel)
+      return await asyncio.wait_for(asyncio.open_connection(sock=sock, ssl=self._ssl_context, server_hostname=self._host), self._timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+      raise GraylogConnectionError('Request to %s failed: %s' % (path, e), sent=False)
+
+
+  def _open_tunnel(self) -> socket.socket:
+    target = '%s:%s' % (self._host, self._port or 443)
+    sock = socket.create_connection((self._proxy.hostname, self._proxy.port or 443), self._timeout)
+    try:
+      sock.sendall(('CONNECT %s HTTP/1.1\r\nHost: %s\r\n\r\n' % (target, target)).encode('latin-1'))
+      response = b''
+      while b'\r\n\r\n' not in response:
+        data = sock.recv(4096)
+        if not data:
+          break
+        response += data
+
+      status_line = response.split(b'\r\n', 1)[0].decode('latin-1')
+      if status_line.split(' ')[1:2] != ['200']:
+        raise OSError('Tunnel connection failed: %s' % (status_line))
+    except OSError:
+      sock.close()
+      raise
+
+    return sock
+
+
+  @staticmethod
+  async def _close_connection(connection: tuple) -> None:
+    writer = connection[1]
+    writer.close()
+    try:
+      await writer.wait_closed()
+    except (OSError, asyncio.TimeoutError):
+      pass
@@ -0,0 +1,164 @@
+from __future__ import annotations
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.fio.graylog.plugins.module_utils.async_graylog_client import AsyncGraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import format_rule, get_shares_dto, load_stream_shares, should_create_stream, should_delete_stream
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamChanges, StreamParams, StreamShare
+import asyncio
+import copy
+
+
+def create_async_client(module: AnsibleModule, timings: ApiCallTimings = None) -> AsyncGraylogClient:
+  return AsyncGraylogClient(
+    module.params["endpoint_url"],
+    module.params["endpoint_token"],
+    validate_certs=module.params["validate_certs"],
+    timings=timings,
+    retries=module.params["retries"],
+    retry_delay=module.params["retry_delay"],
+    concurrency=module.params["parallelism"])
+
+
+# runs function for every item concurrently, bounded by the client, returns (result, error) per item
+async def run_concurrently(function, items: list) -> "list[tuple]":
+  async def call(item):
+    try:
+      return await function(item), None
+    except GraylogApiError as e:
+      return None, e
+
+  return await asyncio.gather(*[call(x) for x in items])
+
+
+async def get_stream_shares(client: AsyncGraylogClient, stream: Stream) -> "tuple[list[StreamShare], dict]":
+  shares_dto = await client.request('POST', '/authz/shares/entities/grn::::stream:%s/prepare' % (stream.id), data={}, idempotent=True)
+  return load_stream_shares(shares_dto)
+
+
+async def apply_shares_changes(client: AsyncGraylogClient, stream: Stream, add: "list[StreamShare]", delete: "list[StreamShare]") -> None:
+  await client.request('POST', '/authz/shares/entities/grn::::stream:%s' % (stream.id), data=get_shares_dto(stream, add, delete), idempotent=True)
+
+
+# the coroutine counterpart of stream_api.reconcile_stream, managed shares are requested up front
+async def reconcile_stream(client: AsyncGraylogClient, state: str, stream: Stream, stream_params: StreamParams, check_mode: bool = False, digests: AppliedDigests = None) -> bool:
+  if digests is not None and state == "present" and stream is not None and digests.is_applied(stream, stream_params):
+    return False
+
+  changes = None
+  if state == "present" and stream is not None:
+    if stream_params.shares is not None:
+      stream.shares, stream.shares_dto = await get_stream_shares(client, stream)
+    changes = stream.get_changes(stream_params)
+
+  if check_mode:
+    changed = should_create_stream(state, stream) or (changes is not None and changes.has_changes()) or should_delete_stream(state, stream)
+  elif should_create_stream(state, stream):
+    changed = await create_stream(client, stream_params)
+  elif changes is not None and changes.has_changes():
+    changed = await update_stream(client, stream, stream_params, changes)
+  elif should_delete_stream(state, stream):
+    changed = await delete_stream(client, stream)
+  else:
+    changed = False
+
+  if digests is not None and not check_mode and stream is not None:
+    if state == "present":
+      digests.add(stream, stream_params, changed)
+    else:
+      digests.discard(stream)
+
+  return changed
+
+
+async def create_stream(client: AsyncGraylogClient, stream_params: StreamParams) -> bool:
+  response_stream = await client.request('POST', '/streams', data=stream_params.map_to_dto(), expected_status=201)
+
+  stream = Stream({})
+  stream.id = response_stream['stream_id']
+
+  if stream_params.shares is not None:
+    add, delete = stream.get_shares_changes(stream_params)
+    await apply_shares_changes(client, stream, add, delete)
+
+  if stream_params.started:
+    await resume_stream(client, stream.id)
+
+  return True
+
+
+async def update_stream(client: AsyncGraylogClient, stream: Stream, stream_params: StreamParams, changes: StreamChanges) -> bool:
+  if changes.properties:
+    await client.request('PUT', '/streams/%s' % (stream.id), data=stream_params.map_to_dto(copy.deepcopy(stream.dto)))
+
+  if changes.started:
+    if stream_params.started:
+      await resume_stream(client, stream.id)
+    elif stream_params.started is False:
+      await pause_stream(client, stream.id)
+
+  if changes.rules:
+    await apply_rules_changes(client, stream, changes.rules_add, changes.rules_delete, changes.rules_update)
+
+  if changes.shares:
+    await apply_shares_changes(client, stream, changes.shares_add, changes.shares_delete)
+
+  return True
+
+
+async def delete_stream(client: AsyncGraylogClient, stream: Stream) -> bool:
+  await client.request('DELETE', '/streams/%s' % (stream.id), expected_status=204)
+  return True
+
+
+async def delete_streams(client: AsyncGraylogClient, streams: "list[Stream]") -> None:
+  results = await run_concurrently(lambda x: delete_stream(client, x), streams)
+
+  errors = ['%s: %s' % (stream.title, error) for stream, (_, error) in zip(streams, results) if error is not None]
+  if len(errors) > 0:
+    raise GraylogApiError('Failed to delete %s stream(s): %s' % (len(errors), '; '.join(errors)))
+
+
+async def resume_stream(client: AsyncGraylogClient, stream_id: str) -> None:
+  await client.request('POST', '/streams/%s/resume' % (stream_id), expected_status=204, idempotent=True)
+
+
+async def pause_stream(client: AsyncGraylogClient, stream_id: str) -> None:
+  await client.request('POST', '/streams/%s/pause' % (stream_id), expected_status=204, idempotent=True)
+
+
+# rules with the same key are changed in order, deletes before updates before adds, other rules concurrently
+async def apply_rules_changes(client: AsyncGraylogClient, stream: Stream, add: list, delete: list, update: list = None) -> None:
+  operations_by_key = {}
+  for item in delete:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((delete_rule, item))
+  for item in update or []:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((update_rule, item))
+  for item in add:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((add_rule, item))
+
+  operation_names = { delete_rule: 'delete', update_rule: 'update', add_rule: 'add' }
+
+  async def apply_operations(operations: list) -> None:
+    for operation, item in operations:
+      try:
+        await operation(client, stream, item)
+      except GraylogApiError as e:
+        raise GraylogApiError('%s rule %s: %s' % (operation_names[operation], format_rule(item), e), e.status)
+
+  errors = [error for _, error in await run_concurrently(apply_operations, list(operations_by_key.values())) if error is not None]
+  if len(errors) > 0:
+    raise GraylogApiError('Failed to update %s rule(s) of stream %s: %s' % (len(errors), stream.id, '; '.join(str(x) for x in errors)))
+
+
+async def add_rule(client: AsyncGraylogClient, stream: Stream, rule: dict) -> None:
+  await client.request('POST', '/streams/%s/rules' % (stream.id), data=rule, expected_status=201)
+
+
+async def update_rule(client: AsyncGraylogClient, stream: Stream, rule: dict) -> None:
+  data = dict((x, y) for x, y in rule.items() if x != 'id')
+  await client.request('PUT', '/streams/%s/rules/%s' % (stream.id, rule['id']), data=data)
+
+
+async def delete_rule(client: AsyncGraylogClient, stream: Stream, rule: dict) -> None:
+  await client.request('DELETE', '/streams/%s/rules/%s' % (stream.id, rule['id']), expected_status=204)
@@ -0,0 +1,570 @@
+from __future__ import annotations
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+import base64
+import datetime
+import email.utils
+import http.client
+import json
+import queue
+import random
+import re
+import select
+import ssl
+import threading
+import time
+
+
+class GraylogApiError(Exception):
+
+  def __init__(self, msg: str, status: int = -1):
+    super().__init__(msg)
+    self.status = status
+
+
+
+# raised if no response was received, sent tells whether the request may have reached Graylog
+class GraylogConnectionError(GraylogApiError):
+
+  def __init__(self, msg: str, sent: bool = True):
+    super().__init__(msg)
+    self.sent = sent
+
+
+
+class GraylogResponse():
+
+  def __init__(self, status: int, reason: str, headers: dict, body: bytes):
+    self._status = status
+    self._reason = reason
+    self._headers = headers
+    self._body = body
+
+
+  @property
+  def status(self) -> int:
+    return self._status
+
+
+  @property
+  def reason(self) -> str:
+    return self._reason
+
+
+  @property
+  def headers(self) -> dict:
+    return self._headers
+
+
+  @property
+  def body(self) -> bytes:
+    return self._body
+
+
+  def json(self):
+    if len(self.body) == 0:
+      return None
+
+    return json.loads(self.body.decode('utf-8', errors='surrogateescape'))
+
+
+
+# Response whose body is read incrementally, the connection goes back to the pool on close
+# if the body was read completely and is dropped otherwise.
+class GraylogStreamingResponse():
+
+  def __init__(self, status: int, reason: str, headers: dict, reader, release):
+    self._status = status
+    self._reason = reason
+    self._headers = headers
+    self._reader = reader
+    self._release = release
+    self._size = 0
+    self._closed = False
+
+
+  @property
+  def status(self) -> int:
+    return self._status
+
+
+  @property
+  def reason(self) -> str:
+    return self._reason
+
+
+  @property
+  def headers(self) -> dict:
+    return self._headers
+
+
+  @property
+  def size(self) -> int:
+    return self._size
+
+
+  def read(self, size: int = -1) -> bytes:
+    try:
+      data = self._reader.read() if size < 0 else self._reader.read(size)
+    except (OSError, http.client.HTTPException) as e:
+      raise GraylogApiError('Reading response failed: %s' % (e))
+
+    self._size += len(data)
+    return data
+
+
+  def close(self) -> None:
+    if self._closed:
+      return
+
+    self._closed = True
+    self._release(self._reader.isclosed(), self._size)
+
+
+  def __enter__(self) -> "GraylogStreamingResponse":
+    return self
+
+
+  def __exit__(self, *args) -> None:
+    self.close()
+
+
+
+class ApiCallTimings():
+
+  _ID_PATTERN = re.compile('(?<=[/:])[0-9a-f]{24}(?=/|$)')
+
+  def __init__(self):
+    self._calls = []
+    self._lock = threading.Lock()
+
+
+  @property
+  def calls(self) -> "list[dict]":
+    return self._calls
+
+
+  def record(self, method: str, path: str, status: int, size: int, duration: float) -> None:
+    call = {
+      'method': method,
+      'path': self._ID_PATTERN.sub('{id}', path.split('?', 1)[0]),
+      'status': status,
+      'bytes': size,
+      'duration_ms': round(duration * 1000, 3)
+    }
+
+    with self._lock:
+      self._calls.append(call)
+
+
+  def summary(self) -> dict:
+    endpoints = {}
+    for call in self.calls:
+      endpoint = endpoints.setdefault((call['method'], call['path']), {
+        'method': call['method'],
+        'path': call['path'],
+        'count': 0,
+        'bytes': 0,
+        'duration_ms': 0,
+        'max_duration_ms': 0
+      })
+      endpoint['count'] += 1
+      endpoint['bytes'] += call['bytes']
+      endpoint['duration_ms'] = round(endpoint['duration_ms'] + call['duration_ms'], 3)
+      endpoint['max_duration_ms'] = max(endpoint['max_duration_ms'], call['duration_ms'])
+
+    return {
+      'requests': len(self.calls),
+      'bytes': sum(x['bytes'] for x in self.calls),
+      'duration_ms': round(sum(x['duration_ms'] for x in self.calls), 3),
+      'endpoints': sorted(endpoints.values(), key=lambda x: x['duration_ms'], reverse=True)
+    }
+
+
+
+# Shared by the blocking and the asyncio client: endpoint, headers, proxy, timings, mutation
+# listeners and the retry policy.
+class GraylogClientBase():
+
+  # statuses of overloaded or restarting nodes behind a load balancer, 429 is retried for every method
+  RETRY_STATUSES = (429, 502, 503, 504)
+  IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+  RETRY_MAX_DELAY = 60
+
+  def __init__(self, endpoint_url: str, endpoint_token: str, validate_certs: bool = True, timeout: float = 30, timings: ApiCallTimings = None, retries: int = 0, retry_delay: float = 1):
+    url = urlsplit(endpoint_url)
+    self._scheme = url.scheme
+    self._host = url.hostname
+    self._port = url.port
+    self._base_path = url.path.rstrip('/') + '/api'
+    self._timeout = timeout
+    self._ssl_context = self._create_ssl_context(validate_certs) if self._scheme == 'https' else None
+    self._proxy = self._get_proxy(endpoint_url)
+    self._headers = self._create_headers(endpoint_token)
+    self._mutation_listeners = []
+    self._timings = timings
+    self._retries = retries
+    self._retry_delay = retry_delay
+
+
+  @property
+  def base_url(self) -> str:
+    return '%s://%s%s' % (self._scheme, self._netloc(), self._base_path)
+
+
+  @property
+  def timings(self) -> ApiCallTimings:
+    return self._timings
+
+
+  @timings.setter
+  def timings(self, value: ApiCallTimings) -> None:
+    self._timings = value
+
+
+  # listeners are called with (method, path) after every non-GET request, even failed ones
+  def add_mutation_listener(self, listener) -> None:
+    self._mutation_listeners.append(listener)
+
+
+  # requests which may have been processed are only repeated if they are idempotent, POST
+  # requests (like creating a rule) are only repeated if Graylog did not receive or reject them
+  def _should_retry(self, method: str, idempotent: bool, attempt: int, status: int = None, error: GraylogConnectionError = None) -> bool:
+    if attempt >= self._retries:
+      return False
+
+    idempotent = self._is_idempotent(method, idempotent)
+    if error is not None:
+      return idempotent or error.sent is False
+
+    return status == 429 or (idempotent and status in self.RETRY_STATUSES)
+
+
+  def _is_idempotent(self, method: str, idempotent: bool) -> bool:
+    return method in self.IDEMPOTENT_METHODS if idempotent is None else idempotent
+
+
+  # exponential backoff with full jitter, so parallel workers do not retry in lockstep
+  def _get_backoff(self, attempt: int) -> float:
+    return random.uniform(0, min(self.RETRY_MAX_DELAY, self._retry_delay * 2 ** attempt))
+
+
+  def _get_retry_after(self, headers: dict) -> float:
+    value = headers.get('retry-after')
+    if value is None:
+      return 0
+
+    try:
+      delay = float(value)
+    except ValueError:
+      try:
+        delay = (email.utils.parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+      except (TypeError, ValueError):
+        return 0
+
+    return min(self.RETRY_MAX_DELAY, max(0, delay))
+
+
+  def _record(self, method: str, path: str, response, size: int, start: float) -> None:
+    if self._timings is not None:
+      self._timings.record(method, path, -1 if response is None else response.status, size, time.monotonic() - start)
+
+    if method != 'GET':
+      for listener in self._mutation_listeners:
+        listener(method, path)
+
+
+  def _merge_headers(self, headers: dict) -> dict:
+    request_headers = dict(self._headers)
+    if headers is not None:
+      request_headers.update(headers)
+
+    return request_headers
+
+
+  def _netloc(self) -> str:
+    if self._port is None:
+      return self._host
+
+    return '%s:%s' % (self._host, self._port)
+
+
+  def _error_message(self, response: GraylogResponse) -> str:
+    msg = 'HTTP Error %s: %s' % (response.status, response.reason)
+    try:
+      body = response.json()
+    except ValueError:
+      return msg
+
+    if isinstance(body, dict) and body.get('message'):
+      msg += ' (%s)' % (body['message'])
+
+    return msg
+
+
+  @staticmethod
+  # an omitted validate_certs (None) validates, like fetch_url did
+  def _create_ssl_context(validate_certs: bool) -> ssl.SSLContext:
+    if validate_certs is not False:
+      return ssl.create_default_context()
+
+    return ssl._create_unverified_context()
+
+
+  @staticmethod
+  def _get_proxy(endpoint_url: str):
+    url = urlsplit(endpoint_url)
+    if proxy_bypass(url.hostname):
+      return None
+
+    proxy = getproxies().get(url.scheme)
+    if proxy is None:
+      return None
+
+    return urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+
+
+  @staticmethod
+  def _create_headers(endpoint_token: str) -> dict:
+    token = endpoint_token + ':token'
+    encoded_token = base64.b64encode(token.encode('utf-8')).decode('utf-8')
+
+    return {
+      'Authorization': 'Basic ' + encoded_token,
+      'Content-Type': 'application/json',
+      'Accept': 'application/json',
+      'X-Requested-By': 'ansible'
+    }
+
+
+
+
+# Keeps idle keep-alive connections to the Graylog endpoint in a pool, so consecutive
+# requests of a module run reuse one TCP/TLS session instead of handshaking per request.
+class GraylogClient(GraylogClientBase):
+
+  _VERSION_PATTERN = re.compile(r'(\d+)\.(\d+)\.(\d+)')
+
+  def __init__(self, endpoint_url: str, endpoint_token: str, validate_certs: bool = True, timeout: float = 30, timings: ApiCallTimings = None, retries: int = 0, retry_delay: float = 1):
+    super().__init__(endpoint_url, endpoint_token, validate_certs, timeout, timings, retries, retry_delay)
+    self._connections = queue.LifoQueue()
+    self._server_version = None
+
+
+  # (major, minor, patch) of the Graylog server, requested once per client, None if it is unknown
+  def get_server_version(self) -> "tuple[int, int, int]":
+    if self._server_version is None:
+      try:
+        version = self.request('GET', '/system').get('version') or ''
+      except GraylogApiError:
+        version = ''
+
+      match = self._VERSION_PATTERN.match(version)
+      self._server_version = tuple(int(x) for x in match.groups()) if match is not None else ()
+
+    return self._server_version or None
+
+
+  # idempotent marks a POST which can be repeated safely, other methods follow IDEMPOTENT_METHODS
+  def request(self, method: str, path: str, data=None, expected_status: int = 200, idempotent: bool = None):
+    response = self.send(method, path, data, idempotent=idempotent)
+
+    if response.status != expected_status:
+      raise GraylogApiError(self._error_message(response), response.status)
+
+    return response.json()
+
+
+  def send(self, method: str, path: str, data=None, headers: dict = None, idempotent: bool = None) -> GraylogResponse:
+    body = None if data is None else (data if isinstance(data, str) else json.dumps(data)).encode('utf-8')
+    request_headers = self._merge_headers(headers)
+
+    return self._retry(method, idempotent, lambda: self._send_once(method, path, body, request_headers, idempotent))
+
+
+  # the caller has to close the returned response, the body is only read on demand
+  def open(self, method: str, path: str, headers: dict = None, expected_status: int = 200, idempotent: bool = None) -> GraylogStreamingResponse:
+    request_headers = self._merge_headers(headers)
+
+    response = self._retry(method, idempotent, lambda: self._open_once(method, path, request_headers, idempotent))
+    if response.status != expected_status:
+      with response:
+        error_response = GraylogResponse(response.status, response.reason, response.headers, response.read())
+      raise GraylogApiError(self._error_message(error_response), response.status)
+
+    return response
+
+
+  def _send_once(self, method: str, path: str, body: bytes, request_headers: dict, idempotent: bool = None) -> GraylogResponse:
+    start = time.monotonic()
+    response = None
+    try:
+      response = self._send_on_pool(method, path, body, request_headers, idempotent)
+      return response
+    finally:
+      self._record(method, path, response, 0 if response is None else len(response.body), start)
+
+
+  def _open_once(self, method: str, path: str, request_headers: dict, idempotent: bool = None) -> GraylogStreamingResponse:
+    start = time.monotonic()
+    try:
+      return self._send_on_pool(method, path, None, request_headers, idempotent, streaming=True, on_close=lambda x, y: self._record(method, path, x, y, start))
+    except GraylogApiError:
+      self._record(method, path, None, 0, start)
+      raise
+
+
+  def _retry(self, method: str, idempotent: bool, send):
+    attempt = 0
+    while True:
+      try:
+        response = send()
+      except GraylogConnectionError as e:
+        if not self._should_retry(method, idempotent, attempt, error=e):
+          raise
+        delay = self._get_backoff(attempt)
+      else:
+        if not self._should_retry(method, idempotent, attempt, status=response.status):
+          return response
+        delay = max(self._get_backoff(attempt), self._get_retry_after(response.headers))
+        if isinstance(response, GraylogStreamingResponse):
+          response.close()
+
+      time.sleep(delay)
+      attempt += 1
+
+
+  def _send_on_pool(self, method: str, path: str, body: bytes, request_headers: dict, idempotent: bool = None, streaming: bool = False, on_close=None):
+    connection, reused = self._acquire_connection()
+    while True:
+      self._connect(connection, path)
+      try:
+        self._write(connection, method, path, body, request_headers)
+      except (OSError, http.client.HTTPException) as e:
+        connection.close()
+        # the server closed an idle keep-alive connection, send once more on a fresh one
+        if reused and isinstance(e, (ConnectionResetError, BrokenPipeError)):
+          connection, reused = self._new_connection(), False
+          continue
+        raise GraylogConnectionError('Request to %s failed: %s' % (path, e), sent=False)
+
+      try:
+        response = self._read(connection, streaming)
+      except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+        connection.close()
+        # the request may have been processed before the connection broke
+        if not reused or not self._is_idempotent(method, idempotent):
+          raise GraylogConnectionError('Request to %s failed: %s' % (path, e))
+        connection, reused = self._new_connection(), False
+        continue
+      except (OSError, http.client.HTTPException) as e:
+        connection.close()
+        raise GraylogConnectionError('Request to %s failed: %s' % (path, e))
+
+      break
+
+    if not streaming:
+      self._release_connection(connection, response)
+      return response
+
+    headers = dict((k.lower(), v) for k, v in response.getheaders())
+
+    def release(complete: bool, size: int) -> None:
+      # draining a partially read body costs more than a new handshake
+      if complete and headers.get('connection', '').lower() != 'close':
+        self._connections.put(connection)
+      else:
+        connection.close()
+
+      if on_close is not None:
+        on_close(streaming_response, size)
+
+    streaming_response = GraylogStreamingResponse(response.status, response.reason, headers, response, release)
+    return streaming_response
+
+
+  def close(self) -> None:
+    while True:
+      try:
+        self._connections.get_nowait().close()
+      except queue.Empty:
+        return
+
+
+  # failures before the request is written are raised with sent=False, so even a POST can be retried
+  def _connect(self, connection: http.client.HTTPConnection, path: str) -> None:
+    if connection.sock is not None:
+      return
+
+    try:
+      connection.connect()
+    except (OSError, http.client.HTTPException) as e:
+      connection.close()
+      raise GraylogConnectionError('Request to %s failed: %s' % (path, e), sent=False)
+
+
+  # a failed write means Graylog did not receive the whole request
+  def _write(self, connection: http.client.HTTPConnection, method: str, path: str, body: bytes, headers: dict) -> None:
+    url = self._base_path + path
+    if self._proxy is not None and self._scheme == 'http':
+      url = self.base_url + path
+
+    connection.request(method, url, body=body, headers=headers)
+
+
+  def _read(self, connection: http.client.HTTPConnection, streaming: bool = False):
+    response = connection.getresponse()
+    if streaming:
+      return response
+
+    response_body = response.read()
+    response_headers = dict((k.lower(), v) for k, v in response.getheaders())
+    return GraylogResponse(response.status, response.reason, response_headers, response_body)
+
+
+  # pooled connections the server closed while they were idle are dropped instead of reused
+  def _acquire_connection(self) -> "tuple[http.client.HTTPConnection, bool]":
+    while True:
+      try:
+        connection = self._connections.get_nowait()
+      except queue.Empty:
+        return self._new_connection(), False
+
+      if connection.sock is not None and not is_connection_dropped(connection.sock):
+        return connection, True
+      connection.close()
+
+
+  def _release_connection(self, connection: http.client.HTTPConnection, response: GraylogResponse) -> None:
+    if response.headers.get('connection', '').lower() == 'close':
+      connection.close()
+    else:
+      self._connections.put(connection)
+
+
+  def _new_connection(self) -> http.client.HTTPConnection:
+    if self._proxy is None:
+      host, port = self._host, self._port
+    else:
+      host, port = self._proxy.hostname, self._proxy.port
+
+    if self._scheme == 'https' and self._proxy is None:
+      return http.client.HTTPSConnection(host, port, timeout=self._timeout, context=self._ssl_context)
+
+    if self._scheme == 'https':
+      connection = http.client.HTTPSConnection(host, port, timeout=self._timeout, context=self._ssl_context)
+      connection.set_tunnel(self._host, self._port)
+      return connection
+
+    return http.client.HTTPConnection(host, port, timeout=self._timeout)
+
+
+
+# an idle keep-alive connection has nothing to read, unless the server closed it (EOF) or reset it
+def is_connection_dropped(sock) -> bool:
+  try:
+    readable, _, _ = select.select([sock], [], [], 0)
+  except (OSError, ValueError):
+    return True
+
+  return len(readable) > 0
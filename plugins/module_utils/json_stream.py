@@ -0,0 +1,122 @@
+from __future__ import annotations
+import codecs
+import json
+import re
+
+
+# Reads the elements of an array inside a JSON document one by one from a file-like
+# object, so only the current element and a read chunk are held in memory.
+class JsonArrayReader():
+
+  _TOKEN = re.compile(r'[{}\[\]"]')
+  _STRING = re.compile(r'"((?:[^"\\]|\\.)*)"', re.S)
+  _SEPARATOR = re.compile(r'[\s,]*')
+  _WHITESPACE = re.compile(r'\s*')
+  _DELIMITER = re.compile(r'[\s,\]]')
+
+  def __init__(self, fp, chunk_size: int = 65536):
+    self._fp = fp
+    self._chunk_size = chunk_size
+    self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+    self._json_decoder = json.JSONDecoder()
+    self._buffer = ''
+    self._pos = 0
+    self._eof = False
+
+
+  # yields the elements of the array stored under key of the top-level object
+  def iter_array(self, key: str):
+    self._seek_array(key)
+
+    while True:
+      self._skip(self._SEPARATOR)
+      if self._pos >= len(self._buffer):
+        if not self._fill():
+          raise ValueError('unexpected end of JSON document')
+        continue
+
+      if self._buffer[self._pos] == ']':
+        self._pos += 1
+        return
+
+      try:
+        item, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+      except json.JSONDecodeError:
+        if self._fill(len(self._buffer) - self._pos):
+          continue
+        raise
+
+      # a number or literal is only complete once the following delimiter was read
+      if not isinstance(item, (dict, list, str)) and self._DELIMITER.match(self._buffer, end) is None and self._fill():
+        continue
+
+      self._pos = end
+      yield item
+
+
+  def _seek_array(self, key: str) -> None:
+    depth = 0
+
+    while True:
+      match = self._TOKEN.search(self._buffer, self._pos)
+      if match is None:
+        self._pos = len(self._buffer)
+        if not self._fill():
+          raise ValueError('key %s not found in JSON document' % (key))
+        continue
+
+      token = match.group(0)
+      if token != '"':
+        depth += 1 if token in '{[' else -1
+        self._pos = match.end()
+        continue
+
+      string = self._STRING.match(self._buffer, match.start())
+      if string is None:
+        self._pos = match.start()
+        if not self._fill():
+          raise ValueError('unexpected end of JSON document')
+        continue
+
+      self._pos = string.end()
+      if depth == 1 and json.loads(string.group(0)) == key and self._next_char() == ':':
+        self._pos += 1
+        if self._next_char() != '[':
+          raise ValueError('%s is not an array' % (key))
+        self._pos += 1
+        return
+
+
+  def _next_char(self) -> str:
+    while True:
+      self._skip(self._WHITESPACE)
+      if self._pos < len(self._buffer):
+        return self._buffer[self._pos]
+
+      if not self._fill():
+        return ''
+
+
+  def _skip(self, pattern) -> None:
+    self._pos = pattern.match(self._buffer, self._pos).end()
+
+
+  def _fill(self, min_size: int = 0) -> bool:
+    if self._eof:
+      return False
+
+    data = self._fp.read(max(self._chunk_size, min_size))
+    self._buffer = self._buffer[self._pos:]
+    self._pos = 0
+
+    if not data:
+      self._buffer += self._text_decoder.decode(b'', final=True)
+      self._eof = True
+      return False
+
+    self._buffer += self._text_decoder.decode(data)
+    return True
+
+
+def iter_json_array(fp, key: str, chunk_size: int = 65536):
+  return JsonArrayReader(fp, chunk_size).iter_array(key)
@@ -0,0 +1,426 @@
+from __future__ import annotations
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError, GraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.json_stream import iter_json_array
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import StreamsCache
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.stream_journal import StreamsJournal
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamChanges, StreamIndex, StreamParams, StreamShare
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import copy
+
+
+# first Graylog version whose /streams/paginated is known to filter by a title query
+STREAM_QUERY_MIN_VERSION = (5, 0, 0)
+STREAM_QUERY_PAGE_SIZE = 50
+
+
+def create_client(module: AnsibleModule) -> GraylogClient:
+  return GraylogClient(
+    module.params["endpoint_url"],
+    module.params["endpoint_token"],
+    validate_certs=module.params["validate_certs"],
+    timings=ApiCallTimings() if module.params["timings"] else None,
+    retries=module.params["retries"],
+    retry_delay=module.params["retry_delay"])
+
+
+def add_timings(result: dict, client: GraylogClient) -> dict:
+  if client.timings is not None:
+    result['timings'] = {
+      'calls': client.timings.calls,
+      'summary': client.timings.summary()
+    }
+
+  return result
+
+
+def create_streams_cache(module: AnsibleModule, client: GraylogClient) -> StreamsCache:
+  if module.params["cache_ttl"] <= 0:
+    return None
+
+  cache = StreamsCache(module.params["cache_path"], module.params["endpoint_url"], module.params["endpoint_token"], module.params["cache_ttl"])
+  client.add_mutation_listener(cache.on_mutation)
+  return cache
+
+
+def create_streams_journal(module: AnsibleModule) -> StreamsJournal:
+  if not module.params["journal"] or module.check_mode:
+    return None
+
+  return StreamsJournal(
+    module.params["cache_path"],
+    module.params["endpoint_url"],
+    module.params["endpoint_token"],
+    [x["name"] for x in module.params["streams"]],
+    module.params["journal_max_age"])
+
+
+def create_applied_digests(module: AnsibleModule) -> AppliedDigests:
+  if not module.params["skip_unchanged"]:
+    return None
+
+  return AppliedDigests(module.params["cache_path"], module.params["endpoint_url"], module.params["endpoint_token"])
+
+
+# with digests, a stream whose listing and desired state match the last applied ones is skipped
+# without requesting its shares or comparing it
+def reconcile_stream(client: GraylogClient, state: str, stream: Stream, stream_params: StreamParams, check_mode: bool = False, parallelism: int = 1, digests: AppliedDigests = None) -> bool:
+  if digests is not None and state == "present" and stream is not None and digests.is_applied(stream, stream_params):
+    return False
+
+  changed = apply_stream_state(client, state, stream, stream_params, check_mode, parallelism)
+
+  if digests is not None and not check_mode and stream is not None:
+    if state == "present":
+      digests.add(stream, stream_params, changed)
+    else:
+      digests.discard(stream)
+
+  return changed
+
+
+def apply_stream_state(client: GraylogClient, state: str, stream: Stream, stream_params: StreamParams, check_mode: bool = False, parallelism: int = 1) -> bool:
+  if stream is not None:
+    stream.shares_loader = lambda: get_stream_shares(client, stream)
+
+  changes = None
+  if state == "present" and stream is not None:
+    changes = stream.get_changes(stream_params)
+
+  if check_mode:
+    return (
+      should_create_stream(state, stream)
+      or (changes is not None and changes.has_changes())
+      or should_delete_stream(state, stream)
+    )
+
+  if (should_create_stream(state, stream)):
+    return create_stream(client, stream_params)
+  elif (changes is not None and changes.has_changes()):
+    return update_stream(client, stream, stream_params, parallelism, changes)
+  elif (should_delete_stream(state, stream)):
+    return delete_stream(client, stream)
+
+  return False
+
+
+def get_stream_index(client: GraylogClient, cache: StreamsCache = None, titles: "set[str]" = None) -> StreamIndex:
+  title = next(iter(titles)) if titles is not None and len(titles) == 1 else None
+  if cache is None and title is not None and is_queryable_title(title) and supports_stream_query(client):
+    try:
+      stream_index = StreamIndex(query_stream_dtos(client, title), titles)
+      # a miss is confirmed by the full listing, before the stream is created
+      if stream_index.get_by_title(title) is not None:
+        return stream_index
+    except GraylogApiError as e:
+      if e.status != 404:
+        raise
+
+  if cache is None:
+    return StreamIndex(iter_stream_dtos(client), titles)
+
+  return StreamIndex(get_streams(client, cache)['streams'], titles)
+
+
+def supports_stream_query(client: GraylogClient) -> bool:
+  version = client.get_server_version()
+  return version is not None and version >= STREAM_QUERY_MIN_VERSION
+
+
+# Graylog does not unescape quoted query terms, titles with quotes or backslashes can not be queried
+def is_queryable_title(title: str) -> bool:
+  return '"' not in title and '\\' not in title
+
+
+# The query matches titles containing the given one, exact matches are picked by the caller.
+# Replies listing the streams neither as elements nor as streams fall back to the full listing.
+def query_stream_dtos(client: GraylogClient, title: str, page_size: int = STREAM_QUERY_PAGE_SIZE):
+  page = 1
+  while True:
+    query = urlencode({ 'query': 'title:"%s"' % (title), 'page': page, 'per_page': page_size })
+    response = client.request('GET', '/streams/paginated?%s' % (query))
+    elements = response.get('elements', response.get('streams'))
+    if elements is None:
+      if page > 1:
+        raise GraylogApiError('Invalid stream query reply: page %s lists no streams' % (page))
+      yield from iter_stream_dtos(client)
+      return
+
+    yield from elements
+
+    total = (response.get('pagination') or {}).get('total', response.get('total', 0))
+    if len(elements) < page_size or page * page_size >= total:
+      return
+
+    page += 1
+
+
+# parses the stream listing while it is received, one stream at a time
+def iter_stream_dtos(client: GraylogClient):
+  with client.open('GET', '/streams') as response:
+    try:
+      yield from iter_json_array(response, 'streams')
+    except ValueError as e:
+      raise GraylogApiError('Invalid stream listing: %s' % (e))
+
+    # consume the rest of the document, so the connection can be reused
+    response.read()
+
+
+def get_unmanaged_streams(stream_index: StreamIndex, managed_titles: "set[str]", title_pattern=None) -> "list[Stream]":
+  return [
+    x for x in stream_index
+    if x.title not in managed_titles
+    and x.is_deletable()
+    and (title_pattern is None or title_pattern.search(x.title) is not None)
+  ]
+
+
+def warn_duplicate_titles(module: AnsibleModule, stream_index: StreamIndex, titles: "list[str]") -> None:
+  for title in titles:
+    if title in stream_index.duplicate_titles:
+      module.warn("Multiple streams are titled '%s' (ids: %s), only the first one is managed." % (title, ', '.join(stream_index.duplicate_titles[title])))
+
+
+# names given by more than one stream spec, in the order of their first spec
+def get_duplicate_names(specs: "list[dict]") -> "list[str]":
+  counts = {}
+  for spec in specs:
+    counts[spec["name"]] = counts.get(spec["name"], 0) + 1
+
+  return [x for x, y in counts.items() if y > 1]
+
+
+def get_stream_shares(client: GraylogClient, existing_stream: Stream) -> "tuple[list[StreamShare], dict]":
+  stream_grn = 'grn::::stream:%s' % (existing_stream.id)
+  shares_dto = client.request('POST', '/authz/shares/entities/%s/prepare' % (stream_grn), data={}, idempotent=True)
+  return load_stream_shares(shares_dto)
+
+
+def load_stream_shares(shares_dto: dict) -> "tuple[list[StreamShare], dict]":
+  active_shares = shares_dto['active_shares']
+  if active_shares is None or len(active_shares) == 0:
+    return [], shares_dto
+
+  return [StreamShare().load_from_dto(x) for x in active_shares], shares_dto
+
+
+def get_streams(client: GraylogClient, cache: StreamsCache = None) -> dict:
+  if cache is None:
+    return client.request('GET', '/streams')
+
+  entry = cache.load()
+  if cache.is_fresh(entry):
+    return entry['response']
+
+  headers = None
+  if entry is not None and entry.get('etag'):
+    headers = { 'If-None-Match': entry['etag'] }
+
+  response = client.send('GET', '/streams', headers=headers)
+  if response.status == 304 and entry is not None:
+    cache.store(entry['response'], entry['etag'])
+    return entry['response']
+
+  if response.status != 200:
+    raise GraylogApiError('HTTP Error %s: %s' % (response.status, response.reason), response.status)
+
+  streams_response = response.json()
+  cache.store(streams_response, response.headers.get('etag'))
+  return streams_response
+
+
+def should_create_stream(state: str, stream: Stream) -> bool:
+  return state == "present" and stream is None
+
+
+def create_stream(client: GraylogClient, stream_params: StreamParams) -> bool:
+  response_stream = client.request('POST', '/streams', data=stream_params.map_to_dto(), expected_status=201)
+
+  stream = Stream({})
+  stream.id = response_stream['stream_id']
+
+  # create shares
+  update_shares(client, stream, stream_params)
+
+  if stream_params.started == True:
+    resume_stream(client, stream.id)
+
+  return True
+
+
+def resume_stream(client: GraylogClient, stream_id: str) -> None:
+  client.request('POST', '/streams/%s/resume' % (stream_id), expected_status=204, idempotent=True)
+
+
+def pause_stream(client: GraylogClient, stream_id: str) -> None:
+  client.request('POST', '/streams/%s/pause' % (stream_id), expected_status=204, idempotent=True)
+
+
+def should_update_stream(state: str, stream: Stream, stream_params: StreamParams) -> bool:
+  if state != "present" or stream is None:
+    return False
+
+  return stream.equals(stream_params) is False
+
+
+def update_stream(client: GraylogClient, stream: Stream, stream_params: StreamParams, parallelism: int = 1, changes: StreamChanges = None) -> bool:
+  if changes is None:
+    changes = stream.get_changes(stream_params)
+
+  if changes.properties:
+    data = copy.deepcopy(stream.dto)
+    data = stream_params.map_to_dto(data)
+    client.request('PUT', '/streams/%s' % (stream.id), data=data)
+
+  if changes.started:
+    update_stream_started(client, stream, stream_params)
+
+  # update rules (can not be updated via PUT streams/<id>)
+  if changes.rules:
+    apply_rules_changes(client, stream, changes.rules_add, changes.rules_delete, parallelism, changes.rules_update)
+
+  if changes.shares:
+    apply_shares_changes(client, stream, changes.shares_add, changes.shares_delete)
+
+  return True
+
+
+def update_stream_started(client: GraylogClient, stream: Stream, stream_params: StreamParams) -> None:
+  if stream_params.started is None:
+    return
+
+  if stream.started:
+    if stream_params.started is False:
+      pause_stream(client, stream.id)
+  else:
+    if stream_params.started:
+      resume_stream(client, stream.id)
+
+
+def update_rules(client: GraylogClient, stream: Stream, stream_params: StreamParams, parallelism: int = 1) -> None:
+  add, update, delete = stream.get_rules_plan(stream_params)
+  apply_rules_changes(client, stream, add, delete, parallelism, update)
+
+
+def apply_rules_changes(client: GraylogClient, stream: Stream, add: list, delete: list, parallelism: int = 1, update: list = None) -> None:
+  update = update or []
+  if parallelism <= 1:
+    for item in delete:
+      delete_rule(client, stream, item)
+
+    for item in update:
+      update_rule(client, stream, item)
+
+    for item in add:
+      add_rule(client, stream, item)
+    return
+
+  # rules with the same key are changed by one worker, deletes before updates before adds
+  operations_by_key = {}
+  for item in delete:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((delete_rule, item))
+  for item in update:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((update_rule, item))
+  for item in add:
+    operations_by_key.setdefault(stream.get_rule_key(item), []).append((add_rule, item))
+
+  operation_names = { delete_rule: 'delete', update_rule: 'update', add_rule: 'add' }
+
+  def apply_operations(operations: list) -> None:
+    for operation, item in operations:
+      try:
+        operation(client, stream, item)
+      except GraylogApiError as e:
+        raise GraylogApiError('%s rule %s: %s' % (operation_names[operation], format_rule(item), e), e.status)
+
+  errors = [error for _, error in run_concurrently(apply_operations, list(operations_by_key.values()), parallelism) if error is not None]
+  if len(errors) > 0:
+    raise GraylogApiError('Failed to update %s rule(s) of stream %s: %s' % (len(errors), stream.id, '; '.join(str(x) for x in errors)))
+
+
+def run_concurrently(function, items: list, parallelism: int) -> "list[tuple]":
+  def call(item):
+    try:
+      return function(item), None
+    except GraylogApiError as e:
+      return None, e
+
+  with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(items)))) as executor:
+    return list(executor.map(call, items))
+
+
+def format_rule(rule: dict) -> str:
+  return '{ Field: %s | Value: %s | Type: %s | Inverted: %s }' % (rule.get('field'), rule.get('value'), rule.get('type'), rule.get('inverted'))
+
+
+def update_shares(client: GraylogClient, stream: Stream, stream_params: StreamParams) -> None:
+  if stream_params.shares is None:
+    return
+
+  add, delete = stream.get_shares_changes(stream_params)
+  apply_shares_changes(client, stream, add, delete)
+
+
+def apply_shares_changes(client: GraylogClient, stream: Stream, add: "list[StreamShare]", delete: "list[StreamShare]") -> None:
+  client.request('POST', '/authz/shares/entities/grn::::stream:%s' % (stream.id), data=get_shares_dto(stream, add, delete), idempotent=True)
+
+
+def get_shares_dto(stream: Stream, add: "list[StreamShare]", delete: "list[StreamShare]") -> dict:
+  final_list: dict = {} if stream.shares_dto is None else stream.shares_dto['selected_grantee_capabilities']
+
+  for item in delete:
+    item_grn_key = item.get_grn_key()
+    if item_grn_key in final_list:
+      del final_list[item_grn_key]
+
+  for item in add:
+    item_grn_key = item.get_grn_key()
+    final_list[item_grn_key] = item.capability
+
+  return {
+    'selected_grantee_capabilities': final_list
+  }
+
+
+# grants (present) or revokes (absent) the given grantees on the stream, other grantees are kept
+def get_grantee_shares_changes(stream: Stream, grantees: "list[StreamShare]", state: str) -> "tuple[list[StreamShare], list[StreamShare]]":
+  existing_shares = dict((x.get_grn_key(), x) for x in stream.shares)
+  add = {}
+  delete = {}
+
+  for grantee in grantees:
+    grn_key = grantee.get_grn_key()
+    existing_share = existing_shares.get(grn_key)
+    if state == "absent":
+      if existing_share is not None:
+        delete[grn_key] = existing_share
+    elif existing_share is None or existing_share.capability != grantee.capability:
+      add[grn_key] = grantee
+
+  return list(add.values()), list(delete.values())
+
+
+def delete_rule(client: GraylogClient, stream: Stream, rule: dict) -> None:
+  client.request('DELETE', '/streams/%s/rules/%s' % (stream.id, rule['id']), expected_status=204)
+
+
+def add_rule(client: GraylogClient, stream: Stream, rule: dict) -> None:
+  client.request('POST', '/streams/%s/rules' % (stream.id), data=rule, expected_status=201)
+
+
+def update_rule(client: GraylogClient, stream: Stream, rule: dict) -> None:
+  data = dict((x, y) for x, y in rule.items() if x != 'id')
+  client.request('PUT', '/streams/%s/rules/%s' % (stream.id, rule['id']), data=data)
+
+
+def should_delete_stream(state: str, stream: Stream) -> bool:
+  return state == "absent" and stream is not None
+
+
+def delete_stream(client: GraylogClient, stream: Stream) -> bool:
+  client.request('DELETE', '/streams/%s' % (stream.id), expected_status=204)
+
+  return True
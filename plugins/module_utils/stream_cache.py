@@ -0,0 +1,73 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+DEFAULT_CACHE_PATH = '~/.ansible/cache/fio_graylog'
+
+
+# File based cache of the GET /streams response, shared by all tasks running on the same
+# machine. Entries are keyed by endpoint and token fingerprint and written atomically, so
+# concurrent module runs never read a partial file.
+class StreamsCache():
+
+  def __init__(self, cache_path: str, endpoint_url: str, endpoint_token: str, ttl: int):
+    token_fingerprint = hashlib.sha256(endpoint_token.encode('utf-8')).hexdigest()
+    key = hashlib.sha256(('%s\n%s' % (endpoint_url.rstrip('/'), token_fingerprint)).encode('utf-8')).hexdigest()
+    self._directory = os.path.expanduser(cache_path)
+    self._file = os.path.join(self._directory, 'streams-%s.json' % (key))
+    self._ttl = ttl
+
+
+  @property
+  def ttl(self) -> int:
+    return self._ttl
+
+
+  def load(self) -> dict:
+    try:
+      with open(self._file, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    except (OSError, ValueError):
+      return None
+
+    if not isinstance(entry, dict) or 'response' not in entry:
+      return None
+
+    return entry
+
+
+  def is_fresh(self, entry: dict) -> bool:
+    return entry is not None and time.time() - entry.get('fetched_at', 0) < self._ttl
+
+
+  def store(self, response: dict, etag: str = None) -> None:
+    entry = {
+      'fetched_at': time.time(),
+      'etag': etag,
+      'response': response
+    }
+
+    try:
+      os.makedirs(self._directory, mode=0o700, exist_ok=True)
+      fd, tmp_file = tempfile.mkstemp(dir=self._directory, prefix='.streams-')
+      with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+      os.replace(tmp_file, self._file)
+    except OSError:
+      pass
+
+
+  def invalidate(self) -> None:
+    try:
+      os.remove(self._file)
+    except OSError:
+      pass
+
+
+  def on_mutation(self, method: str, path: str) -> None:
+    if path.startswith('/streams'):
+      self.invalidate()
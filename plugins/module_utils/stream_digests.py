@@ -0,0 +1,77 @@
+from __future__ import annotations
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams
+import hashlib
+import json
+import os
+import tempfile
+
+
+# Digests of the desired state and of the listed stream after the last successful reconcile,
+# stored per stream id in a file next to the stream listing cache. While both digests still
+# match, the stream is known to be in the desired state and is skipped.
+class AppliedDigests():
+
+  def __init__(self, cache_path: str, endpoint_url: str, endpoint_token: str):
+    token_fingerprint = hashlib.sha256(endpoint_token.encode('utf-8')).hexdigest()
+    key = hashlib.sha256(('%s\n%s' % (endpoint_url.rstrip('/'), token_fingerprint)).encode('utf-8')).hexdigest()
+    self._directory = os.path.expanduser(cache_path)
+    self._file = os.path.join(self._directory, 'applied-%s.json' % (key))
+    self._entries = None
+    self._modified = False
+
+
+  def is_applied(self, stream: Stream, stream_params: StreamParams) -> bool:
+    entry = self._load().get(stream.id)
+    return entry is not None and entry == [stream_params.get_digest(), stream.get_digest(False, stream_params.started is not None)]
+
+
+  # after changes the listing is expected to reflect the desired state
+  def add(self, stream: Stream, stream_params: StreamParams, changed: bool) -> None:
+    observed = stream_params.get_digest(False) if changed else stream.get_digest(False, stream_params.started is not None)
+    self._load()[stream.id] = [stream_params.get_digest(), observed]
+    self._modified = True
+
+
+  # the entry is kept as None until stored, so it is also removed from the file
+  def discard(self, stream: Stream) -> None:
+    self._load()[stream.id] = None
+    self._modified = True
+
+
+  # merges with the file, so concurrent tasks on other streams keep their entries
+  def store(self) -> None:
+    if not self._modified:
+      return
+
+    entries = self._read()
+    entries.update(self._entries)
+    for stream_id in [x for x, y in self._entries.items() if y is None]:
+      entries.pop(stream_id, None)
+
+    try:
+      os.makedirs(self._directory, mode=0o700, exist_ok=True)
+      fd, tmp_file = tempfile.mkstemp(dir=self._directory, prefix='.applied-')
+      with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+      os.replace(tmp_file, self._file)
+    except OSError:
+      pass
+
+    self._modified = False
+
+
+  def _load(self) -> dict:
+    if self._entries is None:
+      self._entries = self._read()
+
+    return self._entries
+
+
+  def _read(self) -> dict:
+    try:
+      with open(self._file, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    except (OSError, ValueError):
+      return {}
+
+    return entries if isinstance(entries, dict) else {}
@@ -0,0 +1,97 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+
+
+DEFAULT_JOURNAL_MAX_AGE = 86400
+
+
+# Append-only journal of a bulk stream reconcile. Every stream is recorded before it is changed
+# and again once it is reconciled, so a rerun after an interruption skips the completed streams.
+# Journals are keyed by endpoint, token fingerprint and the managed stream names and are removed
+# after a successful run. Journals whose last record is older than max_age seconds are stale and
+# removed when they are loaded.
+class StreamsJournal():
+
+  def __init__(self, journal_path: str, endpoint_url: str, endpoint_token: str, names: "list[str]", max_age: int = DEFAULT_JOURNAL_MAX_AGE):
+    token_fingerprint = hashlib.sha256(endpoint_token.encode('utf-8')).hexdigest()
+    key = hashlib.sha256(('%s\n%s\n%s' % (endpoint_url.rstrip('/'), token_fingerprint, '\n'.join(sorted(names)))).encode('utf-8')).hexdigest()
+    self._directory = os.path.expanduser(journal_path)
+    self._file = os.path.join(self._directory, 'journal-%s.jsonl' % (key))
+    self._max_age = max_age
+    self._completed = None
+
+
+  @property
+  def file(self) -> str:
+    return self._file
+
+
+  # returns the completed record of the stream if it was reconciled with the same spec
+  def get_completed(self, name: str, digest: str) -> dict:
+    if self._completed is None:
+      self._completed = self._load()
+
+    record = self._completed.get(name)
+    if record is None or record.get('digest') != digest:
+      return None
+
+    return record
+
+
+  def start(self, name: str, digest: str) -> None:
+    self._append({ 'name': name, 'digest': digest, 'status': 'started' })
+
+
+  def complete(self, name: str, digest: str, changed: bool) -> None:
+    self._append({ 'name': name, 'digest': digest, 'status': 'completed', 'changed': changed })
+
+
+  def remove(self) -> None:
+    try:
+      os.remove(self._file)
+    except OSError:
+      pass
+
+
+  def _load(self) -> "dict[str, dict]":
+    completed = {}
+    last_at = None
+    try:
+      with open(self._file, 'r', encoding='utf-8') as f:
+        for line in f:
+          try:
+            record = json.loads(line)
+          except ValueError:
+            # the last line of an interrupted run may be incomplete
+            continue
+
+          last_at = record.get('at', 0)
+          if record.get('status') == 'completed':
+            completed[record.get('name')] = record
+          else:
+            completed.pop(record.get('name'), None)
+    except OSError:
+      pass
+
+    if last_at is not None and time.time() - last_at > self._max_age:
+      self.remove()
+      return {}
+
+    return completed
+
+
+  def _append(self, record: dict) -> None:
+    record['at'] = time.time()
+    try:
+      os.makedirs(self._directory, mode=0o700, exist_ok=True)
+      with open(self._file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    except OSError:
+      pass
+
+
+def get_spec_digest(spec: dict) -> str:
+  return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()
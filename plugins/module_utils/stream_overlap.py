@@ -0,0 +1,91 @@
+from __future__ import annotations
+from ansible_collections.fio.graylog.plugins.module_utils.streams import RULE_TYPES, StreamBase
+
+
+# Reports the rules shared by several streams, rules repeated within a stream, streams with
+# identical rule sets, AND streams whose rules include all rules of another AND stream (they
+# only receive messages the other stream receives as well) and the rule count per field.
+# Every rule is visited once, superset candidates are taken from the posting list of the rarest
+# rule of a stream.
+def analyze_stream_overlaps(streams: "list[StreamBase]") -> dict:
+  rule_ids = {}
+  rules = []
+  postings = []
+  rule_sets = []
+  redundant_rules = []
+  fields = {}
+  rule_count = 0
+
+  for index, stream in enumerate(streams):
+    counts = {}
+    for rule in stream.rules:
+      key = get_canonical_rule_key(rule)
+      rule_id = rule_ids.get(key)
+      if rule_id is None:
+        rule_id = rule_ids[key] = len(rules)
+        rules.append(dict(zip(('field', 'value', 'type', 'inverted'), key)))
+        postings.append([])
+
+      counts[rule_id] = counts.get(rule_id, 0) + 1
+      rule_count += 1
+
+      field = fields.setdefault(key[0], [0, set()])
+      field[0] += 1
+      field[1].add(index)
+
+    for rule_id, count in counts.items():
+      postings[rule_id].append(index)
+      if count > 1:
+        redundant_rules.append({ 'stream': stream.title, 'rule': rules[rule_id], 'count': count })
+
+    rule_sets.append(frozenset(counts))
+
+  groups = {}
+  for index, stream in enumerate(streams):
+    if len(rule_sets[index]) > 0:
+      groups.setdefault((stream.matching_type, rule_sets[index]), []).append(index)
+
+  return {
+    'streams': len(streams),
+    'rules': rule_count,
+    'distinct_rules': len(rules),
+    'shared_rules': sorted(
+      ({ 'rule': rules[x], 'streams': [streams[y].title for y in postings[x]] } for x in range(len(rules)) if len(postings[x]) > 1),
+      key=lambda x: -len(x['streams'])),
+    'redundant_rules': redundant_rules,
+    'duplicate_streams': [[streams[y].title for y in x] for x in groups.values() if len(x) > 1],
+    'supersets': get_supersets(streams, rule_sets, postings, groups),
+    'fields': sorted(
+      ({ 'field': x, 'rules': y[0], 'streams': len(y[1]) } for x, y in fields.items()),
+      key=lambda x: (-x['rules'], str(x['field'])))
+  }
+
+
+def get_supersets(streams: "list[StreamBase]", rule_sets: "list[frozenset]", postings: "list[list[int]]", groups: dict) -> "list[dict]":
+  # streams with identical rules are represented by the first of them
+  representatives = set(x[0] for (matching_type, _), x in groups.items() if matching_type != 'OR')
+
+  subsets = {}
+  for subset_index in representatives:
+    subset = rule_sets[subset_index]
+    rarest_rule = min(subset, key=lambda x: len(postings[x]))
+    for index in postings[rarest_rule]:
+      if index in representatives and len(rule_sets[index]) > len(subset) and subset <= rule_sets[index]:
+        subsets.setdefault(index, []).append(subset_index)
+
+  return [{ 'stream': streams[x].title, 'superset_of': [streams[y].title for y in sorted(subsets[x])] } for x in sorted(subsets)]
+
+
+# rules which match the same messages get the same key, ignoring the parts Graylog ignores
+def get_canonical_rule_key(rule: dict) -> tuple:
+  rule_type = rule.get('type')
+  if rule_type == RULE_TYPES['always_match']:
+    return ('', '', rule_type, False)
+
+  if rule_type == RULE_TYPES['presence']:
+    return (rule.get('field'), '', rule_type, rule.get('inverted'))
+
+  if rule_type == RULE_TYPES['match_input']:
+    return ('', rule.get('value'), rule_type, rule.get('inverted'))
+
+  return (rule.get('field'), rule.get('value'), rule_type, rule.get('inverted'))
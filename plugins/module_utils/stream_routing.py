@@ -0,0 +1,242 @@
+from __future__ import annotations
+from ansible_collections.fio.graylog.plugins.module_utils.streams import RULE_TYPES, StreamBase
+from bisect import bisect_left, bisect_right
+import re
+
+
+# message field Graylog compares the rules of type match_input with
+SOURCE_INPUT_FIELD = 'gl2_source_input'
+
+# the most selective rule of an AND stream is indexed, the smaller the better
+_ANCHOR_PRIORITY = {
+  RULE_TYPES['exact']: 0,
+  RULE_TYPES['match_input']: 0,
+  RULE_TYPES['contains']: 1,
+  RULE_TYPES['regex']: 1,
+  RULE_TYPES['greater']: 2,
+  RULE_TYPES['smaller']: 2,
+  RULE_TYPES['presence']: 3
+}
+
+
+# Routes messages to streams with the rule semantics of Graylog's stream router. Every AND stream
+# is indexed by its most selective rule and all its rules are only evaluated for messages hitting
+# that rule. OR streams are indexed by all their rules, a hit is a match. Streams which may match
+# without a hit (inverted rules, always_match) are evaluated for every message. Streams are
+# evaluated regardless of being paused.
+class StreamRouter():
+
+  def __init__(self, streams: "list[StreamBase]"):
+    self._titles = []
+    self._and = []
+    self._always = []
+    # per stream: [ (field, matcher, inverted) ], without always_match rules
+    self._rules = []
+    self._index = RuleIndex()
+    self._unconditional = []
+
+    for stream in streams:
+      self._add_stream(stream)
+
+
+  def __len__(self) -> int:
+    return len(self._titles)
+
+
+  # returns the titles of the matching streams in the order they were given
+  def route(self, message: dict) -> "list[str]":
+    return [self._titles[x] for x in self.route_indexes(message)]
+
+
+  def route_indexes(self, message: dict) -> "list[int]":
+    hits = self._index.find(message)
+    matches = [x for x in hits if not self._and[x] or self._matches(x, message)]
+    matches.extend(x for x in self._unconditional if x not in hits and self._matches(x, message))
+    return sorted(matches)
+
+
+  def _matches(self, stream: int, message: dict) -> bool:
+    rules = self._rules[stream]
+    if self._and[stream]:
+      # a stream without rules never matches
+      return (len(rules) > 0 or self._always[stream]) and all(evaluate_rule(x, message) for x in rules)
+
+    return self._always[stream] or any(evaluate_rule(x, message) for x in rules)
+
+
+  def _add_stream(self, stream: StreamBase) -> None:
+    index = len(self._titles)
+    is_and = stream.matching_type != 'OR'
+    always = False
+    rules = []
+    anchor = None
+
+    # identical rules of a stream are evaluated once
+    for rule in dict((stream.get_rule_key(x), x) for x in stream.rules).values():
+      rule_type = rule.get('type')
+      if rule_type == RULE_TYPES['always_match']:
+        always = True
+        continue
+
+      inverted = rule.get('inverted') is True
+      field = SOURCE_INPUT_FIELD if rule_type == RULE_TYPES['match_input'] else rule.get('field')
+      rules.append((field, create_matcher(stream, rule), inverted))
+
+      if inverted:
+        continue
+
+      if not is_and:
+        self._index.add(index, rule_type, field, rule.get('value'), rules[-1][1])
+      elif anchor is None or _ANCHOR_PRIORITY[rule_type] < _ANCHOR_PRIORITY[anchor.get('type')]:
+        anchor = rule
+
+    if anchor is not None:
+      anchor_type = anchor.get('type')
+      anchor_field = SOURCE_INPUT_FIELD if anchor_type == RULE_TYPES['match_input'] else anchor.get('field')
+      self._index.add(index, anchor_type, anchor_field, anchor.get('value'), create_matcher(stream, anchor))
+    elif (is_and and (len(rules) > 0 or always)) or (not is_and and (always or any(x[2] for x in rules))):
+      self._unconditional.append(index)
+
+    self._titles.append(stream.title)
+    self._and.append(is_and)
+    self._always.append(always)
+    self._rules.append(rules)
+
+
+
+# positive rules by field: exact values in a dict, number limits sorted, other rules in a list
+class RuleIndex():
+
+  def __init__(self):
+    self._exact = {}
+    self._greater = {}
+    self._smaller = {}
+    self._matchers = {}
+    self._fields = set()
+    self._sorted = True
+
+
+  def add(self, stream: int, rule_type, field: str, value, matcher) -> None:
+    self._fields.add(field)
+
+    if rule_type == RULE_TYPES['exact'] or rule_type == RULE_TYPES['match_input']:
+      self._exact.setdefault(field, {}).setdefault(value, []).append(stream)
+    elif (rule_type == RULE_TYPES['greater'] or rule_type == RULE_TYPES['smaller']) and to_number(value) is not None:
+      limits = self._greater if rule_type == RULE_TYPES['greater'] else self._smaller
+      limits.setdefault(field, []).append((to_number(value), stream))
+      self._sorted = False
+    else:
+      self._matchers.setdefault(field, []).append((matcher, stream))
+
+
+  # returns the streams with a matching rule
+  def find(self, message: dict) -> "set[int]":
+    if not self._sorted:
+      self._sort()
+
+    hits = set()
+    for field in self._fields.intersection(message):
+      value = message[field]
+      if value is None:
+        continue
+
+      text = to_text(value)
+      exact = self._exact.get(field)
+      if exact is not None:
+        hits.update(exact.get(text, ()))
+
+      number = None
+      if field in self._greater or field in self._smaller:
+        number = to_number(value)
+
+      if number is not None and field in self._greater:
+        limits, streams = self._greater[field]
+        hits.update(streams[:bisect_left(limits, number)])
+
+      if number is not None and field in self._smaller:
+        limits, streams = self._smaller[field]
+        hits.update(streams[bisect_right(limits, number):])
+
+      for matcher, stream in self._matchers.get(field, ()):
+        if stream not in hits and matcher(value, text):
+          hits.add(stream)
+
+    return hits
+
+
+  def _sort(self) -> None:
+    for limits in (self._greater, self._smaller):
+      for field, entries in limits.items():
+        if isinstance(entries, list):
+          entries.sort(key=lambda x: x[0])
+          limits[field] = ([x[0] for x in entries], [x[1] for x in entries])
+
+    self._sorted = True
+
+
+
+# returns a callable(value, text) evaluating the positive form of the rule on a present field
+def create_matcher(stream: StreamBase, rule: dict):
+  rule_type = rule.get('type')
+  rule_value = rule.get('value')
+
+  if rule_type == RULE_TYPES['exact'] or rule_type == RULE_TYPES['match_input']:
+    return lambda value, text: text == rule_value
+
+  if rule_type == RULE_TYPES['regex']:
+    try:
+      pattern = re.compile(rule_value, re.DOTALL)
+    except re.error as e:
+      raise ValueError("Invalid regex '%s' in a rule of stream '%s': %s" % (rule_value, stream.title, e))
+    return lambda value, text: pattern.search(text) is not None
+
+  if rule_type == RULE_TYPES['greater'] or rule_type == RULE_TYPES['smaller']:
+    limit = to_number(rule_value)
+    if limit is None:
+      return lambda value, text: False
+
+    if rule_type == RULE_TYPES['greater']:
+      return lambda value, text: compare_number(value, limit) > 0
+    return lambda value, text: compare_number(value, limit) < 0
+
+  if rule_type == RULE_TYPES['presence']:
+    return lambda value, text: not isinstance(value, str) or value.strip() != ''
+
+  if rule_type == RULE_TYPES['contains']:
+    return lambda value, text: rule_value in text
+
+  raise ValueError("Unsupported rule type '%s' in a rule of stream '%s'" % (rule_type, stream.title))
+
+
+# no rule matches an absent field, an inverted rule matches if its positive form does not
+def evaluate_rule(rule: tuple, message: dict) -> bool:
+  field, matcher, inverted = rule
+  value = message.get(field)
+  return (value is not None and matcher(value, to_text(value))) is not inverted
+
+
+# values are compared in the string form Graylog uses
+def to_text(value) -> str:
+  if isinstance(value, bool):
+    return 'true' if value else 'false'
+
+  return str(value)
+
+
+def to_number(value) -> float:
+  if isinstance(value, bool):
+    return None
+
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+
+# returns 1, -1 or 0, where 0 also means the value is not a number
+def compare_number(value, limit: float) -> int:
+  number = to_number(value)
+  if number is None or number == limit:
+    return 0
+
+  return 1 if number > limit else -1
@@ -1,16 +1,22 @@
 from __future__ import annotations
+from collections.abc import Mapping
 from typing import Tuple
+import hashlib
+import json
 import re
 
 
+# the models use slots, as bulk and info runs hold thousands of streams
 class StreamBase():
 
+  __slots__ = ('_title', '_description', '_index_set_id', '_started', '_rules', '_shares')
+
   def __init__(self):
     self._title = ""
     self._description = ""
     self._index_set_id = ""
     self._started = False
-    self._rules = []
+    self._rules = ()
     self._shares = []
 
 
@@ -55,13 +61,19 @@ class StreamBase():
 
 
   @property
-  def rules(self) -> list:
+  def rules(self) -> "tuple[dict, ...]":
     return self._rules
 
 
   @rules.setter
   def rules(self, value) -> None:
-    self._rules = value
+    self._rules = tuple(value)
+
+
+  # streams created by this collection match messages matching all rules
+  @property
+  def matching_type(self) -> str:
+    return 'AND'
 
 
   @property
@@ -74,6 +86,20 @@ class StreamBase():
     self._shares = value
 
 
+  # canonical digest of the stream state, shares and started are only included if requested and managed
+  def get_digest(self, include_shares: bool = True, include_started: bool = True) -> str:
+    state = [
+      self.title,
+      self.description,
+      self.index_set_id,
+      self.started if include_started else None,
+      sorted(set(json.dumps(self.get_rule_key(x) + (x.get('description') or '',)) for x in self.rules)),
+      None if not include_shares or self.shares is None else sorted(set(json.dumps(self.get_share_key(x)) for x in self.shares))
+    ]
+
+    return hashlib.sha256(json.dumps(state, default=str).encode('utf-8')).hexdigest()
+
+
   def equals(self, stream: "StreamBase") -> bool:    
     return (
       self.properties_are_equal(stream)
@@ -83,6 +109,20 @@ class StreamBase():
     )
 
 
+  def get_changes(self, stream_params: "StreamBase") -> "StreamChanges":
+    rules_add, rules_update, rules_delete = self.get_rules_plan(stream_params)
+    shares_add, shares_delete = self.get_shares_changes(stream_params)
+
+    return StreamChanges(
+      properties=self.properties_are_equal(stream_params) is False,
+      started=self.started_is_equal(stream_params) is False,
+      rules_add=rules_add,
+      rules_update=rules_update,
+      rules_delete=rules_delete,
+      shares_add=shares_add,
+      shares_delete=shares_delete)
+
+
   def properties_are_equal(self, stream: "StreamBase") -> bool:
     return (
       self.title == stream.title
@@ -92,76 +132,139 @@ class StreamBase():
 
 
   def started_is_equal(self, stream: "StreamBase") -> bool:
+    if stream.started is None:
+      return True
+
     return self.started == stream.started
 
 
   def rules_are_equal(self, stream: "StreamBase") -> bool:
-    add, delete = self.get_rules_changes(stream)
-    return len(add) == 0 and len(delete) == 0
+    add, update, delete = self.get_rules_plan(stream)
+    return len(add) == 0 and len(update) == 0 and len(delete) == 0
 
 
   def shares_are_equal(self, stream: "StreamBase") -> bool:
+    if stream.shares is None:
+      return True
+
     add, delete = self.get_shares_changes(stream)
     return len(add) == 0 and len(delete) == 0
 
 
   # returns tuple(add, delete) lists
-  def get_rules_changes(self, stream_params: "StreamBase") -> "Tuple[list, list]":   
-    add_list = []
-    delete_list = []
+  def get_rules_changes(self, stream_params: "StreamBase") -> "Tuple[list, list]":
+    return self._get_changes(self.rules, stream_params.rules, self.get_rule_key)
 
-    for item in self.rules:
-      if len(stream_params.rules) == 0 or any(x for x in stream_params.rules if self._rule_equals(x, item)) is False:
-        delete_items = [x for x in self.rules if self._rule_equals(x, item)]
-        for delete_item in delete_items:
-          if (any(x for x in delete_list if x == delete_item) is False):
-            delete_list.append(delete_item)
 
-    for item in stream_params.rules:
-      existing_items = [x for x in self.rules if self._rule_equals(x, item)]
-      if (len(existing_items) == 0):
-        add_list.append(item)
-      elif (len(existing_items) > 1):
-        for existing_item in existing_items[1:]:
-          delete_list.append(existing_item)
+  # returns tuple(add, update, delete) lists, a deleted and an added rule are paired to an update
+  # of the existing rule by the id of the desired rule or else by field and type. Descriptions
+  # are only compared if the desired rule has one.
+  def get_rules_plan(self, stream_params: "StreamBase") -> "Tuple[list, list, list]":
+    add, delete = self.get_rules_changes(stream_params)
+    add_list = []
+    update_list = []
+
+    # candidates are popped from the end, so they are paired in order
+    unpaired = list(delete)
+    index_by_id = dict((x.get('id'), i) for i, x in enumerate(delete) if x.get('id') is not None)
+    indexes_by_field = {}
+    for i in reversed(range(len(delete))):
+      indexes_by_field.setdefault((strip_rule_text(delete[i].get('field')), delete[i].get('type')), []).append(i)
+
+    for rule in add:
+      index = index_by_id.get(rule.get('id'))
+      if index is None or unpaired[index] is None:
+        index = None
+        candidates = indexes_by_field.get((strip_rule_text(rule.get('field')), rule.get('type')), [])
+        while len(candidates) > 0 and index is None:
+          index = candidates.pop()
+          if unpaired[index] is None:
+            index = None
+
+      if index is None:
+        add_list.append(rule)
+      else:
+        update_list.append(self._get_rule_update(unpaired[index], rule))
+        unpaired[index] = None
+
+    existing_by_key = {}
+    for rule in self.rules:
+      existing_by_key.setdefault(self.get_rule_key(rule), rule)
 
-    return add_list, delete_list
+    for rule in stream_params.rules:
+      existing = existing_by_key.get(self.get_rule_key(rule))
+      if existing is not None and rule.get('description') is not None and rule.get('description') != existing.get('description'):
+        update_list.append(self._get_rule_update(existing, rule))
+        # later duplicates of the desired rule are not updated again
+        existing_by_key.pop(self.get_rule_key(rule))
+
+    return add_list, update_list, [x for x in unpaired if x is not None]
 
 
   # returns tuple(add, delete) lists
-  def get_shares_changes(self, stream_params: "StreamBase") -> "Tuple[list[StreamShare], list[StreamShare]]":   
+  def get_shares_changes(self, stream_params: "StreamBase") -> "Tuple[list[StreamShare], list[StreamShare]]":
+    if stream_params.shares is None:
+      return [], []
+
+    return self._get_changes(self.shares, stream_params.shares, self.get_share_key)
+
+
+  # existing items are grouped by key, so every key is visited once: items without a desired
+  # counterpart and duplicates of a kept item are deleted, desired items without an existing
+  # counterpart are added once
+  def _get_changes(self, existing: list, desired: list, key) -> "Tuple[list, list]":
     add_list = []
     delete_list = []
 
-    for item in self.shares:
-      if len(stream_params.shares) == 0 or any(x for x in stream_params.shares if self._share_equals(x, item)) is False:
-        delete_items = [x for x in self.shares if self._share_equals(x, item)]
-        for delete_item in delete_items:
-          if (any(x for x in delete_list if x == delete_item) is False):
-            delete_list.append(delete_item)
+    existing_by_key = {}
+    for item in existing:
+      existing_by_key.setdefault(key(item), []).append(item)
+
+    desired_by_key = {}
+    for item in desired:
+      desired_by_key.setdefault(key(item), item)
 
-    for item in stream_params.shares:
-      existing_items = [x for x in self.shares if self._share_equals(x, item)]
-      if (len(existing_items) == 0):
+    for item_key, items in existing_by_key.items():
+      if item_key not in desired_by_key:
+        delete_list.extend(items)
+      else:
+        delete_list.extend(items[1:])
+
+    for item_key, item in desired_by_key.items():
+      if item_key not in existing_by_key:
         add_list.append(item)
-      elif (len(existing_items) > 1):
-        for existing_item in existing_items[1:]:
-          delete_list.append(existing_item)
 
     return add_list, delete_list
 
 
+  # field and value are compared without surrounding whitespace, rules keep it when they are sent
+  def get_rule_key(self, rule: dict) -> tuple:
+    return (strip_rule_text(rule.get('field')), strip_rule_text(rule.get('value')), rule.get('type'), rule.get('inverted'))
+
+
+  # the desired rule with the id of the existing rule, keeping its description if none is given
+  def _get_rule_update(self, existing: dict, desired: dict) -> dict:
+    description = desired.get('description')
+    return {
+      'id': existing.get('id'),
+      'field': desired.get('field'),
+      'value': desired.get('value'),
+      'type': desired.get('type'),
+      'inverted': desired.get('inverted'),
+      'description': existing.get('description') if description is None else description
+    }
+
+
+  def get_share_key(self, share: StreamShare) -> tuple:
+    return (share.type, share.id, share.capability)
+
+
   def _rule_equals(self, a: dict, b: dict) -> bool:
-    return (a.get('field') == b.get('field')
-      and a.get('value') == b.get('value')
-      and a.get('type') == b.get('type')
-      and a.get('inverted') == b.get('inverted'))
+    return self.get_rule_key(a) == self.get_rule_key(b)
 
 
-  def _share_equals(self, a: StreamShare, b: StreamShare) -> bool:   
-    return (a.type == b.type
-      and a.id == b.id
-      and a.capability == b.capability)
+  def _share_equals(self, a: StreamShare, b: StreamShare) -> bool:
+    return self.get_share_key(a) == self.get_share_key(b)
 
 
   def __str__(self) -> str:
@@ -178,15 +281,84 @@ class StreamBase():
 
 
 
+class StreamChanges():
+
+  __slots__ = ('_properties', '_started', '_rules_add', '_rules_update', '_rules_delete', '_shares_add', '_shares_delete')
+
+  def __init__(self, properties: bool = False, started: bool = False, rules_add: list = None, rules_delete: list = None, shares_add: "list[StreamShare]" = None, shares_delete: "list[StreamShare]" = None, rules_update: list = None):
+    self._properties = properties
+    self._started = started
+    self._rules_add = rules_add or []
+    self._rules_update = rules_update or []
+    self._rules_delete = rules_delete or []
+    self._shares_add = shares_add or []
+    self._shares_delete = shares_delete or []
+
+
+  @property
+  def properties(self) -> bool:
+    return self._properties
+
+
+  @property
+  def started(self) -> bool:
+    return self._started
+
+
+  @property
+  def rules_add(self) -> list:
+    return self._rules_add
+
+
+  @property
+  def rules_update(self) -> list:
+    return self._rules_update
+
+
+  @property
+  def rules_delete(self) -> list:
+    return self._rules_delete
+
+
+  @property
+  def shares_add(self) -> "list[StreamShare]":
+    return self._shares_add
+
+
+  @property
+  def shares_delete(self) -> "list[StreamShare]":
+    return self._shares_delete
+
+
+  @property
+  def rules(self) -> bool:
+    return len(self.rules_add) > 0 or len(self.rules_update) > 0 or len(self.rules_delete) > 0
+
+
+  @property
+  def shares(self) -> bool:
+    return len(self.shares_add) > 0 or len(self.shares_delete) > 0
+
+
+  def has_changes(self) -> bool:
+    return self.properties or self.started or self.rules or self.shares
+
+
+
 class StreamParams(StreamBase):
-  
+
+  __slots__ = ()
+
   def __init__(self, params: dict):
     super().__init__()
     self.title = params.get('name', '')
     self.description = params.get('name', '')
     self.index_set_id = params.get('index_set_id', '')
-    self.rules = params.get('rules', [])
-    self.shares = [StreamShare().load_from_params(x) for x in params.get('shares', [])]
+    # None means the started state of the stream is not managed
+    self.started = params.get('started')
+    self.rules = [normalize_rule(x) for x in params.get('rules') or []]
+    # None means the shares of the stream are not managed
+    self.shares = None if params.get('shares') is None else [StreamShare().load_from_params(x) for x in params['shares']]
 
 
   def map_to_dto(self, destination: dict = None) -> dict:
@@ -197,7 +369,7 @@ class StreamParams(StreamBase):
     destination['description'] = self.description
     destination['remove_matches_from_default_stream'] = True
     destination['index_set_id'] = self.index_set_id
-    destination['rules'] = self.rules
+    destination['rules'] = list(self.rules)
 
     return destination
 
@@ -205,17 +377,27 @@ class StreamParams(StreamBase):
 
 class Stream(StreamBase):
 
+  # fields of the listing which are sent back when the stream is updated
+  UPDATE_FIELDS = ('title', 'description', 'index_set_id', 'matching_type', 'remove_matches_from_default_stream', 'content_pack')
+
+  __slots__ = ('_id', '_dto', '_shares_dto', '_shares_loader', '_deletable')
+
   def __init__(self, dto: dict):
     super().__init__()
-    self._dto = dto
+    self._dto = dict((x, dto[x]) for x in self.UPDATE_FIELDS if x in dto)
     self._shares_dto = None
+    self._shares_loader = None
     self._id = dto.get('id', '')
+    # the default stream and the system event streams can not be deleted
+    self._deletable = dto.get('is_default') is not True and dto.get('is_editable') is not False
     self.title = dto.get('title', '')
     self.description = dto.get('description', '')
     self.index_set_id = dto.get('index_set_id', '')
-    self.rules = dto.get('rules', [])
+    self.started = dto.get('disabled') is False
+    self.rules = [StreamRule(normalize_rule(x)) for x in dto.get('rules') or []]
 
 
+  # the listing fields needed to update the stream
   @property
   def dto(self) -> dict:
     return self._dto
@@ -226,8 +408,26 @@ class Stream(StreamBase):
     self._dto = value
 
 
+  @property
+  def matching_type(self) -> str:
+    return self._dto.get('matching_type') or 'AND'
+
+
+  @property
+  def shares(self) -> "list[StreamShare]":
+    self._load_shares()
+    return self._shares
+
+
+  @shares.setter
+  def shares(self, value) -> None:
+    self._shares_loader = None
+    self._shares = value
+
+
   @property
   def shares_dto(self) -> dict:
+    self._load_shares()
     return self._shares_dto
 
 
@@ -236,6 +436,26 @@ class Stream(StreamBase):
     self._shares_dto = value
 
 
+  # callable returning tuple(shares, shares_dto), invoked on first access of the shares
+  @property
+  def shares_loader(self):
+    return self._shares_loader
+
+
+  @shares_loader.setter
+  def shares_loader(self, value) -> None:
+    self._shares_loader = value
+
+
+  def _load_shares(self) -> None:
+    if self._shares_loader is None:
+      return
+
+    loader = self._shares_loader
+    self._shares_loader = None
+    self._shares, self._shares_dto = loader()
+
+
   @property
   def id(self) -> str:
     return self._id
@@ -246,9 +466,61 @@ class Stream(StreamBase):
     self._id = value
 
 
+  def is_deletable(self) -> bool:
+    return self._deletable
+
+
+  def map_to_info(self, include_shares: bool = True) -> dict:
+    info = {
+      'id': self.id,
+      'title': self.title,
+      'description': self.description,
+      'index_set_id': self.index_set_id,
+      'started': self.started,
+      'matching_type': self.matching_type,
+      'rules': [dict((x, rule.get(x)) for x in ('id', 'field', 'value', 'type', 'inverted', 'description')) for rule in self.rules]
+    }
+
+    if include_shares:
+      info['shares'] = [x.map_to_params() for x in self.shares]
+
+    return info
+
+
+
+# immutable rule of an existing stream, readable like the rule dicts of the module params
+class StreamRule(tuple):
+
+  __slots__ = ()
+
+  FIELDS = ('id', 'field', 'value', 'type', 'inverted', 'description')
+  _INDEX = dict((x, i) for i, x in enumerate(FIELDS))
+
+  def __new__(cls, dto: dict):
+    return tuple.__new__(cls, [dto.get(x) for x in cls.FIELDS])
+
+
+  def __getitem__(self, key):
+    if isinstance(key, str):
+      return tuple.__getitem__(self, self._INDEX[key])
+
+    return tuple.__getitem__(self, key)
+
+
+  def get(self, key: str, default=None):
+    index = self._INDEX.get(key)
+    return default if index is None else tuple.__getitem__(self, index)
+
+
+  def map_to_dto(self) -> dict:
+    return dict(zip(self.FIELDS, self))
+
+
 
 class StreamShare():
-  
+
+  __slots__ = ('_type', '_id', '_capability')
+
   def __init__(self, type: str = "", id: str = "", capability: str = ""):
     self._type = type
     self._id = id
@@ -301,5 +573,160 @@ class StreamShare():
     return self
 
 
+  def map_to_params(self) -> dict:
+    return { 'type': self.type, 'id': self.id, 'capability': self.capability }
+
+
   def get_grn_key(self) -> str:
     return 'grn::::%s:%s' % (self.type, self.id)
+
+
+
+class StreamIndex():
+
+  __slots__ = ('_by_title', '_by_id', '_duplicate_titles')
+
+  # with titles given only the streams carrying one of these titles are kept
+  def __init__(self, dtos: "list[dict]" = None, titles: "set[str]" = None):
+    self._by_title = {}
+    self._by_id = {}
+    self._duplicate_titles = {}
+
+    for dto in dtos or []:
+      if titles is None or dto.get('title') in titles:
+        self.add(Stream(dto))
+
+
+  @property
+  def duplicate_titles(self) -> "dict[str, list[str]]":
+    return self._duplicate_titles
+
+
+  def add(self, stream: Stream) -> None:
+    self._by_id[stream.id] = stream
+
+    existing_stream = self._by_title.get(stream.title)
+    if existing_stream is None:
+      self._by_title[stream.title] = stream
+    elif stream.title in self._duplicate_titles:
+      self._duplicate_titles[stream.title].append(stream.id)
+    else:
+      self._duplicate_titles[stream.title] = [existing_stream.id, stream.id]
+
+
+  def remove_title(self, title: str) -> None:
+    stream = self._by_title.pop(title, None)
+    if stream is None:
+      return
+
+    for id in self._duplicate_titles.pop(title, [stream.id]):
+      self._by_id.pop(id, None)
+
+
+  def get_by_title(self, title: str) -> Stream:
+    return self._by_title.get(title)
+
+
+  def get_by_id(self, id: str) -> Stream:
+    return self._by_id.get(id)
+
+
+  def __len__(self) -> int:
+    return len(self._by_id)
+
+
+  def __iter__(self):
+    return iter(self._by_id.values())
+
+
+
+# stream specs of the modules are identified by name, streams of the listing or of
+# graylog_stream_info by title
+def load_stream(stream) -> StreamBase:
+  if isinstance(stream, StreamBase):
+    return stream
+
+  if not isinstance(stream, Mapping):
+    raise TypeError('expected streams as dicts, got %s' % (type(stream).__name__))
+
+  if 'name' in stream:
+    return StreamParams(stream)
+
+  return Stream(stream)
+
+
+
+# Graylog stream rule types by the names accepted in rule params
+RULE_TYPES = {
+  'exact': 1,
+  'regex': 2,
+  'greater': 3,
+  'smaller': 4,
+  'presence': 5,
+  'contains': 6,
+  'always_match': 7,
+  'match_input': 8
+}
+
+_TRUE_VALUES = ('true', 'yes', 'on', 'y', '1')
+_FALSE_VALUES = ('false', 'no', 'off', 'n', '0', '')
+
+
+# rules of the params and of the listing are normalized the same way before they are compared,
+# values which can not be interpreted are kept and left to Graylog to reject
+def normalize_rule(rule: dict) -> dict:
+  normalized = dict(rule)
+  normalized['value'] = normalize_rule_value(rule.get('value'))
+  normalized['type'] = normalize_rule_type(rule.get('type'))
+  normalized['inverted'] = normalize_bool(rule.get('inverted'))
+  return normalized
+
+
+def normalize_rule_type(value):
+  if value is None:
+    return RULE_TYPES['exact']
+
+  if isinstance(value, str):
+    name = value.strip().lower()
+    if name.isdigit():
+      return int(name)
+    return RULE_TYPES.get(name, value)
+
+  return value
+
+
+def normalize_rule_value(value) -> str:
+  if value is None:
+    return ''
+
+  if isinstance(value, str):
+    return value
+
+  if isinstance(value, bool):
+    return str(value).lower()
+
+  return str(value)
+
+
+def strip_rule_text(value):
+  return value.strip() if isinstance(value, str) else value
+
+
+def normalize_bool(value, default: bool = False):
+  if value is None:
+    return default
+
+  if isinstance(value, bool):
+    return value
+
+  if isinstance(value, int) and value in (0, 1):
+    return value == 1
+
+  if isinstance(value, str):
+    name = value.strip().lower()
+    if name in _TRUE_VALUES:
+      return True
+    if name in _FALSE_VALUES:
+      return False
+
+  return value
@@ -4,11 +4,10 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.urls import fetch_url, to_text
-from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams, StreamShare
-import base64
-import copy
-import json
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import add_timings, create_applied_digests, create_client, create_streams_cache, get_stream_index, reconcile_stream, warn_duplicate_titles
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import DEFAULT_CACHE_PATH
+from ansible_collections.fio.graylog.plugins.module_utils.streams import StreamParams
 
 
 DOCUMENTATION = r'''
@@ -35,6 +34,54 @@ options:
     description: Validate certs for endpoint_url.
     required: false
     type: bool
+    default: true
+  parallelism:
+    description:
+      - Maximum number of concurrent rule add/update/delete requests while updating a stream.
+      - Changes of the same rule are always applied in order, deletes before updates before adds.
+    required: false
+    type: int
+    default: 1
+  cache_ttl:
+    description:
+      - Seconds a cached stream listing of the endpoint is reused by later tasks without asking Graylog.
+      - Expired entries are revalidated with C(If-None-Match) if Graylog returned an ETag.
+      - The entry is dropped whenever this collection changes a stream. C(0) disables the cache.
+      - "The cache and its invalidation are local to the host executing the module, changes made from other hosts are not noticed until the entry expires. Only use it if all tasks of the endpoint run on one host, for example with C(delegate_to: localhost) or C(run_once: true)."
+    required: false
+    type: int
+    default: 0
+  cache_path:
+    description: Directory of the stream listing cache on the host executing the module.
+    required: false
+    type: path
+    default: ~/.ansible/cache/fio_graylog
+  timings:
+    description: Return the method, path, status, size and duration of every Graylog API call and a summary per endpoint as C(timings).
+    required: false
+    type: bool
+    default: false
+  skip_unchanged:
+    description:
+      - Remember a digest of the desired state and of the listed stream in I(cache_path) after every successful run.
+      - While both digests match on later runs, the stream is skipped without requesting its shares or comparing it.
+      - Changes made outside of this collection are still detected if they show up in the stream listing (title, description, Index-Set, started, rules), share changes are not.
+    required: false
+    type: bool
+    default: false
+  retries:
+    description:
+      - Number of times a failed API call is repeated after an exponential backoff with jitter.
+      - Calls are repeated on connection errors and on HTTP 429, 502, 503 and 504, honouring C(Retry-After).
+      - Creating streams and rules is only repeated if Graylog did not receive the request or answered with HTTP 429.
+    required: false
+    type: int
+    default: 3
+  retry_delay:
+    description: Base delay in seconds of the backoff between retries, doubled for every further attempt.
+    required: false
+    type: float
+    default: 1
   state:
     description: The desired state.
     required: true
@@ -50,23 +97,40 @@ options:
     required: true
     type: str
   rules:
-    description: Rules for the stream.
+    description:
+      - Rules for the stream.
+      - A changed rule is updated in place if it has the C(id) of an existing rule or the same C(field) and C(type) as a removed one.
+      - The C(description) of a rule is only compared if it is given.
+      - C(type) is the Graylog rule type number or one of C(exact) (default), C(regex), C(greater), C(smaller), C(presence), C(contains), C(always_match) and C(match_input).
+      - C(inverted) defaults to false, C(field) and C(value) are compared without surrounding whitespace, but sent as given.
     required: false
     type: list
     default: []
   shares:
-    description: Shares for the stream.
+    description:
+      - Shares for the stream.
+      - If omitted, the shares of the stream are not managed and not requested from Graylog.
     required: false
     type: list
-    default: []
   started:
-    description: Flag indicating if the stream should be in started state.
+    description:
+      - Flag indicating if the stream should be in started state.
+      - If omitted, the stream is neither started nor paused, new streams are created paused.
+    required: false
+    type: bool
+  controller:
+    description:
+      - Call Graylog directly from the controller process instead of executing the module on the target host.
+      - The items of a loop share the connections and the stream listing fetched for the first item, no module is transferred.
+      - Streams changed by other tasks or hosts while the loop runs are not noticed, apart from the streams changed by the loop itself.
     required: false
     type: bool
     default: false
 
 notes:
   - Does not require any additional dependencies.
+  - Without a C(cache_ttl), Graylog 5.0.0 and newer is asked for streams with a matching title instead of listing all streams.
+    All streams are still listed if no stream has exactly this title or if the title contains a quote or a backslash.
 
 
 author:
@@ -96,23 +160,42 @@ EXAMPLES = r'''
 '''
 
 RETURN = r'''
-#
+timings:
+  description: API calls made by the module and their aggregation per method and path, only if I(timings=true).
+  returned: when I(timings=true)
+  type: dict
+  sample: {
+    "calls": [ { "method": "GET", "path": "/streams", "status": 200, "bytes": 5120, "duration_ms": 12.5 } ],
+    "summary": { "requests": 1, "bytes": 5120, "duration_ms": 12.5, "endpoints": [ { "method": "GET", "path": "/streams", "count": 1, "bytes": 5120, "duration_ms": 12.5, "max_duration_ms": 12.5 } ] }
+  }
 '''
 
 
-def run_module():
-  module_args = dict(
+def get_module_args() -> dict:
+  return dict(
     endpoint_url=dict(type='str', required=True),
     endpoint_token=dict(type='str', required=True),
-    validate_certs=dict(type='bool', required=False),
+    validate_certs=dict(type='bool', required=False, default=True),
+    parallelism=dict(type='int', required=False, default=1),
+    cache_ttl=dict(type='int', required=False, default=0),
+    cache_path=dict(type='path', required=False, default=DEFAULT_CACHE_PATH),
+    timings=dict(type='bool', required=False, default=False),
+    skip_unchanged=dict(type='bool', required=False, default=False),
+    retries=dict(type='int', required=False, default=3),
+    retry_delay=dict(type='float', required=False, default=1),
     state=dict(type='str', required=True),
     name=dict(type='str', required=True),
     index_set_id=dict(type='str', required=True),
     rules=dict(type='list', required=False),
-    started=dict(type='bool', required=False, default=False),
-    shares=dict(type='list', required=False)
+    started=dict(type='bool', required=False),
+    shares=dict(type='list', required=False),
+    controller=dict(type='bool', required=False, default=False)
   )
 
+
+def run_module():
+  module_args = get_module_args()
+
   result = dict(
     changed=False
   )
@@ -126,243 +209,22 @@ def run_module():
   param_name = module.params["name"]
   stream_params = StreamParams(module.params)
 
-  stream = None
-  streams_response = get_streams(module)  
-  for item in streams_response['streams']:
-    if (item['title'] == param_name):
-      stream = Stream(item)
-      break
-
-  if stream is not None:
-    shares, shares_dto = get_stream_shares(module, stream)
-    stream.shares = shares
-    stream.shares_dto = shares_dto
-
-  #module.check_mode = True
-  if module.check_mode:
-    result['changed'] = (
-      should_create_stream(param_state, stream)
-      or should_update_stream(param_state, stream, stream_params)
-      or should_delete_stream(param_state, stream)
-    )    
-    module.exit_json(**result)
-
-  if (should_create_stream(param_state, stream)):
-    result['changed'] = create_stream(module, stream_params)
-  elif (should_update_stream(param_state, stream, stream_params)):
-    result['changed'] = update_stream(module, stream, stream_params)
-  elif (should_delete_stream(param_state, stream)):
-    result['changed'] = delete_stream(module, stream)
-
-  module.exit_json(**result)
-
-
-def get_stream_shares(module: AnsibleModule, existing_stream: Stream) -> "tuple[list[StreamShare], dict]":
-  api_url = get_apiBaseUrl(module)
-  stream_grn = 'grn::::stream:%s' % (existing_stream.id)
-  response, info = fetch_url(
-    module=module,
-    url=("%s/authz/shares/entities/%s/prepare" % (api_url, stream_grn)),
-    headers=get_apiRequestHeaders(module),
-    method='POST',
-    data='{}')
-
-  if info['status'] != 200:
-    module.fail_json(msg=info['msg'])
-
-  shares_dto = json.loads(to_text(response.read(), errors='surrogate_or_strict'))
-  active_shares = shares_dto['active_shares']
-  if active_shares is None or len(active_shares) == 0:
-    return [], shares_dto
-
-  return [StreamShare().load_from_dto(x) for x in active_shares], shares_dto
-
-
-def get_streams(module: AnsibleModule) -> dict:
-  response, info = fetch_url(module=module, url=("%s/streams" % (get_apiBaseUrl(module))), headers=get_apiRequestHeaders(module), method='GET')
-
-  if info['status'] != 200:
-    module.fail_json(msg=info['msg'])
-
-  return json.loads(to_text(response.read(), errors='surrogate_or_strict'))
-
-
-def should_create_stream(state: str, stream: Stream) -> bool:
-  return state == "present" and stream is None
-
-
-def create_stream(module: AnsibleModule, stream_params: StreamParams) -> bool: 
-  response, info = fetch_url(
-    module=module, url=("%s/streams" % (get_apiBaseUrl(module))),
-    headers=get_apiRequestHeaders(module),
-    method='POST',
-    data=module.jsonify(stream_params.map_to_dto()))
-
-  if info['status'] != 201:
-    module.fail_json(msg=info['msg'])
-
-  response_stream = json.loads(to_text(response.read(), errors='surrogate_or_strict'))
-
-  stream = Stream({})
-  stream.id = response_stream['stream_id']
-
-  # create shares  
-  update_shares(module, stream, stream_params)
-
-  if stream_params.started == True:
-    resume_stream(module, stream.id)
-
-  return True
-
-
-def resume_stream(module: AnsibleModule, stream_id: str) -> None:
-  _, info = fetch_url(module=module, url=("%s/streams/%s/resume" % (get_apiBaseUrl(module), stream_id)), headers=get_apiRequestHeaders(module), method='POST')
-
-  if info['status'] != 204:
-    module.fail_json(msg=info['msg'])
-
-
-def pause_stream(module: AnsibleModule, stream_id: str) -> None:
-  _, info = fetch_url(module=module, url=("%s/streams/%s/pause" % (get_apiBaseUrl(module), stream_id)), headers=get_apiRequestHeaders(module), method='POST')
-
-  if info['status'] != 204:
-    module.fail_json(msg=info['msg'])
-
-
-def should_update_stream(state: str, stream: Stream, stream_params: StreamParams) -> bool:
-  if state == "present" and stream is None:
-    return False
-
-  return stream.equals(stream_params) is False
-
-
-def update_stream(module: AnsibleModule, stream: Stream, stream_params: StreamParams) -> None:
-  data = copy.deepcopy(stream.dto)
-  data = stream_params.map_to_dto(data)
-
-  _, info = fetch_url(
-    module=module, url=("%s/streams/%s" % (get_apiBaseUrl(module), data['id'])),
-    headers=get_apiRequestHeaders(module),
-    method='PUT',
-    data=module.jsonify(data))  
-
-  if info['status'] != 200:
-    module.fail_json(msg=info['msg'])
-
-  if stream.started_is_equal(stream_params) is False:
-    update_stream_started(module, stream, stream_params)
-
-  # update rules (can not be updated via PUT streams/<id>)
-  update_rules(module, stream, stream_params)
-
-  # update shares
-  update_shares(module, stream, stream_params)
-
-  return True
-
-
-def update_stream_started(module: AnsibleModule, stream: Stream, stream_params: StreamParams) -> None:
-  if stream.started:
-    if stream_params.started is False:
-      pause_stream(module, stream.id)
-  else:
-    if stream_params.started:
-      resume_stream(module, stream.id)
-
-
-def update_rules(module: AnsibleModule, stream: Stream, stream_params: StreamParams) -> None:
-  add, delete = stream.get_rules_changes(stream_params)
-
-  for item in delete:
-    delete_rule(module, stream, item)
-
-  for item in add:
-    add_rule(module, stream, item)
-
-
-def update_shares(module: AnsibleModule, stream: Stream, stream_params: StreamParams) -> None:
-  add, delete = stream.get_shares_changes(stream_params)
-  final_list: dict = {} if stream.shares_dto is None else stream.shares_dto['selected_grantee_capabilities']
-
-  for item in delete:
-    item_grn_key = item.get_grn_key()
-    if item_grn_key in final_list:
-      del final_list[item_grn_key]
-
-  for item in add:
-    item_grn_key = item.get_grn_key()
-    final_list[item_grn_key] = item.capability
-
-  dto = {
-    'selected_grantee_capabilities': final_list
-  }
-
-  _, info = fetch_url(
-    module=module, url=("%s/authz/shares/entities/grn::::stream:%s" % (get_apiBaseUrl(module), stream.id)),
-    headers=get_apiRequestHeaders(module),
-    method='POST',
-    data=module.jsonify(dto))  
-
-  if info['status'] != 200:
-    module.fail_json(msg=info['msg'])
-
-
-def delete_rule(module: AnsibleModule, stream: Stream, rule: dict) -> None:
-  _, info = fetch_url(
-    module=module, url=("%s/streams/%s/rules/%s" % (get_apiBaseUrl(module), stream.id, rule['id'])),
-    headers=get_apiRequestHeaders(module),
-    method='DELETE')
-
-  if info['status'] != 204:
-    module.fail_json(msg=info['msg'])
-
-  return
-
-
-def add_rule(module: AnsibleModule, stream: Stream,  rule: dict) -> None:
-  _, info = fetch_url(
-    module=module, url=("%s/streams/%s/rules" % (get_apiBaseUrl(module), stream.id)),
-    headers=get_apiRequestHeaders(module),
-    method='POST',
-    data=module.jsonify(rule))
-
-  if info['status'] != 201:
-    module.fail_json(msg=info['msg'])
-
-  return
-
-
-def should_delete_stream(state: str, stream: Stream) -> bool:
-  return state == "absent" and stream is not None
-
-
-def delete_stream(module: AnsibleModule, stream: Stream) -> bool:
-  _, info = fetch_url(
-    module=module, url=("%s/streams/%s" % (get_apiBaseUrl(module), stream.id)),
-    headers=get_apiRequestHeaders(module),
-    method='DELETE')
-
-  if info['status'] != 204:
-    module.fail_json(msg=info['msg'])
-
-  return True
-
-
-def get_apiBaseUrl(module: AnsibleModule) -> str:
-  return module.params["endpoint_url"] + '/api'
-
-
-def get_apiRequestHeaders(module: AnsibleModule) -> dict:
-  token = module.params["endpoint_token"] + ':token' 
-  token_bytes = token.encode('utf-8')
-  encoded_token = base64.b64encode(token_bytes).decode('utf-8')
-  
-  return { 
-    'Authorization': 'Basic ' + encoded_token,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json',
-    'X-Requested-By': 'ansible'
-  }
+  digests = create_applied_digests(module)
+  client = create_client(module)
+  try:
+    stream_index = get_stream_index(client, create_streams_cache(module, client), {param_name})
+    warn_duplicate_titles(module, stream_index, [param_name])
+    stream = stream_index.get_by_title(param_name)
+
+    result['changed'] = reconcile_stream(client, param_state, stream, stream_params, module.check_mode, module.params["parallelism"], digests)
+  except GraylogApiError as e:
+    module.fail_json(msg=str(e), **add_timings(result, client))
+  finally:
+    client.close()
+    if digests is not None:
+      digests.store()
+
+  module.exit_json(**add_timings(result, client))
 
 
 def main():
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.fio.graylog.plugins.module_utils.async_graylog_client import AsyncGraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.async_stream_api import create_async_client, get_stream_shares, run_concurrently
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import add_timings, create_client, create_streams_cache, get_stream_index
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import DEFAULT_CACHE_PATH
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream
+import asyncio
+import re
+
+
+DOCUMENTATION = r'''
+---
+module: graylog_stream_info
+
+short_description: Module to read all Graylog streams with their rules and shares
+
+version_added: "1.1.0"
+
+description:
+  - Module returns the streams of the target Graylog instance with rules and shares in one pass.
+  - The stream listing is fetched once, share lookups are executed concurrently on an asyncio event loop.
+
+options:
+  endpoint_url:
+    description: Graylog endpoint URL.
+    required: true
+    type: str
+  endpoint_token:
+    description: Token which will be used for the API requests.
+    required: true
+    type: str
+  validate_certs:
+    description: Validate certs for endpoint_url.
+    required: false
+    type: bool
+    default: true
+  parallelism:
+    description: Maximum number of concurrent share lookups.
+    required: false
+    type: int
+    default: 8
+  cache_ttl:
+    description:
+      - Seconds a cached stream listing of the endpoint is reused without asking Graylog.
+      - See M(fio.graylog.graylog_stream) for details. C(0) disables the cache.
+      - "The cache and its invalidation are local to the host executing the module, changes made from other hosts are not noticed until the entry expires. Only use it if all tasks of the endpoint run on one host, for example with C(delegate_to: localhost) or C(run_once: true)."
+    required: false
+    type: int
+    default: 0
+  cache_path:
+    description: Directory of the stream listing cache on the host executing the module.
+    required: false
+    type: path
+    default: ~/.ansible/cache/fio_graylog
+  timings:
+    description: Return the method, path, status, size and duration of every Graylog API call and a summary per endpoint as C(timings).
+    required: false
+    type: bool
+    default: false
+  retries:
+    description:
+      - Number of times a failed API call is repeated after an exponential backoff with jitter.
+      - Calls are repeated on connection errors and on HTTP 429, 502, 503 and 504, honouring C(Retry-After).
+      - Creating streams and rules is only repeated if Graylog did not receive the request or answered with HTTP 429.
+    required: false
+    type: int
+    default: 3
+  retry_delay:
+    description: Base delay in seconds of the backoff between retries, doubled for every further attempt.
+    required: false
+    type: float
+    default: 1
+  title_regex:
+    description: Only return streams whose title matches this regular expression.
+    required: false
+    type: str
+  index_set_id:
+    description: Only return streams writing into this Index-Set.
+    required: false
+    type: str
+  include_shares:
+    description: Look up and return the shares of every returned stream.
+    required: false
+    type: bool
+    default: true
+
+notes:
+  - Does not require any additional dependencies.
+
+
+author:
+  - FIO SYSTEMS AG (@FIO-SYSTEMS-AG)
+'''
+
+EXAMPLES = r'''
+- name: Read all streams of the myapp tenant
+  fio.graylog.graylog_stream_info:
+    endpoint_url: http://localhost:9000
+    endpoint_token: foobar:token
+    title_regex: "^myapp-"
+  register: graylog_streams
+'''
+
+RETURN = r'''
+streams:
+  description: Matching streams in the order of the Graylog stream listing.
+  returned: always
+  type: list
+  elements: dict
+  sample: [
+    {
+      "id": "5f1f6f3e2ab79c0012345678",
+      "title": "myapp",
+      "description": "myapp",
+      "index_set_id": "abcde",
+      "started": true,
+      "matching_type": "AND",
+      "rules": [ { "id": "5f1f6f3e2ab79c0012345679", "field": "foo", "value": "bar", "type": 1, "inverted": false, "description": "" } ],
+      "shares": [ { "type": "user", "id": "abc123", "capability": "view" } ]
+    }
+  ]
+duplicate_titles:
+  description: Titles used by more than one of the returned streams, with the ids of these streams.
+  returned: always
+  type: dict
+  sample: { "myapp": [ "5f1f6f3e2ab79c0012345678", "5f1f6f3e2ab79c0012345680" ] }
+'''
+
+
+def run_module():
+  module_args = dict(
+    endpoint_url=dict(type='str', required=True),
+    endpoint_token=dict(type='str', required=True),
+    validate_certs=dict(type='bool', required=False, default=True),
+    parallelism=dict(type='int', required=False, default=8),
+    cache_ttl=dict(type='int', required=False, default=0),
+    cache_path=dict(type='path', required=False, default=DEFAULT_CACHE_PATH),
+    timings=dict(type='bool', required=False, default=False),
+    retries=dict(type='int', required=False, default=3),
+    retry_delay=dict(type='float', required=False, default=1),
+    title_regex=dict(type='str', required=False),
+    index_set_id=dict(type='str', required=False),
+    include_shares=dict(type='bool', required=False, default=True)
+  )
+
+  result = dict(
+    changed=False,
+    streams=[],
+    duplicate_titles={}
+  )
+
+  module = AnsibleModule(
+    argument_spec=module_args,
+    supports_check_mode=True
+  )
+
+  try:
+    title_pattern = None if module.params["title_regex"] is None else re.compile(module.params["title_regex"])
+  except re.error as e:
+    module.fail_json(msg="Invalid title_regex: %s" % (e), **result)
+
+  client = create_client(module)
+  try:
+    stream_index = get_stream_index(client, create_streams_cache(module, client))
+    streams = [
+      x for x in stream_index
+      if (title_pattern is None or title_pattern.search(x.title) is not None)
+      and (module.params["index_set_id"] is None or x.index_set_id == module.params["index_set_id"])
+    ]
+
+    if module.params["include_shares"] and len(streams) > 0:
+      asyncio.run(load_shares(create_async_client(module, client.timings), streams))
+
+    result['streams'] = [x.map_to_info(module.params["include_shares"]) for x in streams]
+    titles = set(x.title for x in streams)
+    result['duplicate_titles'] = dict((x, y) for x, y in stream_index.duplicate_titles.items() if x in titles)
+  except GraylogApiError as e:
+    module.fail_json(msg=str(e), **add_timings(result, client))
+  finally:
+    client.close()
+
+  module.exit_json(**add_timings(result, client))
+
+
+async def load_shares(client: AsyncGraylogClient, streams: "list[Stream]") -> None:
+  try:
+    results = await run_concurrently(lambda x: get_stream_shares(client, x), streams)
+  finally:
+    await client.close()
+
+  errors = []
+  for stream, (loaded_shares, error) in zip(streams, results):
+    if error is not None:
+      errors.append('%s: %s' % (stream.title, error))
+    else:
+      stream.shares, stream.shares_dto = loaded_shares
+
+  if len(errors) > 0:
+    raise GraylogApiError('Failed to read shares of %s stream(s): %s' % (len(errors), '; '.join(errors)))
+
+
+def main():
+  run_module()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,253 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.fio.graylog.plugins.module_utils.async_graylog_client import AsyncGraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.async_stream_api import apply_shares_changes, create_async_client, get_stream_shares, run_concurrently
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import add_timings, create_client, create_streams_cache, get_grantee_shares_changes, get_stream_index
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import DEFAULT_CACHE_PATH
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamShare
+import asyncio
+import re
+
+
+DOCUMENTATION = r'''
+---
+module: graylog_stream_shares
+
+short_description: Module to grant/revoke access of Graylog users and teams to many streams
+
+version_added: "1.1.0"
+
+description:
+  - Module ensures that the given grantees have (or do not have) access to all selected streams.
+  - Shares of other grantees are kept.
+  - The shares of all selected streams are requested concurrently, only streams whose shares change are updated, again concurrently.
+
+options:
+  endpoint_url:
+    description: Graylog endpoint URL.
+    required: true
+    type: str
+  endpoint_token:
+    description: Token which will be used for the API requests.
+    required: true
+    type: str
+  validate_certs:
+    description: Validate certs for endpoint_url.
+    required: false
+    type: bool
+    default: true
+  parallelism:
+    description: Maximum number of concurrent share requests.
+    required: false
+    type: int
+    default: 8
+  cache_ttl:
+    description:
+      - Seconds a cached stream listing of the endpoint is reused without asking Graylog.
+      - See M(fio.graylog.graylog_stream) for details. C(0) disables the cache.
+      - "The cache and its invalidation are local to the host executing the module, changes made from other hosts are not noticed until the entry expires. Only use it if all tasks of the endpoint run on one host, for example with C(delegate_to: localhost) or C(run_once: true)."
+    required: false
+    type: int
+    default: 0
+  cache_path:
+    description: Directory of the stream listing cache on the host executing the module.
+    required: false
+    type: path
+    default: ~/.ansible/cache/fio_graylog
+  timings:
+    description: Return the method, path, status, size and duration of every Graylog API call and a summary per endpoint as C(timings).
+    required: false
+    type: bool
+    default: false
+  retries:
+    description:
+      - Number of times a failed API call is repeated after an exponential backoff with jitter.
+      - Calls are repeated on connection errors and on HTTP 429, 502, 503 and 504, honouring C(Retry-After).
+    required: false
+    type: int
+    default: 3
+  retry_delay:
+    description: Base delay in seconds of the backoff between retries, doubled for every further attempt.
+    required: false
+    type: float
+    default: 1
+  state:
+    description: Whether the grantees should have access to the streams (C(present)) or not (C(absent)).
+    required: false
+    default: present
+    choices: [ "present", "absent" ]
+    type: str
+  titles:
+    description: Titles of the streams to share.
+    required: false
+    type: list
+    elements: str
+  title_regex:
+    description: Share all streams whose title matches this regular expression.
+    required: false
+    type: str
+  grantees:
+    description: Users and teams to grant or revoke access to the streams.
+    required: true
+    type: list
+    elements: dict
+    suboptions:
+      type:
+        description: The type of the grantee, for example C(user) or C(team).
+        required: true
+        type: str
+      id:
+        description: The id of the grantee.
+        required: true
+        type: str
+      capability:
+        description: The capability granted with I(state=present), ignored with I(state=absent).
+        required: false
+        default: view
+        choices: [ "view", "manage", "own" ]
+        type: str
+
+notes:
+  - Does not require any additional dependencies.
+  - One of I(titles) and I(title_regex) is required, streams matching either of them are selected.
+  - Streams managed by M(fio.graylog.graylog_stream) with I(skip_unchanged=true) do not notice share changes made by this module.
+
+
+author:
+  - FIO SYSTEMS AG (@FIO-SYSTEMS-AG)
+'''
+
+EXAMPLES = r'''
+- name: Give the ops team view access to all myapp streams
+  fio.graylog.graylog_stream_shares:
+    endpoint_url: http://localhost:9000
+    endpoint_token: foobar:token
+    title_regex: "^myapp-"
+    grantees:
+      - type: team
+        id: abc123
+        capability: view
+'''
+
+RETURN = r'''
+timings:
+  description: API calls made by the module and their aggregation per method and path, only if I(timings=true).
+  returned: when I(timings=true)
+  type: dict
+  sample: {
+    "calls": [ { "method": "GET", "path": "/streams", "status": 200, "bytes": 5120, "duration_ms": 12.5 } ],
+    "summary": { "requests": 1, "bytes": 5120, "duration_ms": 12.5, "endpoints": [ { "method": "GET", "path": "/streams", "count": 1, "bytes": 5120, "duration_ms": 12.5, "max_duration_ms": 12.5 } ] }
+  }
+streams:
+  description: Result per selected stream, in the order of the Graylog stream listing.
+  returned: always
+  type: list
+  elements: dict
+  sample: [ { "id": "5f1f6f3e2ab79c0012345678", "name": "myapp-web", "changed": true } ]
+'''
+
+
+def run_module():
+  module_args = dict(
+    endpoint_url=dict(type='str', required=True),
+    endpoint_token=dict(type='str', required=True),
+    validate_certs=dict(type='bool', required=False, default=True),
+    parallelism=dict(type='int', required=False, default=8),
+    cache_ttl=dict(type='int', required=False, default=0),
+    cache_path=dict(type='path', required=False, default=DEFAULT_CACHE_PATH),
+    timings=dict(type='bool', required=False, default=False),
+    retries=dict(type='int', required=False, default=3),
+    retry_delay=dict(type='float', required=False, default=1),
+    state=dict(type='str', required=False, default='present', choices=['present', 'absent']),
+    titles=dict(type='list', elements='str', required=False),
+    title_regex=dict(type='str', required=False),
+    grantees=dict(type='list', elements='dict', required=True, options=dict(
+      type=dict(type='str', required=True),
+      id=dict(type='str', required=True),
+      capability=dict(type='str', required=False, default='view', choices=['view', 'manage', 'own'])
+    ))
+  )
+
+  result = dict(
+    changed=False,
+    streams=[]
+  )
+
+  module = AnsibleModule(
+    argument_spec=module_args,
+    required_one_of=[('titles', 'title_regex')],
+    supports_check_mode=True
+  )
+
+  try:
+    title_pattern = None if module.params["title_regex"] is None else re.compile(module.params["title_regex"])
+  except re.error as e:
+    module.fail_json(msg="Invalid title_regex: %s" % (e), **result)
+
+  titles = set(module.params["titles"] or [])
+  grantees = [StreamShare().load_from_params(x) for x in module.params["grantees"]]
+
+  client = create_client(module)
+  try:
+    stream_index = get_stream_index(client, create_streams_cache(module, client), titles if title_pattern is None else None)
+    streams = [
+      x for x in stream_index
+      if x.title in titles or (title_pattern is not None and title_pattern.search(x.title) is not None)
+    ]
+
+    changed_streams = set()
+    if len(streams) > 0:
+      changed_streams = asyncio.run(share_streams(create_async_client(module, client.timings), streams, grantees, module.params["state"], module.check_mode))
+
+    result['streams'] = [dict(id=x.id, name=x.title, changed=x.id in changed_streams) for x in streams]
+    result['changed'] = len(changed_streams) > 0
+  except GraylogApiError as e:
+    module.fail_json(msg=str(e), **add_timings(result, client))
+  finally:
+    client.close()
+
+  module.exit_json(**add_timings(result, client))
+
+
+# all shares are requested first, then the streams with changes are updated, returns their ids
+async def share_streams(client: AsyncGraylogClient, streams: "list[Stream]", grantees: "list[StreamShare]", state: str, check_mode: bool) -> "set[str]":
+  try:
+    results = await run_concurrently(lambda x: get_stream_shares(client, x), streams)
+
+    errors = []
+    changes = []
+    for stream, (loaded_shares, error) in zip(streams, results):
+      if error is not None:
+        errors.append('%s: %s' % (stream.title, error))
+        continue
+
+      stream.shares, stream.shares_dto = loaded_shares
+      add, delete = get_grantee_shares_changes(stream, grantees, state)
+      if len(add) > 0 or len(delete) > 0:
+        changes.append((stream, add, delete))
+
+    if len(errors) > 0:
+      raise GraylogApiError('Failed to read shares of %s stream(s): %s' % (len(errors), '; '.join(errors)))
+
+    if not check_mode:
+      results = await run_concurrently(lambda x: apply_shares_changes(client, *x), changes)
+      errors = ['%s: %s' % (stream.title, error) for (stream, _, _), (_, error) in zip(changes, results) if error is not None]
+      if len(errors) > 0:
+        raise GraylogApiError('Failed to update shares of %s stream(s): %s' % (len(errors), '; '.join(errors)))
+  finally:
+    await client.close()
+
+  return set(x.id for x, _, _ in changes)
+
+
+def main():
+  run_module()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,348 @@
+#!/usr/bin/python
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.fio.graylog.plugins.module_utils.async_graylog_client import AsyncGraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.async_stream_api import create_async_client, delete_streams, reconcile_stream, run_concurrently
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import add_timings, create_applied_digests, create_client, create_streams_cache, create_streams_journal, get_duplicate_names, get_stream_index, get_unmanaged_streams, warn_duplicate_titles
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import DEFAULT_CACHE_PATH
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.stream_journal import DEFAULT_JOURNAL_MAX_AGE, StreamsJournal, get_spec_digest
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams
+import asyncio
+import re
+
+
+DOCUMENTATION = r'''
+---
+module: graylog_streams
+
+short_description: Module to create/update/delete many Graylog streams in one task
+
+version_added: "1.1.0"
+
+description:
+  - Module ensures that all given streams exist on the target Graylog instance.
+  - The stream listing is fetched once and shared by all stream specs of the task.
+
+options:
+  endpoint_url:
+    description: Graylog endpoint URL.
+    required: true
+    type: str
+  endpoint_token:
+    description: Token which will be used for the API requests.
+    required: true
+    type: str
+  validate_certs:
+    description: Validate certs for endpoint_url.
+    required: false
+    type: bool
+    default: true
+  parallelism:
+    description:
+      - Maximum number of concurrent API requests while reconciling the streams and their rules.
+      - The requests of one stream are applied in order, changes of the same rule deletes before updates before adds.
+    required: false
+    type: int
+    default: 1
+  cache_ttl:
+    description:
+      - Seconds a cached stream listing of the endpoint is reused by later tasks without asking Graylog.
+      - Expired entries are revalidated with C(If-None-Match) if Graylog returned an ETag.
+      - The entry is dropped whenever this collection changes a stream. C(0) disables the cache.
+      - "The cache and its invalidation are local to the host executing the module, changes made from other hosts are not noticed until the entry expires. Only use it if all tasks of the endpoint run on one host, for example with C(delegate_to: localhost) or C(run_once: true)."
+    required: false
+    type: int
+    default: 0
+  cache_path:
+    description: Directory of the stream listing cache on the host executing the module.
+    required: false
+    type: path
+    default: ~/.ansible/cache/fio_graylog
+  timings:
+    description: Return the method, path, status, size and duration of every Graylog API call and a summary per endpoint as C(timings).
+    required: false
+    type: bool
+    default: false
+  skip_unchanged:
+    description:
+      - Remember a digest of the desired state and of the listed stream in I(cache_path) after every successful run.
+      - While both digests match on later runs, the stream is skipped without requesting its shares or comparing it.
+      - Changes made outside of this collection are still detected if they show up in the stream listing (title, description, Index-Set, started, rules), share changes are not.
+    required: false
+    type: bool
+    default: false
+  retries:
+    description:
+      - Number of times a failed API call is repeated after an exponential backoff with jitter.
+      - Calls are repeated on connection errors and on HTTP 429, 502, 503 and 504, honouring C(Retry-After).
+      - Creating streams and rules is only repeated if Graylog did not receive the request or answered with HTTP 429.
+    required: false
+    type: int
+    default: 3
+  retry_delay:
+    description: Base delay in seconds of the backoff between retries, doubled for every further attempt.
+    required: false
+    type: float
+    default: 1
+  journal:
+    description:
+      - Record every reconciled stream in a journal file in I(cache_path).
+      - If the task is interrupted or fails, a rerun with the same streams skips the streams that were completed with an unchanged spec.
+      - Streams interrupted while being changed are compared with Graylog again, so only their pending changes are applied.
+      - The journal is removed once a run succeeds. It is not used in check mode.
+    required: false
+    type: bool
+    default: false
+  journal_max_age:
+    description: Seconds after the last record of an interrupted run until its journal is ignored and removed, so later runs compare all streams again.
+    required: false
+    type: int
+    default: 86400
+  exclusive:
+    description:
+      - Delete all streams whose title is not part of I(streams), so Graylog contains exactly the given stream set.
+      - The default stream and the system event streams are never deleted.
+      - Deletions are executed concurrently, bounded by I(parallelism).
+    required: false
+    type: bool
+    default: false
+  exclusive_title_regex:
+    description: With I(exclusive=true), only delete unlisted streams whose title matches this regular expression.
+    required: false
+    type: str
+  streams:
+    description: List of stream specs, see M(fio.graylog.graylog_stream) for the meaning of the fields.
+    required: true
+    type: list
+    elements: dict
+    suboptions:
+      state:
+        description: The desired state.
+        required: false
+        default: present
+        choices: [ "present", "absent" ]
+        type: str
+      name:
+        description: The name of the stream, unique among the given streams.
+        required: true
+        type: str
+      index_set_id:
+        description: The Index-Set Id. Required if I(state=present).
+        required: false
+        type: str
+      rules:
+        description:
+          - Rules for the stream.
+          - A changed rule is updated in place if it has the C(id) of an existing rule or the same C(field) and C(type) as a removed one.
+          - The C(description) of a rule is only compared if it is given.
+          - C(type) is the Graylog rule type number or one of C(exact) (default), C(regex), C(greater), C(smaller), C(presence), C(contains), C(always_match) and C(match_input).
+          - C(inverted) defaults to false, C(field) and C(value) are compared without surrounding whitespace, but sent as given.
+        required: false
+        type: list
+        default: []
+      shares:
+        description:
+          - Shares for the stream.
+          - If omitted, the shares of the stream are not managed and not requested from Graylog.
+        required: false
+        type: list
+      started:
+        description:
+          - Flag indicating if the stream should be in started state.
+          - If omitted, the stream is neither started nor paused, new streams are created paused.
+        required: false
+        type: bool
+
+notes:
+  - Does not require any additional dependencies.
+
+
+author:
+  - FIO SYSTEMS AG (@FIO-SYSTEMS-AG)
+'''
+
+EXAMPLES = r'''
+- name: Ensure streams
+  fio.graylog.graylog_streams:
+    endpoint_url: http://localhost:9000
+    endpoint_token: foobar:token
+    validate_certs: False
+    streams:
+      - name: myapp
+        started: True
+        index_set_id: abcde
+        rules:
+          - description: myrule
+            field: foo
+            value: bar
+            type: 1
+            inverted: False
+        shares:
+          - type: user
+            id: abc123
+            capability: view
+      - name: legacy
+        state: absent
+
+- name: Ensure the myapp streams are exactly the given ones
+  fio.graylog.graylog_streams:
+    endpoint_url: http://localhost:9000
+    endpoint_token: foobar:token
+    exclusive: True
+    exclusive_title_regex: "^myapp-"
+    parallelism: 8
+    streams:
+      - name: myapp-web
+        index_set_id: abcde
+'''
+
+RETURN = r'''
+timings:
+  description: API calls made by the module and their aggregation per method and path, only if I(timings=true).
+  returned: when I(timings=true)
+  type: dict
+  sample: {
+    "calls": [ { "method": "GET", "path": "/streams", "status": 200, "bytes": 5120, "duration_ms": 12.5 } ],
+    "summary": { "requests": 1, "bytes": 5120, "duration_ms": 12.5, "endpoints": [ { "method": "GET", "path": "/streams", "count": 1, "bytes": 5120, "duration_ms": 12.5, "max_duration_ms": 12.5 } ] }
+  }
+streams:
+  description:
+    - Result per stream spec, in the order of the given specs.
+    - C(resumed) is true if the stream was completed by an interrupted run according to the journal, C(changed) is the result of that run.
+  returned: always
+  type: list
+  elements: dict
+  sample: [ { "name": "myapp", "changed": true, "resumed": false } ]
+pruned:
+  description: Titles of the streams deleted because of I(exclusive=true).
+  returned: always
+  type: list
+  elements: str
+  sample: [ "myapp-old" ]
+'''
+
+
+def run_module():
+  module_args = dict(
+    endpoint_url=dict(type='str', required=True),
+    endpoint_token=dict(type='str', required=True),
+    validate_certs=dict(type='bool', required=False, default=True),
+    parallelism=dict(type='int', required=False, default=1),
+    exclusive=dict(type='bool', required=False, default=False),
+    exclusive_title_regex=dict(type='str', required=False),
+    cache_ttl=dict(type='int', required=False, default=0),
+    cache_path=dict(type='path', required=False, default=DEFAULT_CACHE_PATH),
+    timings=dict(type='bool', required=False, default=False),
+    skip_unchanged=dict(type='bool', required=False, default=False),
+    retries=dict(type='int', required=False, default=3),
+    retry_delay=dict(type='float', required=False, default=1),
+    journal=dict(type='bool', required=False, default=False),
+    journal_max_age=dict(type='int', required=False, default=DEFAULT_JOURNAL_MAX_AGE),
+    streams=dict(type='list', elements='dict', required=True, options=dict(
+      state=dict(type='str', required=False, default='present', choices=['present', 'absent']),
+      name=dict(type='str', required=True),
+      index_set_id=dict(type='str', required=False),
+      rules=dict(type='list', required=False, default=[]),
+      started=dict(type='bool', required=False),
+      shares=dict(type='list', required=False)
+    ), required_if=[('state', 'present', ['index_set_id'])])
+  )
+
+  result = dict(
+    changed=False,
+    streams=[],
+    pruned=[]
+  )
+
+  module = AnsibleModule(
+    argument_spec=module_args,
+    supports_check_mode=True
+  )
+
+  try:
+    exclusive_title_pattern = None if module.params["exclusive_title_regex"] is None else re.compile(module.params["exclusive_title_regex"])
+  except re.error as e:
+    module.fail_json(msg="Invalid exclusive_title_regex: %s" % (e), **result)
+
+  duplicate_names = get_duplicate_names(module.params["streams"])
+  if len(duplicate_names) > 0:
+    module.fail_json(msg="Stream names must be unique, duplicates: %s" % (', '.join(duplicate_names)), **result)
+
+  journal = create_streams_journal(module)
+  digests = create_applied_digests(module)
+  client = create_client(module)
+  try:
+    managed_titles = set(x["name"] for x in module.params["streams"])
+    stream_index = get_stream_index(client, create_streams_cache(module, client), None if module.params["exclusive"] else managed_titles)
+    warn_duplicate_titles(module, stream_index, [x["name"] for x in module.params["streams"]])
+
+    changes = {}
+    pending = []
+    for stream_spec in module.params["streams"]:
+      digest = get_spec_digest(stream_spec)
+      completed = None if journal is None else journal.get_completed(stream_spec["name"], digest)
+      if completed is not None:
+        changes[stream_spec["name"]] = (completed['changed'], True)
+      else:
+        pending.append((stream_spec, digest, stream_index.get_by_title(stream_spec["name"])))
+
+    unmanaged_streams = get_unmanaged_streams(stream_index, managed_titles, exclusive_title_pattern) if module.params["exclusive"] else []
+    try:
+      asyncio.run(reconcile_streams(create_async_client(module, client.timings), pending, unmanaged_streams, changes, module.check_mode, journal, digests))
+    finally:
+      for stream_spec in module.params["streams"]:
+        if stream_spec["name"] in changes:
+          changed, resumed = changes[stream_spec["name"]]
+          result['streams'].append(dict(name=stream_spec["name"], changed=changed, resumed=resumed))
+          result['changed'] = result['changed'] or changed
+
+    result['pruned'] = [x.title for x in unmanaged_streams]
+    result['changed'] = result['changed'] or len(unmanaged_streams) > 0
+
+    if journal is not None:
+      journal.remove()
+  except GraylogApiError as e:
+    module.fail_json(msg=str(e), **add_timings(result, client))
+  finally:
+    client.close()
+    if digests is not None:
+      digests.store()
+
+  module.exit_json(**add_timings(result, client))
+
+
+# reconciles the streams concurrently, bounded by the client, unmanaged streams are only deleted if all succeeded
+async def reconcile_streams(client: AsyncGraylogClient, pending: "list[tuple[dict, str, Stream]]", unmanaged_streams: "list[Stream]", changes: dict, check_mode: bool, journal: StreamsJournal = None, digests: AppliedDigests = None) -> None:
+  async def reconcile(item: "tuple[dict, str, Stream]") -> None:
+    stream_spec, digest, stream = item
+    if journal is not None:
+      journal.start(stream_spec["name"], digest)
+    changed = await reconcile_stream(client, stream_spec["state"], stream, StreamParams(stream_spec), check_mode, digests)
+    if journal is not None:
+      journal.complete(stream_spec["name"], digest, changed)
+
+    changes[stream_spec["name"]] = (changed, False)
+
+  try:
+    results = await run_concurrently(reconcile, pending)
+    errors = ['%s: %s' % (stream_spec["name"], error) for (stream_spec, _, _), (_, error) in zip(pending, results) if error is not None]
+    if len(errors) > 0:
+      raise GraylogApiError('Failed to reconcile %s stream(s): %s' % (len(errors), '; '.join(errors)))
+
+    if not check_mode:
+      await delete_streams(client, unmanaged_streams)
+  finally:
+    await client.close()
+
+
+def main():
+  run_module()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,56 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import time
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+
+class ModuleExit(Exception):
+
+  def __init__(self, result: dict):
+    super().__init__(result)
+    self.result = result
+
+
+
+def exit_json(self, **kwargs):
+  raise ModuleExit(kwargs)
+
+
+def fail_json(self, **kwargs):
+  kwargs['failed'] = True
+  raise ModuleExit(kwargs)
+
+
+def run_module(main, args: dict) -> dict:
+  basic._ANSIBLE_ARGS = to_bytes(json.dumps({ 'ANSIBLE_MODULE_ARGS': args }))
+  if hasattr(basic, '_ANSIBLE_PROFILE'):
+    basic._ANSIBLE_PROFILE = 'legacy'
+
+  try:
+    main()
+  except ModuleExit as e:
+    return e.result
+
+  raise AssertionError('module did not exit')
+
+
+def create_rules(count: int, value: str = 'value') -> "list[dict]":
+  return [ { 'field': 'field_%s' % (x), 'value': '%s_%s' % (value, x), 'type': 1, 'inverted': False } for x in range(count) ]
+
+
+def create_share_capabilities(count: int) -> dict:
+  return dict(('grn::::user:%024x' % (x), 'view') for x in range(count))
+
+
+# best of three wall-clock durations of the call, in seconds
+def measure(function, *args) -> float:
+  durations = []
+  for _ in range(3):
+    start = time.perf_counter()
+    function(*args)
+    durations.append(time.perf_counter() - start)
+
+  return min(durations)
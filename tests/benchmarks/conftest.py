@@ -0,0 +1,21 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+from ansible.module_utils import basic
+from benchmark_utils import exit_json, fail_json, run_module
+from graylog_stub import GraylogStub
+
+
+@pytest.fixture
+def module_runner(monkeypatch):
+  monkeypatch.setattr(basic.AnsibleModule, 'exit_json', exit_json)
+  monkeypatch.setattr(basic.AnsibleModule, 'fail_json', fail_json)
+  return run_module
+
+
+@pytest.fixture
+def graylog():
+  stub = GraylogStub().start()
+  yield stub
+  stub.stop()
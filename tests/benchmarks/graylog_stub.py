@@ -0,0 +1,194 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+from urllib.parse import parse_qs, urlsplit
+import threading
+import uuid
+
+
+# In-memory emulation of the Graylog endpoints used by the collection:
+# system version, streams, stream queries, stream rules, pause/resume and authz shares.
+class GraylogStub():
+
+  def __init__(self):
+    self.streams = {}
+    self.shares = {}
+    self.requests = []
+    self.version = '5.0.0'
+    self._lock = threading.Lock()
+    self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._create_handler())
+    self._server.daemon_threads = True
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+
+  @property
+  def endpoint_url(self) -> str:
+    return 'http://127.0.0.1:%s' % (self._server.server_port)
+
+
+  def start(self) -> "GraylogStub":
+    self._thread.start()
+    return self
+
+
+  def stop(self) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+
+  def add_stream(self, title: str, rules: "list[dict]" = None, shares: dict = None, started: bool = True, index_set_id: str = 'index') -> dict:
+    stream_id = self._new_id()
+    stream = {
+      'id': stream_id,
+      'title': title,
+      'description': title,
+      'index_set_id': index_set_id,
+      'disabled': not started,
+      'matching_type': 'AND',
+      'remove_matches_from_default_stream': True,
+      'rules': [ dict(x, id=self._new_id(), stream_id=stream_id) for x in rules or [] ]
+    }
+    self.streams[stream_id] = stream
+    self.shares[stream_id] = dict(shares or {})
+    return stream
+
+
+  def handle(self, method: str, path: str, body) -> "tuple[int, object]":
+    with self._lock:
+      self.requests.append((method, path))
+      url = urlsplit(path)
+      return self._route(method, url.path, body, parse_qs(url.query))
+
+
+  def _route(self, method: str, path: str, body, query: dict) -> "tuple[int, object]":
+    if path == '/api/system' and method == 'GET':
+      return 200, { 'version': self.version }
+
+    if path == '/api/streams/paginated' and method == 'GET' and tuple(int(x) for x in self.version.split('.')[:2]) >= (5, 0):
+      return 200, self._query_streams(query)
+
+    if path == '/api/streams' and method == 'GET':
+      return 200, { 'total': len(self.streams), 'streams': list(self.streams.values()) }
+
+    if path == '/api/streams' and method == 'POST':
+      stream = self.add_stream(body['title'], body.get('rules'), started=False, index_set_id=body.get('index_set_id'))
+      return 201, { 'stream_id': stream['id'] }
+
+    match = re.fullmatch('/api/streams/(\\w+)', path)
+    if match is not None and match.group(1) in self.streams:
+      stream = self.streams[match.group(1)]
+      if method == 'GET':
+        return 200, stream
+      if method == 'PUT':
+        for key in ('title', 'description', 'index_set_id', 'matching_type', 'remove_matches_from_default_stream'):
+          if key in body:
+            stream[key] = body[key]
+        return 200, stream
+      if method == 'DELETE':
+        del self.streams[stream['id']]
+        return 204, None
+
+    match = re.fullmatch('/api/streams/(\\w+)/(pause|resume)', path)
+    if match is not None and match.group(1) in self.streams and method == 'POST':
+      self.streams[match.group(1)]['disabled'] = match.group(2) == 'pause'
+      return 204, None
+
+    match = re.fullmatch('/api/streams/(\\w+)/rules', path)
+    if match is not None and match.group(1) in self.streams and method == 'POST':
+      rule = dict(body, id=self._new_id(), stream_id=match.group(1))
+      self.streams[match.group(1)]['rules'].append(rule)
+      return 201, { 'streamrule_id': rule['id'] }
+
+    match = re.fullmatch('/api/streams/(\\w+)/rules/(\\w+)', path)
+    if match is not None and match.group(1) in self.streams:
+      stream = self.streams[match.group(1)]
+      rule = next((x for x in stream['rules'] if x['id'] == match.group(2)), None)
+      if rule is not None and method == 'DELETE':
+        stream['rules'].remove(rule)
+        return 204, None
+      if rule is not None and method == 'PUT':
+        rule.update(body)
+        return 200, { 'streamrule_id': rule['id'] }
+
+    match = re.fullmatch('/api/authz/shares/entities/grn::::stream:(\\w+)/prepare', path)
+    if match is not None and match.group(1) in self.streams and method == 'POST':
+      capabilities = self.shares[match.group(1)]
+      return 200, {
+        'active_shares': [ { 'grantee': x, 'capability': y } for x, y in capabilities.items() ],
+        'selected_grantee_capabilities': dict(capabilities)
+      }
+
+    match = re.fullmatch('/api/authz/shares/entities/grn::::stream:(\\w+)', path)
+    if match is not None and match.group(1) in self.streams and method == 'POST':
+      self.shares[match.group(1)] = dict(body['selected_grantee_capabilities'])
+      return 200, {}
+
+    return 404, { 'type': 'ApiError', 'message': 'HTTP 404 Not Found' }
+
+
+  def _query_streams(self, query: dict) -> dict:
+    # like Graylog, only the surrounding quotes are stripped
+    match = re.fullmatch('title:"(.*)"', query.get('query', [''])[0])
+    title = '' if match is None else match.group(1).lower()
+    page = int(query.get('page', ['1'])[0])
+    per_page = int(query.get('per_page', ['50'])[0])
+
+    streams = [ x for x in self.streams.values() if title in x['title'].lower() ]
+    elements = streams[(page - 1) * per_page:page * per_page]
+    return {
+      'pagination': { 'total': len(streams), 'count': len(elements), 'page': page, 'per_page': per_page },
+      'total': len(self.streams),
+      'elements': elements
+    }
+
+
+  def _create_handler(self):
+    stub = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+      # buffer the response and disable Nagle, otherwise delayed ACKs add ~40ms per request
+      wbufsize = -1
+      disable_nagle_algorithm = True
+
+      def do_GET(self):
+        self._handle()
+
+
+      def do_POST(self):
+        self._handle()
+
+
+      def do_PUT(self):
+        self._handle()
+
+
+      def do_DELETE(self):
+        self._handle()
+
+
+      def log_message(self, format, *args):
+        pass
+
+
+      def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length > 0 else b''
+        status, body = stub.handle(self.command, self.path, json.loads(raw_body) if raw_body else None)
+
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    return Handler
+
+
+  @staticmethod
+  def _new_id() -> str:
+    return uuid.uuid4().hex[:24]
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from ansible_collections.fio.graylog.plugins.modules import graylog_stream, graylog_streams
+from benchmark_utils import create_rules, create_share_capabilities
+
+
+STREAM_COUNT = 200
+RULE_COUNT = 20
+SHARE_COUNT = 5
+
+
+def create_spec(title: str, rules: "list[dict]") -> dict:
+  return {
+    'name': title,
+    'index_set_id': 'index',
+    'started': True,
+    'rules': rules,
+    'shares': [ { 'type': 'user', 'id': x.split(':')[-1], 'capability': y } for x, y in create_share_capabilities(SHARE_COUNT).items() ]
+  }
+
+
+def add_streams(graylog) -> "list[dict]":
+  specs = []
+  for x in range(STREAM_COUNT):
+    spec = create_spec('stream_%s' % (x), create_rules(RULE_COUNT))
+    graylog.add_stream(spec['name'], spec['rules'], create_share_capabilities(SHARE_COUNT))
+    specs.append(spec)
+
+  return specs
+
+
+def test_single_stream_unchanged(benchmark, graylog, module_runner):
+  specs = add_streams(graylog)
+  args = dict(specs[-1], endpoint_url=graylog.endpoint_url, endpoint_token='token', state='present')
+
+  result = benchmark(module_runner, graylog_stream.main, args)
+
+  assert result['changed'] is False
+
+
+def test_bulk_streams_unchanged(benchmark, graylog, module_runner):
+  specs = add_streams(graylog)
+  args = dict(endpoint_url=graylog.endpoint_url, endpoint_token='token', streams=specs)
+
+  result = benchmark(module_runner, graylog_streams.main, args)
+
+  assert result['changed'] is False
+
+
+@pytest.mark.parametrize("parallelism", [ 1, 8 ])
+def test_bulk_streams_rule_churn(benchmark, graylog, module_runner, parallelism: int):
+  specs = add_streams(graylog)
+  changed_specs = [ dict(x, rules=create_rules(RULE_COUNT, 'changed')) for x in specs[:20] ]
+  rounds = iter([ specs[:20], changed_specs ] * 5)
+
+  def setup():
+    return (graylog_streams.main, dict(endpoint_url=graylog.endpoint_url, endpoint_token='token', parallelism=parallelism, streams=next(rounds))), {}
+
+  module_runner(graylog_streams.main, dict(endpoint_url=graylog.endpoint_url, endpoint_token='token', streams=changed_specs))
+  result = benchmark.pedantic(module_runner, setup=setup, rounds=10)
+
+  assert result['changed'] is True
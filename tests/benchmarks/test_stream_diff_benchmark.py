@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams, StreamShare
+from benchmark_utils import create_rules
+
+
+SIZES = [ 10, 100, 1000, 10000 ]
+
+
+# half of the desired rules/shares exist, the other half has to be added and deleted
+def create_streams(size: int) -> "tuple[Stream, StreamParams]":
+  stream = Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'rules': create_rules(size) })
+  stream.shares = [ StreamShare('user', '%024x' % (x), 'view') for x in range(size) ]
+
+  desired_rules = create_rules(size // 2) + create_rules(size - size // 2, 'other')
+  desired_shares = [ { 'type': 'user', 'id': '%024x' % (x), 'capability': 'view' if x % 2 == 0 else 'manage' } for x in range(size) ]
+  stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': desired_rules, 'shares': desired_shares })
+
+  return stream, stream_params
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_get_rules_changes(benchmark, size: int):
+  stream, stream_params = create_streams(size)
+
+  add, delete = benchmark(stream.get_rules_changes, stream_params)
+
+  assert size - size // 2 == len(add)
+  assert size - size // 2 == len(delete)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_get_shares_changes(benchmark, size: int):
+  stream, stream_params = create_streams(size)
+
+  add, delete = benchmark(stream.get_shares_changes, stream_params)
+
+  assert size // 2 == len(add)
+  assert size // 2 == len(delete)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_equals(benchmark, size: int):
+  stream, stream_params = create_streams(size)
+
+  assert benchmark(stream.equals, stream_params) is False
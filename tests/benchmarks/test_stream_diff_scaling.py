@@ -0,0 +1,42 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+from ansible_collections.fio.graylog.plugins.module_utils.streams import StreamBase, StreamShare
+from benchmark_utils import create_rules, measure
+
+
+def create_streams(size: int) -> "tuple[StreamBase, StreamBase]":
+  stream = StreamBase()
+  stream.rules = create_rules(size)
+  stream.shares = [ StreamShare('user', '%024x' % (x), 'view') for x in range(size) ]
+
+  stream_params = StreamBase()
+  stream_params.rules = create_rules(size, 'other')
+  stream_params.shares = [ StreamShare('user', '%024x' % (x), 'manage') for x in range(size) ]
+
+  return stream, stream_params
+
+
+# a tenfold input must not cost much more than tenfold time, quadratic diffs cost a hundredfold
+@pytest.mark.scaling
+class TestDiffScaling():
+
+  def test_get_rules_changes_scales_linearly(self):
+    small_stream, small_params = create_streams(2000)
+    large_stream, large_params = create_streams(20000)
+
+    ratio = measure(large_stream.get_rules_changes, large_params) / measure(small_stream.get_rules_changes, small_params)
+
+    assert ratio < 40
+
+
+  def test_get_shares_changes_scales_linearly(self):
+    small_stream, small_params = create_streams(2000)
+    large_stream, large_params = create_streams(20000)
+
+    ratio = measure(large_stream.get_shares_changes, large_params) / measure(small_stream.get_shares_changes, small_params)
+
+    assert ratio < 40
@@ -0,0 +1,34 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+from ansible_collections.fio.graylog.plugins.module_utils.stream_overlap import analyze_stream_overlaps
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream
+from benchmark_utils import measure
+
+
+# every stream shares one rule with all others, a third of them only has this rule
+def create_streams(size: int) -> "list[Stream]":
+  return [
+    Stream({ 'id': str(x), 'title': 'stream_%s' % (x), 'rules': [
+      { 'field': 'env', 'value': 'prod', 'type': 1 },
+      { 'field': 'source', 'value': 'app_%s' % (x // 2), 'type': 1 },
+      { 'field': 'facility', 'value': 'facility_%s' % (x % 100), 'type': 1 }
+    ][:1 + x % 3] })
+    for x in range(size)
+  ]
+
+
+# a tenfold input must not cost much more than tenfold time, pairwise comparisons cost a hundredfold
+@pytest.mark.scaling
+class TestOverlapScaling():
+
+  def test_analyze_stream_overlaps_scales_linearly(self):
+    small_streams = create_streams(2000)
+    large_streams = create_streams(20000)
+
+    ratio = measure(analyze_stream_overlaps, large_streams) / measure(analyze_stream_overlaps, small_streams)
+
+    assert ratio < 40
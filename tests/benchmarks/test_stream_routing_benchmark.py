@@ -0,0 +1,39 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from ansible_collections.fio.graylog.plugins.module_utils.stream_routing import StreamRouter
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream
+
+
+SIZES = [ 100, 1000, 10000 ]
+
+
+# every stream routes one source, filtered by level and facility
+def create_streams(size: int) -> "list[Stream]":
+  return [
+    Stream({ 'id': str(x), 'title': 'stream_%s' % (x), 'rules': [
+      { 'field': 'source', 'value': 'app_%s' % (x), 'type': 1 },
+      { 'field': 'level', 'value': str(x % 7), 'type': 3 },
+      { 'field': 'facility', 'value': '^facility_%s' % (x % 50), 'type': 2 }
+    ] })
+    for x in range(size)
+  ]
+
+
+def create_messages(size: int) -> "list[dict]":
+  return [ { 'source': 'app_%s' % (x % size), 'level': x % 10, 'facility': 'facility_%s' % (x % 50), 'message': 'foo' } for x in range(1000) ]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_route(benchmark, size: int):
+  router = StreamRouter(create_streams(size))
+  messages = create_messages(size)
+
+  routes = benchmark(lambda: [ router.route(x) for x in messages ])
+
+  assert [ 'stream_%s' % (999 % size) ] == routes[999]
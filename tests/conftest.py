@@ -1,3 +1,23 @@
+import pytest
 import sys
 
 sys.path.insert(0, "/mnt/c/Projects")
+
+
+# the scaling tests compare wall-clock durations, they only run on request as these vary on loaded machines
+def pytest_addoption(parser):
+  parser.addoption('--run-scaling', action='store_true', default=False, help='run the wall-clock scaling tests')
+
+
+def pytest_configure(config):
+  config.addinivalue_line('markers', 'scaling: wall-clock scaling test, only run with --run-scaling')
+
+
+def pytest_collection_modifyitems(config, items):
+  if config.getoption('--run-scaling'):
+    return
+
+  skip_scaling = pytest.mark.skip(reason='needs --run-scaling')
+  for item in items:
+    if 'scaling' in item.keywords:
+      item.add_marker(skip_scaling)
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from unittest.mock import MagicMock
+import pytest
+from ansible_collections.fio.graylog.plugins.action import graylog_stream
+from ansible_collections.fio.graylog.plugins.action.graylog_stream import ActionModule, ControllerModule, StreamSession
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.tests.units.stream_fakes import FakeClient, create_stream_dto
+
+
+QUERY_PATH = '/streams/paginated?query=title%%3A%%22%s%%22&page=1&per_page=50'
+
+
+def create_client(streams: "list[dict]") -> FakeClient:
+  responses = dict((QUERY_PATH % (x['title']), { 'pagination': { 'total': 1 }, 'elements': [ x ] }) for x in streams)
+  responses['/streams'] = { 'total': len(streams), 'streams': streams }
+  return FakeClient(responses=responses, version=(5, 0, 0))
+
+
+@pytest.fixture
+def client(monkeypatch):
+  client = create_client([ create_stream_dto('foo', stream_id='a'), create_stream_dto('bar', stream_id='b') ])
+  monkeypatch.setattr(graylog_stream, '_SESSIONS', {})
+  monkeypatch.setattr(graylog_stream, 'create_client', lambda module: client)
+  monkeypatch.setattr(graylog_stream, 'create_streams_cache', lambda module, client: None)
+  return client
+
+
+def create_action(args: dict, loop: list = None) -> ActionModule:
+  task = MagicMock(args=args, loop=loop, loop_with=None, async_val=0, check_mode=False)
+  connection = MagicMock()
+  connection._shell.tmpdir = '/tmp'
+  return ActionModule(task, connection, MagicMock(check_mode=False), None, None)
+
+
+def create_args(name: str, **kwargs) -> dict:
+  return dict({ 'endpoint_url': 'http://graylog', 'endpoint_token': 'foobar', 'name': name, 'index_set_id': 'i', 'state': 'present', 'controller': True }, **kwargs)
+
+
+
+class TestStreamSession():
+
+  def test_loop_lists_all_streams_once(self, client):
+    session = StreamSession(ControllerModule({}, False))
+
+    assert 'a' == session.get_stream_index('foo', True).get_by_title('foo').id
+    assert 'b' == session.get_stream_index('bar', True).get_by_title('bar').id
+    assert [ ('GET', '/streams') ] == [ x[:2] for x in client.requests ]
+
+
+  def test_single_task_only_looks_up_its_stream(self, client):
+    session = StreamSession(ControllerModule({}, False))
+
+    stream_index = session.get_stream_index('foo', False)
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert [ ('GET', QUERY_PATH % ('foo')) ] == [ x[:2] for x in client.requests ]
+    assert session.stream_index is None
+
+
+  def test_stale_title_is_looked_up_again(self, client):
+    session = StreamSession(ControllerModule({}, False))
+    session.get_stream_index('foo', True)
+
+    client.responses[QUERY_PATH % ('foo')]['elements'] = [ create_stream_dto('foo', stream_id='a', description='changed') ]
+    session.stale_titles.add('foo')
+    stream_index = session.get_stream_index('foo', True)
+
+    assert 'changed' == stream_index.get_by_title('foo').description
+    assert 'b' == stream_index.get_by_title('bar').id
+    assert [ ('GET', '/streams'), ('GET', QUERY_PATH % ('foo')) ] == [ x[:2] for x in client.requests ]
+    assert set() == session.stale_titles
+
+
+
+class TestActionModule():
+
+  def test_module_is_executed_on_the_target_without_controller(self, client):
+    action = create_action(dict(create_args('foo'), controller=False))
+    action._execute_module = MagicMock(return_value={ 'changed': True })
+
+    assert action.run(task_vars={})['changed']
+    assert [] == client.requests
+
+
+  def test_changed_stream_is_looked_up_again_by_later_loop_items(self, client, monkeypatch):
+    monkeypatch.setattr(graylog_stream, 'reconcile_stream', lambda *args: True)
+
+    assert create_action(create_args('foo'), [ 'foo', 'bar' ]).run(task_vars={})['changed']
+    assert create_action(create_args('bar'), [ 'foo', 'bar' ]).run(task_vars={})['changed']
+    assert create_action(create_args('foo'), [ 'foo', 'bar' ]).run(task_vars={})['changed']
+
+    assert [ ('GET', '/streams'), ('GET', QUERY_PATH % ('foo')) ] == [ x[:2] for x in client.requests ]
+
+
+  def test_failed_stream_is_marked_stale(self, client, monkeypatch):
+    def fail(*args):
+      raise GraylogApiError('HTTP Error 500: Server Error', 500)
+    monkeypatch.setattr(graylog_stream, 'reconcile_stream', fail)
+
+    result = create_action(create_args('foo'), [ 'foo' ]).run(task_vars={})
+
+    assert result['failed']
+    assert 'Server Error' in result['msg']
+    assert { 'foo' } == next(iter(graylog_stream._SESSIONS.values())).stale_titles
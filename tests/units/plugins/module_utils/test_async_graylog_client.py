@@ -0,0 +1,250 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import pytest
+import ssl
+import threading
+import time
+from ansible_collections.fio.graylog.plugins.module_utils.async_graylog_client import AsyncGraylogClient
+from ansible_collections.fio.graylog.plugins.module_utils.async_stream_api import get_stream_shares, run_concurrently
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError, GraylogConnectionError
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream
+
+
+class ConcurrencyHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    self._respond()
+
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get('Content-Length') or 0))
+    self._respond()
+
+
+  def log_message(self, format, *args):
+    pass
+
+
+  def _respond(self):
+    with self.server.lock:
+      self.server.requests.append((self.command, self.path, self.client_address))
+      self.server.in_flight += 1
+      self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+    time.sleep(0.01)
+    with self.server.lock:
+      self.server.in_flight -= 1
+      response = self.server.responses.get(self.path, (404, { 'message': 'not found' }))
+      if isinstance(response, list):
+        response = response.pop(0) if len(response) > 1 else response[0]
+
+    # the request is received, but the connection is closed without a response
+    if response is None:
+      self.close_connection = True
+      return
+
+    status, body = response
+    data = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    if self.path.endswith('chunked'):
+      self.send_header('Transfer-Encoding', 'chunked')
+      self.end_headers()
+      for x in range(0, len(data), 5):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data[x:x + 5]), data[x:x + 5]))
+      self.wfile.write(b'0\r\n\r\n')
+    else:
+      self.send_header('Content-Length', str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+
+
+
+@pytest.fixture
+def server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), ConcurrencyHandler)
+  server.daemon_threads = True
+  server.lock = threading.Lock()
+  server.requests = []
+  server.in_flight = 0
+  server.max_in_flight = 0
+  server.responses = {
+    '/api/streams': (200, { 'streams': [] }),
+    '/api/chunked': (200, { 'streams': [ { 'id': 'a', 'title': 'chunked' } ] })
+  }
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+# closes keep-alive connections after 0.1 seconds without a request, like Graylog's idle timeout
+class IdleTimeoutHandler(ConcurrencyHandler):
+  timeout = 0.1
+
+
+
+# the writer of a pooled connection which the server closed
+class ClosedWriter():
+
+  def write(self, data):
+    pass
+
+
+  async def drain(self):
+    raise BrokenPipeError(32, 'Broken pipe')
+
+
+  def close(self):
+    pass
+
+
+  async def wait_closed(self):
+    pass
+
+
+
+@pytest.fixture
+def idle_server(server):
+  idle_server = ThreadingHTTPServer(('127.0.0.1', 0), IdleTimeoutHandler)
+  idle_server.daemon_threads = True
+  for name in ('lock', 'requests', 'in_flight', 'max_in_flight', 'responses'):
+    setattr(idle_server, name, getattr(server, name))
+  thread = threading.Thread(target=idle_server.serve_forever, daemon=True)
+  thread.start()
+  yield idle_server
+  idle_server.shutdown()
+  idle_server.server_close()
+
+
+def create_client(server, concurrency: int = 4, retries: int = 0, timings: ApiCallTimings = None) -> AsyncGraylogClient:
+  return AsyncGraylogClient('http://127.0.0.1:%s' % (server.server_port), 'foobar', timings=timings, retries=retries, retry_delay=0, concurrency=concurrency)
+
+
+def run(client: AsyncGraylogClient, coroutine):
+  async def run_and_close():
+    try:
+      return await coroutine
+    finally:
+      await client.close()
+
+  return asyncio.run(run_and_close())
+
+
+
+class TestAsyncGraylogClient():
+
+  def test_request_returns_parsed_body(self, server):
+    client = create_client(server)
+
+    assert { 'streams': [] } == run(client, client.request('GET', '/streams'))
+
+
+  def test_omitted_validate_certs_validates(self):
+    client = AsyncGraylogClient('https://graylog.example', 'foobar', validate_certs=None)
+
+    assert ssl.CERT_REQUIRED == client._ssl_context.verify_mode
+
+
+  def test_chunked_body_is_read(self, server):
+    client = create_client(server)
+
+    assert 'chunked' == run(client, client.request('GET', '/chunked'))['streams'][0]['title']
+
+
+  def test_concurrency_is_limited_and_connections_are_reused(self, server):
+    timings = ApiCallTimings()
+    client = create_client(server, concurrency=4, timings=timings)
+
+    async def request_all():
+      return await asyncio.gather(*[client.request('GET', '/streams') for _ in range(40)])
+
+    run(client, request_all())
+
+    assert 40 == len(server.requests)
+    assert server.max_in_flight <= 4
+    assert len(set(x[2] for x in server.requests)) <= 4
+    assert 40 == timings.summary()['requests']
+
+
+  def test_unexpected_status_raises_api_error(self, server):
+    client = create_client(server)
+
+    with pytest.raises(GraylogApiError) as e:
+      run(client, client.request('GET', '/unknown'))
+
+    assert 404 == e.value.status
+
+
+  def test_idempotent_requests_are_retried(self, server):
+    server.responses['/api/flaky'] = [ (503, {}), (200, { 'ok': True }) ]
+    server.responses['/api/create'] = [ (503, {}), (201, {}) ]
+    client = create_client(server, retries=2)
+
+    assert { 'ok': True } == run(client, client.request('GET', '/flaky'))
+    with pytest.raises(GraylogApiError):
+      run(client, client.request('POST', '/create', data={}, expected_status=201))
+
+    assert 3 == len(server.requests)
+
+
+  def test_post_is_sent_on_a_fresh_connection_after_the_idle_timeout(self, idle_server):
+    idle_server.responses['/api/create'] = (200, {})
+    client = create_client(idle_server, concurrency=1)
+
+    async def send():
+      await client.request('GET', '/streams')
+      await asyncio.sleep(0.3)
+      await client.request('POST', '/create', data={})
+
+    run(client, send())
+
+    assert [ 'GET', 'POST' ] == [ x[0] for x in idle_server.requests ]
+    assert idle_server.requests[0][2] != idle_server.requests[1][2]
+
+
+  def test_post_failing_to_write_on_a_reused_connection_is_sent_on_a_fresh_one(self, server, monkeypatch):
+    monkeypatch.setattr(AsyncGraylogClient, '_is_dropped', staticmethod(lambda connection: False))
+    server.responses['/api/create'] = (200, {})
+    client = create_client(server, concurrency=1)
+    client._connections.append((None, ClosedWriter()))
+
+    run(client, client.request('POST', '/create', data={}))
+
+    assert 1 == len(server.requests)
+
+
+  @pytest.mark.parametrize("idempotent, requests", [ (None, 2), (True, 3) ])
+  def test_only_idempotent_requests_are_resent_on_a_dropped_keep_alive_connection(self, server, idempotent, requests):
+    server.responses['/api/lost'] = None
+    client = create_client(server, concurrency=1)
+
+    async def send():
+      await client.request('GET', '/streams')
+      await client.request('POST', '/lost', data={}, idempotent=idempotent)
+
+    with pytest.raises(GraylogConnectionError) as e:
+      run(client, send())
+
+    assert e.value.sent is True
+    assert requests == len(server.requests)
+
+
+  def test_share_lookups_report_results_per_stream(self, server):
+    server.responses['/api/authz/shares/entities/grn::::stream:a/prepare'] = (200, {
+      'active_shares': [ { 'grantee': 'grn::::user:u', 'capability': 'view' } ],
+      'selected_grantee_capabilities': { 'grn::::user:u': 'view' }
+    })
+    streams = [ Stream({ 'id': 'a', 'title': 'a' }), Stream({ 'id': 'b', 'title': 'b' }) ]
+    client = create_client(server)
+
+    results = run(client, run_concurrently(lambda x: get_stream_shares(client, x), streams))
+
+    assert 'u' == results[0][0][0][0].id
+    assert 404 == results[1][1].status
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import asyncio
+import pytest
+from ansible_collections.fio.graylog.plugins.module_utils.async_stream_api import apply_rules_changes, delete_streams, reconcile_stream
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams
+from ansible_collections.fio.graylog.tests.units.stream_fakes import FakeAsyncClient, create_stream
+
+
+SHARES_DTO = { 'active_shares': [], 'selected_grantee_capabilities': {} }
+
+
+def create_params(**kwargs) -> StreamParams:
+  return StreamParams(dict({ 'name': 'foo', 'index_set_id': 'i', 'rules': [], 'started': None, 'shares': None }, **kwargs))
+
+
+def create_rule(rule_id: str, field: str, value: str, rule_type: int = 1) -> dict:
+  return { 'id': rule_id, 'field': field, 'value': value, 'type': rule_type, 'inverted': False }
+
+
+
+class TestReconcileStream():
+
+  def test_new_stream_is_created_shared_and_resumed(self):
+    client = FakeAsyncClient(responses={ '/streams': { 'stream_id': 'n' } })
+    params = create_params(started=True, shares=[ { 'type': 'user', 'id': 'u', 'capability': 'view' } ])
+
+    assert asyncio.run(reconcile_stream(client, 'present', None, params)) is True
+    assert [ ('POST', '/streams'), ('POST', '/authz/shares/entities/grn::::stream:n'), ('POST', '/streams/n/resume') ] == [ x[:2] for x in client.requests ]
+    assert { 'grn::::user:u': 'view' } == client.requests[1][2]['selected_grantee_capabilities']
+
+
+  def test_only_changed_parts_are_written(self):
+    client = FakeAsyncClient()
+
+    assert asyncio.run(reconcile_stream(client, 'present', create_stream(stream_id='a'), create_params(started=False))) is True
+    assert [ ('POST', '/streams/a/pause', None) ] == client.requests
+
+
+  def test_unmanaged_shares_and_started_are_not_requested(self):
+    client = FakeAsyncClient()
+
+    assert asyncio.run(reconcile_stream(client, 'present', create_stream(stream_id='a', disabled=True), create_params())) is False
+    assert [] == client.requests
+
+
+  def test_managed_shares_are_requested_before_comparing(self):
+    client = FakeAsyncClient(responses={ '/authz/shares/entities/grn::::stream:a/prepare': SHARES_DTO })
+
+    assert asyncio.run(reconcile_stream(client, 'present', create_stream(stream_id='a'), create_params(shares=[]))) is False
+    assert [ ('POST', '/authz/shares/entities/grn::::stream:a/prepare') ] == [ x[:2] for x in client.requests ]
+
+
+  def test_check_mode_does_not_write(self):
+    client = FakeAsyncClient()
+
+    assert asyncio.run(reconcile_stream(client, 'present', None, create_params(), True)) is True
+    assert asyncio.run(reconcile_stream(client, 'absent', create_stream(stream_id='a'), create_params(), True)) is True
+    assert [] == client.requests
+
+
+  def test_existing_stream_is_deleted(self):
+    client = FakeAsyncClient()
+
+    assert asyncio.run(reconcile_stream(client, 'absent', create_stream(stream_id='a'), create_params())) is True
+    assert [ ('DELETE', '/streams/a', None) ] == client.requests
+
+
+  def test_applied_stream_is_skipped(self, tmp_path):
+    digests = AppliedDigests(str(tmp_path), 'http://graylog', 'token')
+    client = FakeAsyncClient(responses={ '/authz/shares/entities/grn::::stream:a/prepare': SHARES_DTO })
+    params = create_params(shares=[])
+
+    assert asyncio.run(reconcile_stream(client, 'present', create_stream(stream_id='a'), params, digests=digests)) is False
+    assert asyncio.run(reconcile_stream(client, 'present', create_stream(stream_id='a'), params, digests=digests)) is False
+    assert 1 == len(client.requests)
+
+
+
+class TestRules():
+
+  def test_changes_of_one_rule_are_applied_in_order(self):
+    stream = create_stream(rules=[ create_rule('r1', 'foo', 'a'), create_rule('r2', 'bar', 'b') ], stream_id='a')
+    params = create_params(rules=[ { 'field': 'foo', 'value': 'c', 'type': 1 }, { 'field': 'baz', 'value': 'd', 'type': 1 } ])
+    client = FakeAsyncClient()
+
+    assert asyncio.run(reconcile_stream(client, 'present', stream, params)) is True
+
+    requests = [ x[:2] for x in client.requests ]
+    assert { ('PUT', '/streams/a/rules/r1'), ('DELETE', '/streams/a/rules/r2'), ('POST', '/streams/a/rules') } == set(requests)
+    assert 'id' not in client.requests[requests.index(('PUT', '/streams/a/rules/r1'))][2]
+
+
+  def test_failed_rules_are_reported_together(self):
+    stream = create_stream(stream_id='a')
+    client = FakeAsyncClient([ ('DELETE', '/streams/a/rules/r1'), ('DELETE', '/streams/a/rules/r2') ])
+    delete = [ create_rule('r1', 'foo', 'a'), create_rule('r2', 'bar', 'b') ]
+
+    with pytest.raises(GraylogApiError) as e:
+      asyncio.run(apply_rules_changes(client, stream, [ create_rule(None, 'foo', 'a') ], delete))
+
+    assert 2 == len(client.requests)
+    assert 'Failed to update 2 rule(s) of stream a: delete rule { Field: foo' in str(e.value)
+
+
+
+class TestDeleteStreams():
+
+  def test_delete_streams_reports_every_failed_stream(self):
+    streams = [ Stream({ 'id': x, 'title': x }) for x in [ 'a', 'b', 'c' ] ]
+    client = FakeAsyncClient([ ('DELETE', '/streams/a'), ('DELETE', '/streams/c') ])
+
+    with pytest.raises(GraylogApiError) as e:
+      asyncio.run(delete_streams(client, streams))
+
+    assert 3 == len(client.requests)
+    assert 'Failed to delete 2 stream(s): a: HTTP Error 500: Server Error; c:' in str(e.value)
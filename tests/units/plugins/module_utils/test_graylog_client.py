@@ -0,0 +1,369 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import pytest
+import socket
+import ssl
+import threading
+import time
+from ansible_collections.fio.graylog.plugins.module_utils import graylog_client
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import ApiCallTimings, GraylogApiError, GraylogClient, GraylogConnectionError
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    self._respond()
+
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get('Content-Length') or 0))
+    self._respond()
+
+
+  # a list of responses is answered in order, its last response is repeated, None closes the connection
+  def _respond(self):
+    self.server.requests.append((self.command, self.path, self.client_address, dict(self.headers)))
+    response = self.server.responses.get(self.path, (404, { 'message': 'not found' }))
+    if isinstance(response, list):
+      response = response.pop(0) if len(response) > 1 else response[0]
+
+    if response is None:
+      self.close_connection = True
+      return
+
+    status, body, headers = (response + ({},))[:3]
+    data = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    for key, value in headers.items():
+      self.send_header(key, value)
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+    # drops the connection like an idle timeout, without announcing it
+    self.close_connection = self.server.drop_connections
+
+
+  def log_message(self, format, *args):
+    pass
+
+
+
+@pytest.fixture
+def server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+  server.requests = []
+  server.drop_connections = False
+  server.responses = {
+    '/api/streams': (200, { 'streams': [] }),
+    '/api/streams/5f1f6f3e2ab79c0012345678/rules': (200, [])
+  }
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+# closes keep-alive connections after 0.1 seconds without a request, like Graylog's idle timeout
+class IdleTimeoutHandler(RecordingHandler):
+  timeout = 0.1
+
+
+
+@pytest.fixture
+def idle_server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), IdleTimeoutHandler)
+  server.daemon_threads = True
+  server.requests = []
+  server.drop_connections = False
+  server.responses = {
+    '/api/streams': (200, { 'streams': [] })
+  }
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+# a pooled connection which the server closed, writing to it fails
+class ClosedConnection():
+  sock = 'closed'
+
+  def request(self, method, url, body=None, headers=None):
+    raise BrokenPipeError(32, 'Broken pipe')
+
+
+  def close(self):
+    pass
+
+
+def create_client(server, timings: ApiCallTimings = None, retries: int = 0) -> GraylogClient:
+  return GraylogClient('http://127.0.0.1:%s' % (server.server_port), 'foobar', timings=timings, retries=retries, retry_delay=0)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+  delays = []
+  monkeypatch.setattr(graylog_client.time, 'sleep', delays.append)
+  return delays
+
+
+
+class TestGraylogClient():
+
+  def test_request_returns_parsed_body(self, server):
+    client = create_client(server)
+
+    assert { 'streams': [] } == client.request('GET', '/streams')
+    client.close()
+
+
+  def test_requests_reuse_one_connection(self, server):
+    client = create_client(server)
+
+    for _ in range(5):
+      client.request('GET', '/streams')
+    client.close()
+
+    assert 5 == len(server.requests)
+    assert 1 == len(set(x[2] for x in server.requests))
+
+
+  def test_request_sends_token_header(self, server):
+    client = create_client(server)
+
+    client.request('GET', '/streams')
+    client.close()
+
+    assert 'Basic Zm9vYmFyOnRva2Vu' == server.requests[0][3]['Authorization']
+    assert 'ansible' == server.requests[0][3]['X-Requested-By']
+
+
+  def test_unexpected_status_raises_api_error(self, server):
+    client = create_client(server)
+
+    with pytest.raises(GraylogApiError) as e:
+      client.request('GET', '/unknown')
+    client.close()
+
+    assert 404 == e.value.status
+    assert 'not found' in str(e.value)
+
+
+  @pytest.mark.parametrize('validate_certs, verify_mode', [ (None, ssl.CERT_REQUIRED), (True, ssl.CERT_REQUIRED), (False, ssl.CERT_NONE) ])
+  def test_certs_are_validated_unless_disabled(self, validate_certs, verify_mode):
+    client = GraylogClient('https://graylog.example', 'foobar', validate_certs=validate_certs)
+
+    assert verify_mode == client._ssl_context.verify_mode
+
+
+  def test_timings_record_every_call_with_path_template(self, server):
+    timings = ApiCallTimings()
+    client = create_client(server, timings)
+
+    client.request('GET', '/streams')
+    client.request('GET', '/streams/5f1f6f3e2ab79c0012345678/rules')
+    client.request('GET', '/streams')
+    with pytest.raises(GraylogApiError):
+      client.request('GET', '/unknown')
+    client.close()
+
+    assert [ '/streams', '/streams/{id}/rules', '/streams', '/unknown' ] == [ x['path'] for x in timings.calls ]
+    assert [ 200, 200, 200, 404 ] == [ x['status'] for x in timings.calls ]
+    summary = timings.summary()
+    assert 4 == summary['requests']
+    assert 2 == next(x for x in summary['endpoints'] if x['path'] == '/streams')['count']
+
+
+  def test_timings_group_paths_without_query(self):
+    timings = ApiCallTimings()
+
+    timings.record('GET', '/streams/paginated?query=title%3A%22foo%22&page=1&per_page=50', 200, 10, 0.01)
+    timings.record('GET', '/streams/paginated?query=title%3A%22bar%22&page=2&per_page=50', 200, 10, 0.01)
+
+    assert [ '/streams/paginated', '/streams/paginated' ] == [ x['path'] for x in timings.calls ]
+    assert [ 2 ] == [ x['count'] for x in timings.summary()['endpoints'] ]
+
+
+  def test_open_reads_body_incrementally_and_reuses_connection(self, server):
+    timings = ApiCallTimings()
+    client = create_client(server, timings)
+
+    with client.open('GET', '/streams') as response:
+      body = response.read(4) + response.read()
+    client.request('GET', '/streams')
+    client.close()
+
+    assert { 'streams': [] } == json.loads(body)
+    assert 1 == len(set(x[2] for x in server.requests))
+    assert len(body) == timings.calls[0]['bytes']
+
+
+  def test_open_drops_partially_read_connection(self, server):
+    client = create_client(server)
+
+    with client.open('GET', '/streams') as response:
+      response.read(1)
+    client.request('GET', '/streams')
+    client.close()
+
+    assert 2 == len(set(x[2] for x in server.requests))
+
+
+  def test_open_unexpected_status_raises_api_error(self, server):
+    client = create_client(server)
+
+    with pytest.raises(GraylogApiError) as e:
+      client.open('GET', '/unknown')
+    client.request('GET', '/streams')
+    client.close()
+
+    assert 404 == e.value.status
+    assert 1 == len(set(x[2] for x in server.requests))
+
+
+
+class TestRetries():
+
+  def test_get_is_retried_on_unavailable_server(self, server, delays):
+    server.responses['/api/flaky'] = [ (503, {}), (502, {}), (200, { 'ok': True }) ]
+    client = create_client(server, retries=3)
+
+    assert { 'ok': True } == client.request('GET', '/flaky')
+    client.close()
+
+    assert 3 == len(server.requests)
+    assert 2 == len(delays)
+
+
+  def test_retries_are_limited(self, server, delays):
+    server.responses['/api/flaky'] = [ (503, { 'message': 'unavailable' }) ]
+    client = create_client(server, retries=2)
+
+    with pytest.raises(GraylogApiError) as e:
+      client.request('GET', '/flaky')
+    client.close()
+
+    assert 503 == e.value.status
+    assert 3 == len(server.requests)
+
+
+  def test_retry_after_is_honoured(self, server, delays):
+    server.responses['/api/flaky'] = [ (429, {}, { 'Retry-After': '7' }), (200, {}) ]
+    client = create_client(server, retries=1)
+
+    client.request('GET', '/flaky')
+    client.close()
+
+    assert [ 7 ] == delays
+
+
+  def test_post_is_not_retried_on_unavailable_server(self, server, delays):
+    server.responses['/api/flaky'] = [ (503, {}), (201, {}) ]
+    client = create_client(server, retries=3)
+
+    with pytest.raises(GraylogApiError):
+      client.request('POST', '/flaky', data={}, expected_status=201)
+    client.close()
+
+    assert 1 == len(server.requests)
+
+
+  def test_post_is_retried_if_rate_limited_or_idempotent(self, server, delays):
+    server.responses['/api/limited'] = [ (429, {}), (201, {}) ]
+    server.responses['/api/prepare'] = [ (502, {}), (200, {}) ]
+    client = create_client(server, retries=3)
+
+    client.request('POST', '/limited', data={}, expected_status=201)
+    client.request('POST', '/prepare', data={}, idempotent=True)
+    client.close()
+
+    assert 4 == len(server.requests)
+
+
+  def test_unsent_post_is_retried(self, delays):
+    client = GraylogClient('http://127.0.0.1:1', 'foobar', retries=2, retry_delay=0)
+
+    with pytest.raises(GraylogConnectionError) as e:
+      client.request('POST', '/streams', data={})
+
+    assert e.value.sent is False
+    assert 2 == len(delays)
+
+
+  def test_post_is_sent_on_a_fresh_connection_after_the_idle_timeout(self, idle_server):
+    client = create_client(idle_server)
+
+    client.request('GET', '/streams')
+    time.sleep(0.3)
+    client.request('POST', '/streams', data={})
+    client.close()
+
+    assert [ 'GET', 'POST' ] == [ x[0] for x in idle_server.requests ]
+    assert idle_server.requests[0][2] != idle_server.requests[1][2]
+
+
+  def test_connection_closed_by_the_server_is_dropped(self):
+    client_socket, server_socket = socket.socketpair()
+
+    assert not graylog_client.is_connection_dropped(client_socket)
+    server_socket.close()
+    assert graylog_client.is_connection_dropped(client_socket)
+    client_socket.close()
+
+
+  def test_post_failing_to_write_on_a_reused_connection_is_sent_on_a_fresh_one(self, server, monkeypatch):
+    monkeypatch.setattr(graylog_client, 'is_connection_dropped', lambda sock: False)
+    client = create_client(server)
+    client._connections.put(ClosedConnection())
+
+    client.request('POST', '/streams', data={})
+    client.close()
+
+    assert 1 == len(server.requests)
+
+
+  def test_post_failing_to_write_is_not_sent(self, server, monkeypatch):
+    client = create_client(server)
+    monkeypatch.setattr(client, '_new_connection', ClosedConnection)
+
+    with pytest.raises(GraylogConnectionError) as e:
+      client.request('POST', '/streams', data={})
+
+    assert e.value.sent is False
+    assert 0 == len(server.requests)
+
+
+  # the server closes the connection after the liveness check of the pool
+  def test_get_is_resent_on_a_dropped_keep_alive_connection(self, server, monkeypatch):
+    monkeypatch.setattr(graylog_client, 'is_connection_dropped', lambda sock: False)
+    server.drop_connections = True
+    client = create_client(server)
+
+    client.request('GET', '/streams')
+    client.request('GET', '/streams')
+    client.close()
+
+    assert 2 == len(server.requests)
+
+
+  # the server receives the request, but closes the connection without a response
+  @pytest.mark.parametrize("idempotent, requests", [ (None, 2), (True, 3) ])
+  def test_post_is_only_resent_on_a_dropped_keep_alive_connection_if_idempotent(self, server, idempotent, requests):
+    server.responses['/api/lost'] = None
+    client = create_client(server)
+
+    client.request('GET', '/streams')
+    with pytest.raises(GraylogConnectionError) as e:
+      client.request('POST', '/lost', data={}, idempotent=idempotent)
+    client.close()
+
+    assert e.value.sent is True
+    assert requests == len(server.requests)
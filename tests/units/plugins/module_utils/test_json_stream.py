@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import io
+import json
+import pytest
+from ansible_collections.fio.graylog.plugins.module_utils.json_stream import iter_json_array
+
+
+def create_reader(document, chunk_size: int = 65536):
+  data = document if isinstance(document, bytes) else json.dumps(document).encode('utf-8')
+  return iter_json_array(io.BytesIO(data), 'streams', chunk_size)
+
+
+
+class TestJsonArrayReader():
+
+  @pytest.mark.parametrize('chunk_size', [ 1, 3, 7, 65536 ])
+  def test_yields_every_element(self, chunk_size):
+    streams = [ { 'id': str(x), 'title': 'stream "%s" ü€' % (x), 'rules': [ { 'value': '[}{' } ] } for x in range(20) ]
+
+    assert streams == list(create_reader({ 'total': 20, 'streams': streams }, chunk_size))
+
+
+  def test_skips_preceding_values(self):
+    document = { 'meta': { 'streams': [ 'nested' ], 'note': '"streams": [' }, 'other': [ { 'streams': 1 } ], 'streams': [ 1, 2.5, 'three', None ] }
+
+    assert [ 1, 2.5, 'three', None ] == list(create_reader(document, 2))
+
+
+  def test_empty_array(self):
+    assert [] == list(create_reader(b'{ "streams" : [ ] }', 1))
+
+
+  def test_stops_reading_after_consumer_stops(self):
+    data = io.BytesIO(json.dumps({ 'streams': [ { 'title': 'x' * 100 } for _ in range(1000) ] }).encode('utf-8'))
+
+    next(iter_json_array(data, 'streams', 1024))
+
+    assert data.tell() < 4096
+
+
+  def test_missing_key_raises(self):
+    with pytest.raises(ValueError):
+      list(create_reader({ 'total': 0 }))
+
+
+  def test_truncated_document_raises(self):
+    with pytest.raises(ValueError):
+      list(create_reader(b'{ "streams": [ { "id": "a" }, { "id"', 4))
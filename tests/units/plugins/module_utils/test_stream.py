@@ -4,7 +4,7 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 import pytest
-from ansible_collections.fio.graylog.plugins.module_utils.streams import StreamBase, StreamShare
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamBase, StreamIndex, StreamParams, StreamShare, normalize_rule
 
 
 class TestComparison():
@@ -174,6 +174,49 @@ class TestChangeDetector():
     assert 0 == len(add)
 
 
+  def test_get_rules_plan_updates_rules_in_place(self):
+    stream = StreamBase()
+    stream.rules = [
+      { 'id': 'r1', 'field': 'foo', 'value': '1', 'type': 2, 'description': 'foo rule' },
+      { 'id': 'r2', 'field': 'bar', 'value': '1', 'type': 1 },
+      { 'id': 'r3', 'field': 'baz', 'value': '1', 'type': 1 }
+    ]
+
+    stream_params = StreamBase()
+    stream_params.rules = [
+      { 'field': 'foo', 'value': '2', 'type': 2 },
+      { 'id': 'r2', 'field': 'qux', 'value': '1', 'type': 1 },
+      { 'field': 'baz', 'value': '1', 'type': 3 }
+    ]
+
+    add, update, delete = stream.get_rules_plan(stream_params)
+
+    assert [ { 'id': 'r1', 'field': 'foo', 'value': '2', 'type': 2, 'inverted': None, 'description': 'foo rule' }, { 'id': 'r2', 'field': 'qux', 'value': '1', 'type': 1, 'inverted': None, 'description': None } ] == update
+    assert [ 'baz' ] == [ x['field'] for x in add ]
+    assert [ 'r3' ] == [ x['id'] for x in delete ]
+
+
+  def test_get_rules_plan_updates_descriptions_only_if_given(self):
+    stream = StreamBase()
+    stream.rules = [
+      { 'id': 'r1', 'field': 'foo', 'value': '1', 'type': 1, 'description': 'old' },
+      { 'id': 'r2', 'field': 'bar', 'value': '1', 'type': 1, 'description': 'old' }
+    ]
+
+    stream_params = StreamBase()
+    stream_params.rules = [
+      { 'field': 'foo', 'value': '1', 'type': 1, 'description': 'new' },
+      { 'field': 'bar', 'value': '1', 'type': 1 }
+    ]
+
+    add, update, delete = stream.get_rules_plan(stream_params)
+
+    assert [ ('r1', 'new') ] == [ (x['id'], x['description']) for x in update ]
+    assert 0 == len(add)
+    assert 0 == len(delete)
+    assert stream.rules_are_equal(stream_params) is False
+
+
   def test_get_share_changes_returns_correct_lists(self):
 
     stream = StreamBase()
@@ -192,6 +235,97 @@ class TestChangeDetector():
     assert any(x for x in add if x.id == 'bar' and x.capability == 'manage')
 
 
+  def test_get_rules_changes_adds_duplicate_desired_rules_once(self):
+    stream = StreamBase()
+    stream.rules = []
+
+    stream_params = StreamBase()
+    stream_params.rules = [
+      { 'field': 'foo', 'value': '1', 'type': 1 },
+      { 'field': 'foo', 'value': '1', 'type': 1 }
+    ]
+
+    add, delete = stream.get_rules_changes(stream_params)
+
+    assert 1 == len(add)
+    assert 0 == len(delete)
+
+
+  def test_get_share_changes_removes_duplicates(self):
+    stream = StreamBase()
+    stream.shares = [ StreamShare("user", "foo", "view"), StreamShare("user", "foo", "view"), StreamShare("team", "bar", "view") ]
+
+    stream_params = StreamBase()
+    stream_params.shares = [ StreamShare("user", "foo", "view") ]
+
+    add, delete = stream.get_shares_changes(stream_params)
+
+    assert 0 == len(add)
+    assert 2 == len(delete)
+    assert stream.shares[1] in delete
+    assert stream.shares[2] in delete
+
+
+
+class TestChangeSet():
+
+  def test_get_changes_reports_only_started(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': True, 'rules': [ { 'field': 'f', 'value': 'v', 'type': 1 } ] })
+    stream.shares = []
+    stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'started': True, 'rules': [ { 'field': 'f', 'value': 'v', 'type': 1 } ], 'shares': [] })
+
+    changes = stream.get_changes(stream_params)
+
+    assert changes.started
+    assert changes.properties is False
+    assert changes.rules is False
+    assert changes.shares is False
+    assert changes.has_changes()
+
+
+  @pytest.mark.parametrize("disabled", [ True, False ])
+  def test_omitted_started_is_not_managed(self, disabled: bool):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': disabled, 'rules': [] })
+    stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': [] })
+
+    assert stream_params.started is None
+    assert stream.get_changes(stream_params).started is False
+    assert stream.equals(stream_params)
+
+
+  @pytest.mark.parametrize("dto,expected", [
+    ({ 'disabled': False }, True),
+    ({ 'disabled': True }, False),
+    ({}, False)
+  ])
+  def test_stream_started_is_loaded_from_disabled_flag(self, dto: dict, expected: bool):
+    assert Stream(dto).started is expected
+
+
+
+class TestLazyShares():
+
+  def test_shares_are_loaded_on_first_access_only(self):
+    calls = []
+    stream = Stream({ 'id': 'a', 'title': 'foo' })
+    stream.shares_loader = lambda: calls.append(1) or ([ StreamShare("user", "foo", "view") ], { 'selected_grantee_capabilities': {} })
+
+    assert 0 == len(calls)
+    assert "foo" == stream.shares[0].id
+    assert {} == stream.shares_dto['selected_grantee_capabilities']
+    assert 1 == len(calls)
+
+
+  def test_unmanaged_shares_are_not_loaded(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo' })
+    stream.shares_loader = lambda: pytest.fail('shares must not be loaded')
+    stream_params = StreamParams({ 'name': 'foo', 'rules': [] })
+
+    assert stream_params.shares is None
+    assert stream.shares_are_equal(stream_params)
+    assert ([], []) == stream.get_shares_changes(stream_params)
+
+
 
 class TestShareParsing():
 
@@ -206,3 +340,150 @@ class TestShareParsing():
     assert "user" == stream_share.type
     assert "626a6d4ab61ee103107f1c60" == stream_share.id
     assert "view" == stream_share.capability
+
+
+
+class TestStreamIndex():
+
+  def test_get_by_title_returns_stream(self):
+    stream_index = StreamIndex([ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'bar' } ])
+
+    assert 'b' == stream_index.get_by_title('bar').id
+    assert stream_index.get_by_title('baz') is None
+
+
+  def test_get_by_id_returns_stream(self):
+    stream_index = StreamIndex([ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'bar' } ])
+
+    assert 'foo' == stream_index.get_by_id('a').title
+    assert stream_index.get_by_id('c') is None
+
+
+  def test_duplicate_titles_are_reported_and_first_stream_wins(self):
+    stream_index = StreamIndex([
+      { 'id': 'a', 'title': 'foo' },
+      { 'id': 'b', 'title': 'foo' },
+      { 'id': 'c', 'title': 'bar' },
+      { 'id': 'd', 'title': 'foo' }
+    ])
+
+    assert 'a' == stream_index.get_by_title('foo').id
+    assert { 'foo': [ 'a', 'b', 'd' ] } == stream_index.duplicate_titles
+    assert 4 == len(stream_index)
+
+
+  def test_titles_restrict_the_kept_streams(self):
+    stream_index = StreamIndex(iter([ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'bar' }, { 'id': 'c', 'title': 'foo' } ]), { 'foo' })
+
+    assert [ 'a', 'c' ] == [ x.id for x in stream_index ]
+    assert { 'foo': [ 'a', 'c' ] } == stream_index.duplicate_titles
+
+
+  def test_remove_title_removes_all_streams_of_the_title(self):
+    stream_index = StreamIndex([ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'bar' }, { 'id': 'c', 'title': 'foo' } ])
+
+    stream_index.remove_title('foo')
+    stream_index.remove_title('baz')
+
+    assert [ 'b' ] == [ x.id for x in stream_index ]
+    assert stream_index.get_by_title('foo') is None
+    assert {} == stream_index.duplicate_titles
+
+
+
+class TestStreamInfo():
+
+  def test_map_to_info_returns_normalized_stream(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'description': 'bar', 'index_set_id': 'i', 'disabled': False, 'rules': [ { 'id': 'r', 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False, 'stream_id': 'a' } ] })
+    stream.shares = [ StreamShare("user", "u", "view") ]
+
+    info = stream.map_to_info()
+
+    assert 'a' == info['id']
+    assert info['started'] is True
+    assert [ { 'id': 'r', 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False, 'description': None } ] == info['rules']
+    assert [ { 'type': 'user', 'id': 'u', 'capability': 'view' } ] == info['shares']
+    assert 'shares' not in stream.map_to_info(False)
+
+
+
+class TestCompactModels():
+
+  def test_stream_keeps_only_the_update_fields(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'matching_type': 'OR', 'is_default': True, 'outputs': [], 'created_at': 'now' })
+
+    assert { 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'matching_type': 'OR' } == stream.dto
+    assert stream.is_deletable() is False
+    assert not hasattr(stream, '__dict__')
+
+
+  def test_stream_rules_are_immutable_and_readable_by_field(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'rules': [ { 'id': 'r', 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False, 'stream_id': 'a' } ] })
+    rule = stream.rules[0]
+
+    assert isinstance(stream.rules, tuple)
+    assert 'r' == rule['id']
+    assert 'v' == rule.get('value')
+    assert rule.get('stream_id') is None
+    assert { 'id': 'r', 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False, 'description': None } == rule.map_to_dto()
+    with pytest.raises(KeyError):
+      rule['stream_id']
+    with pytest.raises(TypeError):
+      rule[0] = 'x'
+
+
+  def test_stream_rules_compare_with_rule_params(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'rules': [ { 'id': 'r', 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False } ] })
+    stream_params = StreamParams({ 'name': 'foo', 'rules': [ { 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False } ] })
+
+    assert stream.rules_are_equal(stream_params)
+
+
+  def test_digest_is_canonical(self):
+    rule_a = { 'field': 'a', 'value': 'v', 'type': 1, 'inverted': False }
+    rule_b = { 'field': 'b', 'value': 'v', 'type': 1, 'inverted': False, 'description': 'ignored' }
+    shares = [ { 'type': 'user', 'id': 'u', 'capability': 'view' } ]
+
+    digest = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': [ rule_a, rule_b ], 'shares': shares }).get_digest()
+
+    assert digest == StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': [ rule_b, rule_a, rule_a ], 'shares': shares }).get_digest()
+    assert digest != StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': [ rule_a, rule_b ], 'shares': [] }).get_digest()
+    assert digest != StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'rules': [ rule_a, rule_b ], 'shares': shares, 'started': True }).get_digest()
+
+
+
+
+class TestRuleNormalization():
+
+  @pytest.mark.parametrize("rule", [
+    { 'field': 'source', 'value': 'app', 'type': '1', 'inverted': 'no' },
+    { 'field': 'source', 'value': 'app', 'type': 'exact' },
+    { 'field': ' source ', 'value': 'app ', 'type': 'EXACT', 'inverted': 'false' },
+    { 'field': 'source', 'value': 'app', 'inverted': 0 }
+  ])
+  def test_rule_params_equal_the_listed_rule(self, rule: dict):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'rules': [ { 'id': 'r', 'field': 'source', 'value': 'app', 'type': 1, 'inverted': False } ] })
+    stream_params = StreamParams({ 'name': 'foo', 'rules': [ rule ] })
+
+    assert stream.rules_are_equal(stream_params)
+
+
+  def test_symbolic_types_and_values_are_normalized(self):
+    assert { 'field': 'level', 'value': '3', 'type': 4, 'inverted': True } == normalize_rule({ 'field': 'level', 'value': 3, 'type': 'smaller', 'inverted': 'yes' })
+    assert { 'field': 'f', 'value': '', 'type': 5, 'inverted': False } == normalize_rule({ 'field': 'f', 'type': 'presence' })
+
+
+  def test_whitespace_is_kept_in_the_sent_rule(self):
+    stream = Stream({ 'id': 'a', 'title': 'foo', 'rules': [ { 'id': 'r', 'field': 'source', 'value': 'app', 'type': 1, 'inverted': False } ] })
+    stream_params = StreamParams({ 'name': 'foo', 'rules': [ { 'field': ' source', 'value': 'web ', 'type': 1 } ] })
+
+    add, update, delete = stream.get_rules_plan(stream_params)
+
+    assert [] == add and [] == delete
+    assert ' source' == update[0]['field']
+    assert 'web ' == update[0]['value']
+    assert { 'field': 'f', 'value': ' v ', 'type': 1, 'inverted': False } == normalize_rule({ 'field': 'f', 'value': ' v ' })
+
+
+  def test_unknown_values_are_kept(self):
+    assert { 'field': 'f', 'value': 'v', 'type': 'fuzzy', 'inverted': 'maybe' } == normalize_rule({ 'field': 'f', 'value': 'v', 'type': 'fuzzy', 'inverted': 'maybe' })
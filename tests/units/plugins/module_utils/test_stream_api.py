@@ -0,0 +1,263 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+import re
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import get_duplicate_names, get_grantee_shares_changes, get_stream_index, get_unmanaged_streams, reconcile_stream, should_create_stream, should_delete_stream, should_update_stream, update_rules, update_stream
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamIndex, StreamParams, StreamShare
+from ansible_collections.fio.graylog.tests.units.stream_fakes import FakeClient
+
+
+class TestStateDecisions():
+
+  @pytest.mark.parametrize("state,exists,expected", [
+    ("present", False, True),
+    ("present", True, False),
+    ("absent", False, False),
+    ("absent", True, False)
+  ])
+  def test_should_create_stream(self, state: str, exists: bool, expected: bool):
+    stream = Stream({ 'id': 'a', 'title': 'foo' }) if exists else None
+
+    assert should_create_stream(state, stream) is expected
+
+
+  @pytest.mark.parametrize("state,exists,expected", [
+    ("present", False, False),
+    ("present", True, True),
+    ("absent", False, False),
+    ("absent", True, False)
+  ])
+  def test_should_update_stream_only_for_existing_present_streams(self, state: str, exists: bool, expected: bool):
+    stream = Stream({ 'id': 'a', 'title': 'foo' }) if exists else None
+    stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'changed', 'rules': [], 'shares': [] })
+
+    assert should_update_stream(state, stream, stream_params) is expected
+
+
+  @pytest.mark.parametrize("state,exists,expected", [
+    ("present", True, False),
+    ("absent", False, False),
+    ("absent", True, True)
+  ])
+  def test_should_delete_stream(self, state: str, exists: bool, expected: bool):
+    stream = Stream({ 'id': 'a', 'title': 'foo' }) if exists else None
+
+    assert should_delete_stream(state, stream) is expected
+
+
+
+class TestUpdateRules():
+
+  def create_streams(self, count: int) -> "tuple[Stream, StreamParams]":
+    stream = Stream({ 'id': 's', 'title': 'foo', 'rules': [ { 'id': 'r%s' % (x), 'field': 'f%s' % (x), 'value': 'old', 'type': 1 } for x in range(count) ] })
+    stream_params = StreamParams({ 'name': 'foo', 'rules': [ { 'field': 'f%s' % (x), 'value': 'new', 'type': 1 } for x in range(count) ], 'shares': [] })
+    return stream, stream_params
+
+
+  @pytest.mark.parametrize("parallelism", [ 1, 4 ])
+  def test_update_rules_applies_all_changes(self, parallelism: int):
+    stream, stream_params = self.create_streams(10)
+    client = FakeClient()
+
+    update_rules(client, stream, stream_params, parallelism)
+
+    assert 10 == len(client.requests)
+    assert all(x[0] == 'PUT' and x[2]['value'] == 'new' for x in client.requests)
+
+
+  def test_update_rules_in_parallel_reports_every_failed_rule(self):
+    stream, stream_params = self.create_streams(10)
+    client = FakeClient([ '/streams/s/rules/r3', '/streams/s/rules/r7' ])
+
+    with pytest.raises(GraylogApiError) as e:
+      update_rules(client, stream, stream_params, 4)
+
+    assert 'Failed to update 2 rule(s)' in str(e.value)
+    assert 'update rule { Field: f3' in str(e.value)
+    assert 'update rule { Field: f7' in str(e.value)
+    assert 10 == len(client.requests)
+
+
+
+class TestUpdateStream():
+
+  def test_update_stream_only_writes_changed_parts(self):
+    stream = Stream({ 'id': 's', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': False, 'rules': [] })
+    stream.shares = []
+    stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'started': False, 'rules': [], 'shares': [] })
+    client = FakeClient()
+
+    update_stream(client, stream, stream_params)
+
+    assert [ ('POST', '/streams/s/pause', None) ] == client.requests
+
+
+
+class TestExclusiveStreams():
+
+  def create_index(self) -> StreamIndex:
+    return StreamIndex([
+      { 'id': 'a', 'title': 'app-a' },
+      { 'id': 'b', 'title': 'app-b' },
+      { 'id': 'c', 'title': 'other' },
+      { 'id': 'd', 'title': 'Default Stream', 'is_default': True },
+      { 'id': 'e', 'title': 'All events', 'is_editable': False }
+    ])
+
+
+  def test_get_unmanaged_streams_skips_managed_and_system_streams(self):
+    streams = get_unmanaged_streams(self.create_index(), set([ 'app-a' ]))
+
+    assert [ 'b', 'c' ] == [ x.id for x in streams ]
+
+
+  def test_get_unmanaged_streams_can_be_limited_by_title(self):
+    streams = get_unmanaged_streams(self.create_index(), set([ 'app-a' ]), re.compile('^app-'))
+
+    assert [ 'b' ] == [ x.id for x in streams ]
+
+
+  def test_get_duplicate_names_reports_each_name_once(self):
+    specs = [ { 'name': x } for x in [ 'b', 'a', 'b', 'c', 'a', 'b' ] ]
+
+    assert [ 'b', 'a' ] == get_duplicate_names(specs)
+    assert [] == get_duplicate_names([ { 'name': 'a' }, { 'name': 'b' } ])
+
+
+
+class TestStreamLookup():
+
+  def create_client(self, version: "tuple[int, int, int]", missing_paths: "list[str]" = None) -> FakeClient:
+    return FakeClient(responses={
+      '/streams': { 'total': 3, 'streams': [ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'foobar' }, { 'id': 'c', 'title': 'bar' } ] },
+      '/streams/paginated?query=title%3A%22foo%22&page=1&per_page=50': { 'pagination': { 'total': 2 }, 'elements': [ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'foobar' } ] }
+    }, version=version, missing_paths=missing_paths)
+
+
+  def test_single_title_is_queried_on_new_servers(self):
+    client = self.create_client((5, 0, 0))
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert [ '/streams/paginated?query=title%3A%22foo%22&page=1&per_page=50' ] == [ x[1] for x in client.requests ]
+
+
+  @pytest.mark.parametrize("version", [ None, (4, 3, 0), (4, 3, 15) ])
+  def test_full_listing_is_used_on_old_or_unknown_servers(self, version):
+    client = self.create_client(version)
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert [ '/streams' ] == [ x[1] for x in client.requests ]
+
+
+  def test_full_listing_is_used_if_query_is_not_found(self):
+    client = self.create_client((5, 0, 0), [ '/streams/paginated' ])
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert '/streams' == client.requests[-1][1]
+
+
+  def test_query_miss_is_confirmed_by_full_listing(self):
+    client = self.create_client((5, 0, 0))
+    client.responses['/streams/paginated?query=title%3A%22bar%22&page=1&per_page=50'] = { 'pagination': { 'total': 0 }, 'elements': [] }
+
+    stream_index = get_stream_index(client, titles={ 'bar' })
+
+    assert [ 'c' ] == [ x.id for x in stream_index ]
+    assert [ '/streams/paginated?query=title%3A%22bar%22&page=1&per_page=50', '/streams' ] == [ x[1] for x in client.requests ]
+
+
+  @pytest.mark.parametrize("title", [ 'say "hi"', 'C:\\logs' ])
+  def test_titles_with_quotes_or_backslashes_are_not_queried(self, title):
+    client = FakeClient(responses={ '/streams': { 'total': 1, 'streams': [ { 'id': 'a', 'title': title } ] } }, version=(5, 0, 0))
+
+    stream_index = get_stream_index(client, titles={ title })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert [ '/streams' ] == [ x[1] for x in client.requests ]
+
+
+  def test_query_accepts_streams_key(self):
+    client = FakeClient(responses={
+      '/streams/paginated?query=title%3A%22foo%22&page=1&per_page=50': { 'total': 2, 'streams': [ { 'id': 'a', 'title': 'foo' }, { 'id': 'b', 'title': 'foobar' } ] }
+    }, version=(5, 0, 0))
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert 1 == len(client.requests)
+
+
+  def test_full_listing_is_used_if_query_lists_no_streams(self):
+    client = self.create_client((5, 0, 0))
+    client.responses['/streams/paginated?query=title%3A%22foo%22&page=1&per_page=50'] = { 'total': 0 }
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ 'a' ] == [ x.id for x in stream_index ]
+    assert '/streams' == client.requests[-1][1]
+
+
+  def test_query_follows_pages(self):
+    pages = dict(('/streams/paginated?query=title%%3A%%22foo%%22&page=%s&per_page=50' % (x + 1), {
+      'pagination': { 'total': 120 },
+      'elements': [ { 'id': str(y), 'title': 'foo' if y == 110 else 'foo%s' % (y) } for y in range(x * 50, min(120, x * 50 + 50)) ]
+    }) for x in range(3))
+    client = FakeClient(responses=pages, version=(5, 0, 0))
+
+    stream_index = get_stream_index(client, titles={ 'foo' })
+
+    assert [ '110' ] == [ x.id for x in stream_index ]
+    assert 3 == len(client.requests)
+
+
+
+class TestAppliedStreams():
+
+  def test_applied_stream_is_skipped_without_requests(self, tmp_path):
+    client = FakeClient(responses={ '/authz/shares/entities/grn::::stream:a/prepare': { 'active_shares': [], 'selected_grantee_capabilities': {} } })
+    digests = AppliedDigests(str(tmp_path), 'http://graylog', 'foobar')
+    stream_params = StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'started': True, 'rules': [], 'shares': [] })
+
+    assert reconcile_stream(client, 'present', Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': False }), stream_params, digests=digests) is False
+    assert 1 == len(client.requests)
+
+    assert reconcile_stream(client, 'present', Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': False }), stream_params, digests=digests) is False
+    assert 1 == len(client.requests)
+
+    assert reconcile_stream(client, 'present', Stream({ 'id': 'a', 'title': 'foo', 'description': 'foo', 'index_set_id': 'i', 'disabled': True }), stream_params, digests=digests) is True
+    assert ('POST', '/streams/a/resume', None) == client.requests[-1]
+
+
+
+
+class TestGranteeShares():
+
+  def create_stream(self) -> Stream:
+    stream = Stream({ 'id': 'a', 'title': 'foo' })
+    stream.shares = [ StreamShare('user', 'u1', 'view'), StreamShare('team', 't1', 'manage') ]
+    return stream
+
+
+  def test_only_missing_or_different_grants_are_added(self):
+    add, delete = get_grantee_shares_changes(self.create_stream(), [ StreamShare('user', 'u1', 'view'), StreamShare('team', 't1', 'view'), StreamShare('team', 't2', 'view') ], 'present')
+
+    assert [ ('team', 't1', 'view'), ('team', 't2', 'view') ] == [ (x.type, x.id, x.capability) for x in add ]
+    assert [] == delete
+
+
+  def test_absent_grantees_are_revoked_regardless_of_capability(self):
+    add, delete = get_grantee_shares_changes(self.create_stream(), [ StreamShare('team', 't1', 'view'), StreamShare('team', 't2', 'view') ], 'absent')
+
+    assert [] == add
+    assert [ ('team', 't1', 'manage') ] == [ (x.type, x.id, x.capability) for x in delete ]
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogResponse
+from ansible_collections.fio.graylog.plugins.module_utils.stream_api import get_streams
+from ansible_collections.fio.graylog.plugins.module_utils.stream_cache import StreamsCache
+
+
+class FakeClient():
+
+  def __init__(self, response: GraylogResponse):
+    self.response = response
+    self.requests = []
+
+
+  def send(self, method: str, path: str, data=None, headers: dict = None) -> GraylogResponse:
+    self.requests.append((method, path, headers))
+    return self.response
+
+
+
+def create_response(status: int, body: dict = None, etag: str = None) -> GraylogResponse:
+  headers = {} if etag is None else { 'etag': etag }
+  return GraylogResponse(status, '', headers, b'' if body is None else json.dumps(body).encode('utf-8'))
+
+
+
+class TestStreamsCache():
+
+  def test_store_and_load(self, tmp_path):
+    cache = StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 60)
+
+    cache.store({ 'streams': [] }, '"abc"')
+    entry = cache.load()
+
+    assert { 'streams': [] } == entry['response']
+    assert '"abc"' == entry['etag']
+    assert cache.is_fresh(entry)
+
+
+  def test_entries_are_keyed_by_endpoint_and_token(self, tmp_path):
+    StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 60).store({ 'streams': [] })
+
+    assert StreamsCache(str(tmp_path), 'http://graylog', 'other', 60).load() is None
+    assert StreamsCache(str(tmp_path), 'http://other', 'foobar', 60).load() is None
+    assert StreamsCache(str(tmp_path), 'http://graylog/', 'foobar', 60).load() is not None
+
+
+  def test_stream_mutation_invalidates_entry(self, tmp_path):
+    cache = StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 60)
+    cache.store({ 'streams': [] })
+
+    cache.on_mutation('POST', '/authz/shares/entities/grn::::stream:abc')
+    assert cache.load() is not None
+
+    cache.on_mutation('DELETE', '/streams/abc')
+    assert cache.load() is None
+
+
+
+class TestCachedGetStreams():
+
+  def test_fresh_entry_is_used_without_request(self, tmp_path):
+    cache = StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 60)
+    cache.store({ 'streams': [ { 'id': 'a' } ] })
+    client = FakeClient(create_response(500))
+
+    assert { 'streams': [ { 'id': 'a' } ] } == get_streams(client, cache)
+    assert 0 == len(client.requests)
+
+
+  def test_expired_entry_is_revalidated_with_etag(self, tmp_path):
+    cache = StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 0)
+    cache.store({ 'streams': [ { 'id': 'a' } ] }, '"abc"')
+    client = FakeClient(create_response(304))
+
+    assert { 'streams': [ { 'id': 'a' } ] } == get_streams(client, cache)
+    assert { 'If-None-Match': '"abc"' } == client.requests[0][2]
+
+
+  def test_changed_listing_replaces_entry(self, tmp_path):
+    cache = StreamsCache(str(tmp_path), 'http://graylog', 'foobar', 0)
+    cache.store({ 'streams': [ { 'id': 'a' } ] }, '"abc"')
+    client = FakeClient(create_response(200, { 'streams': [ { 'id': 'b' } ] }, '"def"'))
+
+    assert { 'streams': [ { 'id': 'b' } ] } == get_streams(client, cache)
+    assert '"def"' == cache.load()['etag']
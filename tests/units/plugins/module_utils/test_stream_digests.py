@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.fio.graylog.plugins.module_utils.stream_digests import AppliedDigests
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams
+from ansible_collections.fio.graylog.tests.units import stream_fakes
+
+
+RULE = { 'field': 'f', 'value': 'v', 'type': 1, 'inverted': False }
+
+
+def create_stream(rules: "list[dict]" = None, disabled: bool = False) -> Stream:
+  return stream_fakes.create_stream('foo', [ dict(x, id='r') for x in rules or [ RULE ] ], 'a', disabled=disabled)
+
+
+def create_params(rules: "list[dict]" = None, started: bool = True) -> StreamParams:
+  return StreamParams({ 'name': 'foo', 'index_set_id': 'i', 'started': started, 'rules': rules or [ RULE ], 'shares': [] })
+
+
+def create_digests(tmp_path) -> AppliedDigests:
+  return AppliedDigests(str(tmp_path), 'http://graylog', 'foobar')
+
+
+
+class TestAppliedDigests():
+
+  def test_stored_stream_is_applied_for_later_runs(self, tmp_path):
+    digests = create_digests(tmp_path)
+    digests.add(create_stream(), create_params(), False)
+    digests.store()
+
+    assert create_digests(tmp_path).is_applied(create_stream(), create_params())
+
+
+  def test_changed_desired_state_is_not_applied(self, tmp_path):
+    digests = create_digests(tmp_path)
+    digests.add(create_stream(), create_params(), False)
+
+    assert not digests.is_applied(create_stream(), create_params([ dict(RULE, value='other') ]))
+
+
+  def test_changed_listing_is_not_applied(self, tmp_path):
+    digests = create_digests(tmp_path)
+    digests.add(create_stream(), create_params(), False)
+
+    assert not digests.is_applied(create_stream([ dict(RULE, value='drift') ]), create_params())
+
+
+  def test_changed_stream_expects_the_desired_listing(self, tmp_path):
+    digests = create_digests(tmp_path)
+    digests.add(create_stream([]), create_params(), True)
+
+    assert digests.is_applied(create_stream(), create_params())
+
+
+  def test_unmanaged_started_is_ignored(self, tmp_path):
+    digests = create_digests(tmp_path)
+    digests.add(create_stream([]), create_params(started=None), True)
+
+    assert digests.is_applied(create_stream(disabled=True), create_params(started=None))
+    assert digests.is_applied(create_stream(disabled=False), create_params(started=None))
+
+
+  def test_store_merges_with_other_runs_and_removes_discarded(self, tmp_path):
+    first = create_digests(tmp_path)
+    second = create_digests(tmp_path)
+    other_stream = stream_fakes.create_stream('foo', [ RULE ], 'b')
+
+    first.add(create_stream(), create_params(), False)
+    first.store()
+    second.add(other_stream, create_params(), False)
+    second.store()
+
+    assert create_digests(tmp_path).is_applied(create_stream(), create_params())
+    assert create_digests(tmp_path).is_applied(other_stream, create_params())
+
+    first.discard(create_stream())
+    first.store()
+
+    assert not create_digests(tmp_path).is_applied(create_stream(), create_params())
+    assert create_digests(tmp_path).is_applied(other_stream, create_params())
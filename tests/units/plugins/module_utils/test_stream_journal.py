@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.fio.graylog.plugins.module_utils.stream_journal import StreamsJournal, get_spec_digest
+import json
+import os
+
+
+def create_journal(tmp_path, names: "list[str]" = None) -> StreamsJournal:
+  return StreamsJournal(str(tmp_path), 'http://graylog', 'foobar', names or [ 'a', 'b' ])
+
+
+
+class TestStreamsJournal():
+
+  def test_completed_streams_are_found_by_a_later_run(self, tmp_path):
+    journal = create_journal(tmp_path)
+    journal.start('a', 'digest-a')
+    journal.complete('a', 'digest-a', True)
+    journal.start('b', 'digest-b')
+
+    rerun = create_journal(tmp_path, [ 'b', 'a' ])
+
+    assert rerun.get_completed('a', 'digest-a')['changed'] is True
+    assert rerun.get_completed('b', 'digest-b') is None
+
+
+  def test_changed_spec_is_not_completed(self, tmp_path):
+    journal = create_journal(tmp_path)
+    journal.complete('a', 'digest-a', False)
+
+    assert create_journal(tmp_path).get_completed('a', 'other') is None
+
+
+  def test_restarted_stream_is_not_completed(self, tmp_path):
+    journal = create_journal(tmp_path)
+    journal.complete('a', 'digest-a', False)
+    journal.start('a', 'digest-a')
+
+    assert create_journal(tmp_path).get_completed('a', 'digest-a') is None
+
+
+  def test_journals_are_keyed_by_stream_names(self, tmp_path):
+    create_journal(tmp_path).complete('a', 'digest-a', False)
+
+    assert create_journal(tmp_path, [ 'a' ]).get_completed('a', 'digest-a') is None
+
+
+  def test_incomplete_last_line_and_removal(self, tmp_path):
+    journal = create_journal(tmp_path)
+    journal.complete('a', 'digest-a', False)
+    with open(journal.file, 'a') as f:
+      f.write('{ "name": "b", "sta')
+
+    assert create_journal(tmp_path).get_completed('a', 'digest-a') is not None
+
+    journal.remove()
+    assert create_journal(tmp_path).get_completed('a', 'digest-a') is None
+
+
+  def test_stale_journal_is_ignored_and_removed(self, tmp_path):
+    journal = create_journal(tmp_path)
+    journal.complete('a', 'digest-a', True)
+    with open(journal.file, 'r') as f:
+      record = json.loads(f.readline())
+    with open(journal.file, 'w') as f:
+      f.write(json.dumps(dict(record, at=record['at'] - 7200)) + '\n')
+
+    assert StreamsJournal(str(tmp_path), 'http://graylog', 'foobar', [ 'a', 'b' ], 86400).get_completed('a', 'digest-a') is not None
+    assert StreamsJournal(str(tmp_path), 'http://graylog', 'foobar', [ 'a', 'b' ], 3600).get_completed('a', 'digest-a') is None
+    assert not os.path.exists(journal.file)
+
+
+  def test_spec_digest_ignores_key_order(self):
+    assert get_spec_digest({ 'name': 'a', 'rules': [] }) == get_spec_digest({ 'rules': [], 'name': 'a' })
+    assert get_spec_digest({ 'name': 'a' }) != get_spec_digest({ 'name': 'b' })
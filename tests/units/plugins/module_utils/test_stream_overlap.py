@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.fio.graylog.plugins.module_utils.stream_overlap import analyze_stream_overlaps
+from ansible_collections.fio.graylog.plugins.module_utils.streams import StreamParams
+from ansible_collections.fio.graylog.tests.units.stream_fakes import create_stream
+
+
+SOURCE_RULE = { 'field': 'source', 'value': 'app', 'type': 1 }
+LEVEL_RULE = { 'field': 'level', 'value': '3', 'type': 4 }
+FACILITY_RULE = { 'field': 'facility', 'value': 'auth', 'type': 'exact' }
+
+
+class TestStreamOverlaps():
+
+  def create_report(self) -> dict:
+    return analyze_stream_overlaps([
+      create_stream('app', [ SOURCE_RULE ]),
+      create_stream('app-errors', [ SOURCE_RULE, LEVEL_RULE ]),
+      StreamParams({ 'name': 'app-errors-copy', 'rules': [ LEVEL_RULE, dict(SOURCE_RULE, type='exact', inverted='no') ] }),
+      create_stream('app-any', [ SOURCE_RULE, LEVEL_RULE ], matching_type='OR'),
+      create_stream('auth', [ FACILITY_RULE, FACILITY_RULE ]),
+      create_stream('empty', [])
+    ])
+
+
+  def test_counts_rules(self):
+    report = self.create_report()
+
+    assert 6 == report['streams']
+    assert 9 == report['rules']
+    assert 3 == report['distinct_rules']
+
+
+  def test_reports_shared_and_redundant_rules(self):
+    report = self.create_report()
+
+    assert [ ('source', [ 'app', 'app-errors', 'app-errors-copy', 'app-any' ]), ('level', [ 'app-errors', 'app-errors-copy', 'app-any' ]) ] == [ (x['rule']['field'], x['streams']) for x in report['shared_rules'] ]
+    assert [ ('auth', 'facility', 2) ] == [ (x['stream'], x['rule']['field'], x['count']) for x in report['redundant_rules'] ]
+
+
+  def test_reports_duplicate_streams_of_the_same_matching_type(self):
+    assert [ [ 'app-errors', 'app-errors-copy' ] ] == self.create_report()['duplicate_streams']
+
+
+  def test_reports_and_streams_including_the_rules_of_others(self):
+    assert [ { 'stream': 'app-errors', 'superset_of': [ 'app' ] } ] == self.create_report()['supersets']
+
+
+  def test_reports_rules_per_field(self):
+    assert [ ('source', 4, 4), ('level', 3, 3), ('facility', 2, 1) ] == [ (x['field'], x['rules'], x['streams']) for x in self.create_report()['fields'] ]
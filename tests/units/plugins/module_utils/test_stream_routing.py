@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+from ansible_collections.fio.graylog.plugins.module_utils.stream_routing import SOURCE_INPUT_FIELD, StreamRouter, create_matcher, evaluate_rule
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream, StreamParams
+from ansible_collections.fio.graylog.tests.units.stream_fakes import create_stream
+
+
+class TestRuleTypes():
+
+  @pytest.mark.parametrize("rule,message,expected", [
+    ({ 'field': 'source', 'value': 'app', 'type': 'exact' }, { 'source': 'app' }, True),
+    ({ 'field': 'source', 'value': 'app', 'type': 'exact' }, { 'source': 'app2' }, False),
+    ({ 'field': 'enabled', 'value': 'true', 'type': 'exact' }, { 'enabled': True }, True),
+    ({ 'field': 'source', 'value': '^ap+$', 'type': 'regex' }, { 'source': 'app' }, True),
+    ({ 'field': 'source', 'value': '^x', 'type': 'regex' }, { 'source': 'app' }, False),
+    ({ 'field': 'level', 'value': '3', 'type': 'greater' }, { 'level': 4 }, True),
+    ({ 'field': 'level', 'value': '3', 'type': 'greater' }, { 'level': '3' }, False),
+    ({ 'field': 'level', 'value': '3', 'type': 'smaller' }, { 'level': '2.5' }, True),
+    ({ 'field': 'level', 'value': '3', 'type': 'smaller' }, { 'level': 'low' }, False),
+    ({ 'field': 'user', 'type': 'presence' }, { 'user': 'foo' }, True),
+    ({ 'field': 'user', 'type': 'presence' }, { 'user': '  ' }, False),
+    ({ 'field': 'message', 'value': 'error', 'type': 'contains' }, { 'message': 'an error occurred' }, True),
+    ({ 'field': 'x', 'type': 'always_match' }, {}, True),
+    ({ 'value': 'input1', 'type': 'match_input' }, { 'gl2_source_input': 'input1' }, True),
+    ({ 'field': 'source', 'value': 'app', 'type': 'exact', 'inverted': True }, { 'source': 'app' }, False),
+    ({ 'field': 'source', 'value': 'app', 'type': 'exact', 'inverted': True }, { 'source': 'other' }, True),
+    ({ 'field': 'source', 'value': 'app', 'type': 'exact', 'inverted': True }, {}, True),
+    ({ 'field': 'user', 'type': 'presence', 'inverted': True }, { 'user': None }, True)
+  ])
+  def test_rule_semantics(self, rule: dict, message: dict, expected: bool):
+    router = StreamRouter([ create_stream('s', [ rule ]) ])
+
+    assert (router.route(message) == [ 's' ]) is expected
+
+
+  def test_invalid_rules_are_reported(self):
+    with pytest.raises(ValueError) as e:
+      StreamRouter([ create_stream('s', [ { 'field': 'f', 'value': '(', 'type': 'regex' } ]) ])
+
+    assert "stream 's'" in str(e.value)
+
+
+
+class TestMatchingTypes():
+
+  def create_router(self) -> StreamRouter:
+    rules = [ { 'field': 'source', 'value': 'app', 'type': 1 }, { 'field': 'level', 'value': '3', 'type': 4, 'inverted': True } ]
+    return StreamRouter([
+      create_stream('and', rules),
+      create_stream('or', rules, matching_type='OR'),
+      create_stream('empty', []),
+      StreamParams({ 'name': 'params', 'rules': [ { 'field': 'source', 'value': 'app' } ] })
+    ])
+
+
+  @pytest.mark.parametrize("message,expected", [
+    ({ 'source': 'app', 'level': 5 }, [ 'and', 'or', 'params' ]),
+    ({ 'source': 'app', 'level': 1 }, [ 'or', 'params' ]),
+    ({ 'source': 'other', 'level': 1 }, []),
+    ({ 'source': 'other' }, [ 'or' ])
+  ])
+  def test_and_requires_all_rules_or_any_rule(self, message: dict, expected: "list[str]"):
+    assert expected == self.create_router().route(message)
+
+
+  def matches(self, stream: Stream, message: dict) -> bool:
+    results = [
+      True if x['type'] == 7 else evaluate_rule((SOURCE_INPUT_FIELD if x['type'] == 8 else x['field'], create_matcher(stream, x), x['inverted']), message)
+      for x in stream.rules
+    ]
+    if stream.matching_type == 'OR':
+      return any(results)
+    return len(results) > 0 and all(results)
+
+
+  def test_indexed_routing_equals_rule_by_rule_evaluation(self):
+    streams = [
+      create_stream('s%s' % (x), [
+        { 'field': 'f%s' % (x % 7), 'value': 'v%s' % (x % 5), 'type': 1 + x % 8, 'inverted': x % 4 == 0 },
+        { 'field': 'f%s' % (x % 3), 'value': str(x % 10), 'type': 3 + x % 2, 'inverted': x % 9 == 0 }
+      ][:1 + x % 2], 'OR' if x % 3 == 0 else 'AND')
+      for x in range(400)
+    ]
+    messages = [ dict(('f%s' % (y), 'v%s' % ((x + y) % 5) if y % 2 else (x * y) % 12) for y in range(7) if (x + y) % 4 != 0) for x in range(100) ]
+    for x in range(0, 100, 10):
+      messages[x]['gl2_source_input'] = 'v%s' % (x % 5)
+
+    router = StreamRouter(streams)
+
+    for message in messages:
+      assert router.route(message) == [ x.title for x in streams if self.matches(x, message) ]
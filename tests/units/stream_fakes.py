@@ -0,0 +1,79 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import asyncio
+import io
+import json
+import threading
+from ansible_collections.fio.graylog.plugins.module_utils.graylog_client import GraylogApiError
+from ansible_collections.fio.graylog.plugins.module_utils.streams import Stream
+
+
+# Graylog client answering with the given responses per path, paths in failing_paths fail with
+# HTTP 500 and paths in missing_paths with HTTP 404. Requests are recorded as (method, path, data).
+class FakeClient():
+
+  def __init__(self, failing_paths: "list[str]" = None, responses: dict = None, version: "tuple[int, int, int]" = None, missing_paths: "list[str]" = None):
+    self.requests = []
+    self.failing_paths = failing_paths or []
+    self.missing_paths = missing_paths or []
+    self.responses = responses or {}
+    self.version = version
+    self.timings = None
+    self._lock = threading.Lock()
+
+
+  def request(self, method: str, path: str, data=None, expected_status: int = 200, idempotent: bool = None):
+    with self._lock:
+      self.requests.append((method, path, data))
+
+    if path in self.failing_paths:
+      raise GraylogApiError('HTTP Error 500: Server Error', 500)
+
+    if path.split('?')[0] in self.missing_paths:
+      raise GraylogApiError('HTTP Error 404: Not Found', 404)
+
+    return self.responses.get(path)
+
+
+  def open(self, method: str, path: str, headers: dict = None, expected_status: int = 200):
+    self.requests.append((method, path, None))
+    return FakeStreamingResponse(json.dumps(self.responses[path]).encode('utf-8'))
+
+
+  def get_server_version(self) -> "tuple[int, int, int]":
+    return self.version
+
+
+
+class FakeStreamingResponse(io.BytesIO):
+  pass
+
+
+
+# coroutine counterpart of FakeClient, (method, path) pairs in failing_paths fail with HTTP 500
+class FakeAsyncClient():
+
+  def __init__(self, failing_paths: "list[tuple[str, str]]" = None, responses: dict = None):
+    self.requests = []
+    self.failing_paths = failing_paths or []
+    self.responses = responses or {}
+
+
+  async def request(self, method: str, path: str, data=None, expected_status: int = 200, idempotent: bool = None):
+    self.requests.append((method, path, data))
+    await asyncio.sleep(0)
+
+    if (method, path) in self.failing_paths:
+      raise GraylogApiError('HTTP Error 500: Server Error', 500)
+
+    return self.responses.get(path)
+
+
+
+def create_stream_dto(title: str = 'foo', rules: "list[dict]" = None, stream_id: str = None, **kwargs) -> dict:
+  return dict({ 'id': stream_id or title, 'title': title, 'description': title, 'index_set_id': 'i', 'disabled': False, 'matching_type': 'AND', 'rules': rules or [] }, **kwargs)
+
+
+def create_stream(title: str = 'foo', rules: "list[dict]" = None, stream_id: str = None, **kwargs) -> Stream:
+  return Stream(create_stream_dto(title, rules, stream_id, **kwargs))